@@ -0,0 +1,158 @@
+"""
+Admission control under a burst, against a slow ACS stand-in.
+
+Models one worker: a fixed pool of --threads threads (the host's
+PYTHON_THREADPOOL_THREAD_COUNT) serves a burst of valid submissions with
+cheap requests (CORS preflights and submissions missing fields) mixed in.
+Latency is measured from the moment a request reaches the worker, so time
+spent waiting for a free thread counts. Each run is repeated with
+ADMISSION_CONTROL off and on.
+
+Without admission control every thread ends up waiting on a slow ACS poll
+and cheap requests queue behind them; with it, sends beyond
+ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE are shed with a 503 at once
+and the remaining threads keep serving the cheap requests.
+
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --burst 600 --acs-poll 800:200 --max-concurrent 4 --max-queue 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+# Configuration must be in place before the function modules are imported
+os.environ.update({
+    'AZURE_COMMUNICATION_CONNECTION_STRING': 'endpoint=https://stand-in.communication.azure.com/;accesskey=c3RhbmQtaW4=',
+    'SENDGRID_API_KEY': '',
+    'RECAPTCHA_SECRET_KEY': 'stand-in',
+    'SKIP_RECAPTCHA': 'false',
+    'EMAIL_DELIVERY_MODE': 'sync',
+    'SUBMISSION_LOG': 'false',
+    'CIRCUIT_BREAKERS': 'false',
+})
+
+import azure.functions as func  # noqa: E402
+
+from benchmarks.load_test import build_requests, percentile  # noqa: E402
+from benchmarks.reporting import write_report  # noqa: E402
+from benchmarks.stand_ins import FakeEmailClient, FakeSiteverifySession, Fault  # noqa: E402
+from shared_code.settings import reload_settings  # noqa: E402
+
+
+def build_mix(args, run_id):
+    """Valid submissions with one cheap request after every --cheap-every of them"""
+    valid = build_requests('valid', args.burst, run_id)
+    invalid = build_requests('missing_fields', args.burst // args.cheap_every + 1, run_id)
+    preflight = func.HttpRequest(method='OPTIONS', url='http://localhost:7071/api/contact', headers={}, body=b'')
+    mix = []
+    for index, req in enumerate(valid):
+        mix.append(('send', req))
+        if index % args.cheap_every == 0:
+            cheap = preflight if index // args.cheap_every % 2 else invalid[index // args.cheap_every]
+            mix.append(('cheap', cheap))
+    return mix
+
+
+def summary(latencies, statuses):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'status_codes': statuses,
+        'p50': round(percentile(latencies, 0.50), 1),
+        'p95': round(percentile(latencies, 0.95), 1),
+        'p99': round(percentile(latencies, 0.99), 1),
+        'max': round(latencies[-1], 1),
+        'mean': round(statistics.fmean(latencies), 1),
+    }
+
+
+def run_mode(enabled, args, run_id):
+    import contact_form
+    from shared_code import admission, transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    os.environ.update({
+        'ADMISSION_CONTROL': 'true' if enabled else 'false',
+        'ADMISSION_MAX_CONCURRENT': str(args.max_concurrent),
+        'ADMISSION_MAX_QUEUE': str(args.max_queue),
+        'ADMISSION_QUEUE_TIMEOUT_MS': str(args.queue_timeout_ms),
+    })
+    reload_settings()
+
+    email_client = FakeEmailClient(poll_fault=Fault.parse(args.acs_poll, seed=1))
+    siteverify = FakeSiteverifySession()
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify)
+    mix = build_mix(args, run_id)
+    results = {'send': ([], {}), 'cheap': ([], {})}
+    lock = threading.Lock()
+
+    def invoke(kind, req, arrived):
+        response = contact_form.main(req)
+        latency = (time.perf_counter() - arrived) * 1000
+        latencies, statuses = results[kind]
+        with lock:
+            latencies.append(latency)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+        stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            for kind, req in mix:
+                pool.submit(invoke, kind, req, time.perf_counter())
+                time.sleep(args.arrival_ms / 1000)
+        elapsed = time.perf_counter() - started
+
+    controller = admission.get_controller('contact_form')
+    return {
+        'admission_control': enabled,
+        'elapsed_seconds': round(elapsed, 2),
+        'send': summary(*results['send']),
+        'cheap': summary(*results['cheap']),
+        'controller': controller.get_stats() if controller is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admission control under a burst')
+    parser.add_argument('--burst', type=int, default=300, help='valid submissions in the burst')
+    parser.add_argument('--cheap-every', type=int, default=3, help='one cheap request per this many submissions')
+    parser.add_argument('--arrival-ms', type=float, default=2.0, help='time between arrivals')
+    parser.add_argument('--threads', type=int, default=32, help='worker threads (PYTHON_THREADPOOL_THREAD_COUNT)')
+    parser.add_argument('--acs-poll', default='500:100', help='ACS poll fault spec (latency_ms[:jitter[:errors]])')
+    parser.add_argument('--max-concurrent', type=int, default=8, help='ADMISSION_MAX_CONCURRENT')
+    parser.add_argument('--max-queue', type=int, default=16, help='ADMISSION_MAX_QUEUE')
+    parser.add_argument('--queue-timeout-ms', type=int, default=2000, help='ADMISSION_QUEUE_TIMEOUT_MS')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/admission-<commit>.json)')
+    args = parser.parse_args()
+
+    # Keep the functions' logging cost realistic without flooding the terminal
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    results = [run_mode(enabled, args, 30 + index) for index, enabled in enumerate((False, True))]
+
+    print(f"{'admission':<11}{'class':<7}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  status")
+    for result in results:
+        for kind in ('send', 'cheap'):
+            row = result[kind]
+            print(f"{'on' if result['admission_control'] else 'off':<11}{kind:<7}{row['requests']:>7}"
+                  f"{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}  {json.dumps(row['status_codes'])}")
+    for result in results:
+        if result['controller']:
+            print(f"controller: {result['controller']}")
+
+    output = write_report('admission', {'config': vars(args), 'results': results}, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Sync vs async contact pipeline under concurrent load.
+
+Drives valid submissions through contact_form.main and contact_form_async.main
+against latency-injecting stand-ins for Google siteverify and ACS, with a
+fixed number of concurrent clients each sending requests back to back.
+The sync function is measured twice: on a worker-sized thread pool (what
+the Python worker gives it unless PYTHON_THREADPOOL_THREAD_COUNT is raised)
+and on one thread per client. The async function runs on a single event
+loop, as it does in the worker.
+
+    python -m benchmarks.bench_async --concurrency 50 200 --requests 1000
+    python -m benchmarks.bench_async --siteverify 80:20 --acs-send 60:15 --acs-poll 250:50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+from benchmarks.load_test import build_requests, percentile  # sets the stand-in configuration
+from benchmarks.reporting import write_report
+from benchmarks.stand_ins import (
+    FakeAsyncEmailClient, FakeAsyncSiteverifySession, FakeEmailClient, FakeSiteverifySession, Fault,
+)
+
+# Every client's submission is measured end to end; bench_admission covers shedding
+os.environ['ADMISSION_CONTROL'] = 'false'
+
+# concurrent.futures' default, which the Python worker uses for sync functions
+DEFAULT_WORKER_THREADS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def _summarise(mode, concurrency, workers, elapsed, latencies, statuses):
+    latencies.sort()
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'workers': workers,
+        'requests': len(latencies),
+        'status_codes': statuses,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3),
+        },
+    }
+
+
+def _count(statuses, status_code):
+    statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+
+
+def drive_sync(handler, requests, concurrency, threads):
+    """``concurrency`` clients submitting to a ``threads``-sized pool; latency includes queueing"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    chunks = [requests[index::concurrency] for index in range(concurrency)]
+
+    with ThreadPoolExecutor(max_workers=threads) as worker:
+        def client(chunk):
+            for req in chunk:
+                started = time.perf_counter()
+                response = worker.submit(handler, req).result()
+                latency = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(latency)
+                    _count(statuses, response.status_code)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            list(clients.map(client, chunks))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, statuses
+
+
+async def drive_async(handler, requests, concurrency):
+    """``concurrency`` client coroutines awaiting ``handler`` on one event loop"""
+    latencies = []
+    statuses = {}
+
+    async def client(chunk):
+        for req in chunk:
+            started = time.perf_counter()
+            response = await handler(req)
+            latencies.append((time.perf_counter() - started) * 1000)
+            _count(statuses, response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(requests[index::concurrency]) for index in range(concurrency)))
+    return time.perf_counter() - started, latencies, statuses
+
+
+def install_stand_ins(stack, args):
+    import contact_form
+    import contact_form_async
+    from shared_code import transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    faults = {
+        'send': lambda seed: Fault.parse(args.acs_send, seed=seed),
+        'poll': lambda seed: Fault.parse(args.acs_poll, seed=seed),
+        'siteverify': lambda seed: Fault.parse(args.siteverify, seed=seed),
+    }
+    email_client = FakeEmailClient(faults['send'](1), faults['poll'](2))
+    async_email_client = FakeAsyncEmailClient(faults['send'](1), faults['poll'](2))
+    siteverify = FakeSiteverifySession(faults['siteverify'](3))
+    async_siteverify = FakeAsyncSiteverifySession(faults['siteverify'](3))
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify, async_session_factory=lambda: async_siteverify)
+
+    stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+    stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+    stack.enter_context(mock.patch.object(transport, 'get_async_email_client', lambda _: async_email_client))
+    stack.enter_context(mock.patch.object(contact_form_async, 'get_verifier', lambda: verifier))
+    return contact_form.main, contact_form_async.main
+
+
+def run(args):
+    results = []
+    with ExitStack() as stack:
+        sync_main, async_main = install_stand_ins(stack, args)
+        run_id = 0
+        for concurrency in args.concurrency:
+            count = max(args.requests, concurrency)
+            modes = [
+                ('sync_worker_pool', min(concurrency, args.sync_threads)),
+                ('sync_thread_per_request', concurrency),
+            ]
+            for mode, threads in modes:
+                run_id += 1
+                elapsed, latencies, statuses = drive_sync(
+                    sync_main, build_requests('valid', count, run_id), concurrency, threads)
+                results.append(_summarise(mode, concurrency, threads, elapsed, latencies, statuses))
+                print_result(results[-1])
+
+            run_id += 1
+            elapsed, latencies, statuses = asyncio.run(
+                drive_async(async_main, build_requests('valid', count, run_id), concurrency))
+            results.append(_summarise('async', concurrency, 1, elapsed, latencies, statuses))
+            print_result(results[-1])
+    return results
+
+
+def print_result(result):
+    latency = result['latency_ms']
+    print(f"{result['mode']:<26}{result['concurrency']:>6}{result['workers']:>9}{result['throughput_rps']:>10.1f}"
+          f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}  {result['status_codes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async contact pipeline under concurrent load')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200], help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per mode and concurrency level')
+    parser.add_argument('--sync-threads', type=int, default=DEFAULT_WORKER_THREADS,
+                        help='worker thread pool size for the sync function')
+    parser.add_argument('--siteverify', default='80:20', help='Google siteverify fault spec')
+    parser.add_argument('--acs-send', default='60:15', help='ACS begin_send fault spec')
+    parser.add_argument('--acs-poll', default='250:50', help='ACS poller.result fault spec')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/async-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    print(f"{'mode':<26}{'conc':>6}{'workers':>9}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  status")
+    results = run(args)
+    output = write_report('async', {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Circuit breakers under a dependency outage, against fault-injecting stand-ins.
+
+contact_form.main is driven through three phases, with and without
+breakers (CIRCUIT_BREAKERS):
+
+- healthy: siteverify, ACS and SendGrid answer normally
+- outage: the failing dependencies (--fail, default both email providers) raise after
+  --outage-latency ms, the way a dependency that times out does
+- recovery: everything is healthy again, after BREAKER_OPEN_SECONDS so the
+  breakers can probe and close
+
+The report has latency percentiles, status codes and calls that reached
+each stand-in per phase, plus the breaker transitions. With breakers the
+outage phase should stop paying the outage latency after BREAKER_MIN_CALLS
+requests and answer from the configured policy instead: queued (202) or 503
+for email, 503 or a pass on the local pre-checks for reCAPTCHA.
+
+    python -m benchmarks.bench_breaker
+    python -m benchmarks.bench_breaker --fail acs --email-policy fail
+    python -m benchmarks.bench_breaker --fail recaptcha --recaptcha-policy local
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+# Configuration must be in place before the function modules are imported
+os.environ.update({
+    'AZURE_COMMUNICATION_CONNECTION_STRING': 'endpoint=https://stand-in.communication.azure.com/;accesskey=c3RhbmQtaW4=',
+    'SENDGRID_API_KEY': 'stand-in',
+    'RECAPTCHA_SECRET_KEY': 'stand-in',
+    'SKIP_RECAPTCHA': 'false',
+    'EMAIL_DELIVERY_MODE': 'sync',
+    'SUBMISSION_LOG': 'false',
+})
+
+from benchmarks.load_test import build_requests, drive, percentile  # noqa: E402
+from benchmarks.reporting import write_report  # noqa: E402
+from benchmarks.stand_ins import (  # noqa: E402
+    FakeEmailClient, FakeSiteverifySession, Fault, fake_sendgrid_client,
+)
+from shared_code import metrics  # noqa: E402
+from shared_code.settings import get_settings, reload_settings  # noqa: E402
+
+DEPENDENCIES = ('recaptcha', 'acs', 'sendgrid')
+PHASES = ('healthy', 'outage', 'recovery')
+
+
+def configure(breakers, args, outbox_path):
+    os.environ.update({
+        'CIRCUIT_BREAKERS': 'true' if breakers else 'false',
+        'BREAKER_MIN_CALLS': str(args.min_calls),
+        'BREAKER_WINDOW_SECONDS': str(args.window_seconds),
+        'BREAKER_OPEN_SECONDS': str(args.open_seconds),
+        'RECAPTCHA_BREAKER_POLICY': args.recaptcha_policy,
+        'EMAIL_BREAKER_POLICY': args.email_policy,
+        'OUTBOX_DB_PATH': outbox_path,
+    })
+    reload_settings()
+
+
+def counter_values(name):
+    return {
+        tuple(sorted(entry['labels'].items())): entry['value']
+        for entry in metrics.REGISTRY.snapshot()['counters'].get(name, [])
+    }
+
+
+def run_mode(breakers, args, outbox_path, run_base):
+    import contact_form
+    from shared_code import transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    configure(breakers, args, outbox_path)
+    # A fresh sender per mode, so provider health doesn't carry over
+    sender = transport.EmailSender(transport.configured_transports(get_settings()))
+    faults = {name: Fault() for name in DEPENDENCIES}
+    email_client = FakeEmailClient(send_fault=faults['acs'])
+    siteverify = FakeSiteverifySession(faults['recaptcha'])
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify)
+    sendgrid_client = fake_sendgrid_client(faults['sendgrid'])
+    calls = {'recaptcha': siteverify.calls, 'acs': email_client.sent, 'sendgrid': sendgrid_client.sent}
+    transitions_before = counter_values('circuit_breaker_transitions_total')
+
+    phases = []
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+        stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+        stack.enter_context(mock.patch.object(contact_form, 'get_sender', lambda: sender))
+        stack.enter_context(mock.patch('sendgrid.SendGridAPIClient', sendgrid_client))
+
+        for index, phase in enumerate(PHASES):
+            for name in args.fail:
+                faults[name].latency_ms = args.outage_latency if phase == 'outage' else 0.0
+                faults[name].error_rate = 1.0 if phase == 'outage' else 0.0
+            if phase == 'recovery':
+                time.sleep(args.open_seconds)
+            before = {name: counter.value for name, counter in calls.items()}
+            requests = build_requests('valid', args.requests, run_base + index)
+            elapsed, latencies, statuses = drive(contact_form.main, requests, args.concurrency)
+            latencies.sort()
+            phases.append({
+                'phase': phase,
+                'status_codes': statuses,
+                'throughput_rps': round(len(latencies) / elapsed, 1),
+                'latency_ms': {
+                    'mean': round(statistics.fmean(latencies), 2),
+                    'p50': round(percentile(latencies, 0.50), 2),
+                    'p95': round(percentile(latencies, 0.95), 2),
+                    'p99': round(percentile(latencies, 0.99), 2),
+                },
+                'dependency_calls': {name: counter.value - before[name] for name, counter in calls.items()},
+            })
+
+    transitions = {
+        ','.join(f'{key}={value}' for key, value in labels): count - transitions_before.get(labels, 0)
+        for labels, count in counter_values('circuit_breaker_transitions_total').items()
+        if count != transitions_before.get(labels, 0)
+    }
+    return {'breakers': breakers, 'phases': phases, 'transitions': transitions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Circuit breakers under a dependency outage')
+    parser.add_argument('--fail', nargs='+', choices=DEPENDENCIES, default=['acs', 'sendgrid'],
+                        help='dependencies that fail')
+    parser.add_argument('--requests', type=int, default=200, help='requests per phase')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--outage-latency', type=float, default=200.0, help='ms before a failing call raises')
+    parser.add_argument('--min-calls', type=int, default=10, help='BREAKER_MIN_CALLS')
+    parser.add_argument('--window-seconds', type=float, default=1.0,
+                        help='BREAKER_WINDOW_SECONDS (short, so healthy-phase calls age out quickly)')
+    parser.add_argument('--open-seconds', type=float, default=2.0, help='BREAKER_OPEN_SECONDS')
+    parser.add_argument('--recaptcha-policy', choices=('fail_closed', 'local'), default='fail_closed')
+    parser.add_argument('--email-policy', choices=('queue', 'fail'), default='queue')
+    parser.add_argument('--log-level', default='INFO', help='function log level (output goes to /dev/null)')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/breaker-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), stream=open(os.devnull, 'w'))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for run_index, breakers in enumerate((False, True)):
+            outbox_path = os.path.join(directory, f'outbox-{run_index}.sqlite3')
+            results.append(run_mode(breakers, args, outbox_path, 10 * (run_index + 1)))
+
+    print(f"failing: {', '.join(args.fail)}  ({args.outage_latency:g} ms, then error)")
+    print(f"{'breakers':<10}{'phase':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  "
+          f"{'calls (recaptcha/acs/sendgrid)':<32}status")
+    for result in results:
+        for phase in result['phases']:
+            latency = phase['latency_ms']
+            dependency_calls = '/'.join(str(phase['dependency_calls'][name]) for name in DEPENDENCIES)
+            print(f"{'on' if result['breakers'] else 'off':<10}{phase['phase']:<10}{phase['throughput_rps']:>9.1f}"
+                  f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}  "
+                  f"{dependency_calls:<32}{json.dumps(phase['status_codes'])}")
+    for result in results:
+        if result['transitions']:
+            print(f"transitions: {result['transitions']}")
+
+    output = write_report('breaker', {'config': vars(args), 'results': results}, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
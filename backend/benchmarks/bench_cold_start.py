@@ -0,0 +1,144 @@
+"""
+Cold-start benchmark for the contact functions.
+
+For each function module this reports:
+
+- an ``-X importtime`` breakdown of what importing the module costs on top
+  of azure.functions (which the Python worker has already loaded), and
+- time to first response in a fresh interpreter: import, then a CORS
+  preflight, then a submission rejected by validation, plus which heavy
+  SDKs those requests pulled in (none should be loaded).
+
+    python -m benchmarks.bench_cold_start [--runs 5] [--top 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.reporting import write_report
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('contact_form', 'contact_form_azure_native')
+HEAVY_MODULES = ('requests', 'azure.communication.email', 'sendgrid', 'dotenv', 'redis', 'sqlite3')
+
+# Runs in a fresh interpreter; prints one JSON line with the timings.
+_FIRST_RESPONSE_SCRIPT = """
+import json, sys, time
+import azure.functions as func
+
+started = time.perf_counter()
+import {module} as function
+imported = time.perf_counter()
+
+preflight = function.main(func.HttpRequest('OPTIONS', 'http://localhost/api/contact', body=b''))
+after_preflight = time.perf_counter()
+preflight_modules = [name for name in {heavy!r} if name in sys.modules]
+
+rejected = function.main(func.HttpRequest(
+    'POST', 'http://localhost/api/contact', body=b'{{"email": "a@example.com"}}',
+    headers={{'X-Forwarded-For': '192.0.2.1'}},
+))
+after_rejected = time.perf_counter()
+
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'preflight_ms': (after_preflight - imported) * 1000,
+    'rejected_ms': (after_rejected - after_preflight) * 1000,
+    'first_response_ms': (after_preflight - started) * 1000,
+    'preflight_status': preflight.status_code,
+    'rejected_status': rejected.status_code,
+    'heavy_after_preflight': preflight_modules,
+    'heavy_after_rejected': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _run(args, env=None):
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, **(env or {})},
+    )
+
+
+def import_breakdown(module, top):
+    """Parse -X importtime output into the module total and its costliest direct imports"""
+    stderr = _run(['-X', 'importtime', '-c', f'import azure.functions; import {module}']).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # "import time:  self [us] | cumulative | <indent>name"
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        self_us = int(self_us)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, name.strip(), self_us, int(cumulative_us)))
+
+    # Lines are emitted children-first; everything after azure.functions'
+    # own top-level line belongs to the function module.
+    start = max(index for index, entry in enumerate(entries) if entry[0] == 0 and entry[1] == 'azure.functions') + 1
+    own = entries[start:]
+    total = next(entry[3] for entry in own if entry[0] == 0 and entry[1] == module)
+    children = sorted((entry for entry in own if entry[0] == 1), key=lambda entry: entry[3], reverse=True)
+    return {
+        'total_ms': round(total / 1000, 2),
+        'top_imports': [
+            {'module': name, 'cumulative_ms': round(cumulative / 1000, 2), 'self_ms': round(self_us / 1000, 2)}
+            for _, name, self_us, cumulative in children[:top]
+        ],
+    }
+
+
+def first_response(module, runs):
+    samples = []
+    for _ in range(runs):
+        script = _FIRST_RESPONSE_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        # No secrets configured: the rejected POST must fail validation first
+        stdout = _run(['-c', script], env={'PYTHONDONTWRITEBYTECODE': '1'}).stdout
+        samples.append(json.loads(stdout.strip().splitlines()[-1]))
+    summary = {
+        key: round(statistics.median(sample[key] for sample in samples), 2)
+        for key in ('import_ms', 'preflight_ms', 'rejected_ms', 'first_response_ms')
+    }
+    last = samples[-1]
+    summary.update({
+        'preflight_status': last['preflight_status'],
+        'rejected_status': last['rejected_status'],
+        'heavy_after_preflight': last['heavy_after_preflight'],
+        'heavy_after_rejected': last['heavy_after_rejected'],
+        'runs': runs,
+    })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start benchmark for the contact functions')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--top', type=int, default=10, help='direct imports to list per module')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/cold_start-<commit>.json)')
+    args = parser.parse_args()
+
+    results = {}
+    for module in MODULES:
+        breakdown = import_breakdown(module, args.top)
+        timings = first_response(module, args.runs)
+        results[module] = {'import': breakdown, 'first_response': timings}
+
+        print(f'\n{module}: import {breakdown["total_ms"]} ms, '
+              f'first response {timings["first_response_ms"]} ms (median of {args.runs})')
+        for entry in breakdown['top_imports']:
+            print(f'    {entry["module"]:<40}{entry["cumulative_ms"]:>9.2f} ms')
+        print(f'    preflight {timings["preflight_status"]} in {timings["preflight_ms"]} ms, '
+              f'rejected POST {timings["rejected_status"]} in {timings["rejected_ms"]} ms')
+        print(f'    heavy modules loaded: after preflight {timings["heavy_after_preflight"]}, '
+              f'after rejected POST {timings["heavy_after_rejected"]}')
+
+    output = write_report('cold_start', {'results': results}, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Outbound ACS calls with and without digest mode during a submission burst.
+
+Replays a simulated burst (N submissions spread over a window, a fraction of
+them matching the priority rules) against a temporary outbox database. The
+timeline is simulated: each dispatcher tick flushes due digests with an
+explicit clock and delivers the outbox through the EmailSender on a
+stand-in EmailClient, so the run takes seconds regardless of the window
+length.
+
+    python -m benchmarks.bench_digest --submissions 500 --window 600 --recipients 2
+    python -m benchmarks.bench_digest --interval 120 --max-submissions 50 --priority-rate 0.05
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+from unittest import mock
+
+from benchmarks.reporting import write_report
+from benchmarks.stand_ins import FakeEmailClient
+from shared_code import digest, outbox, transport
+from shared_code.payload import Submission
+
+PRIORITY_RULES = 'subject=urgent|injunction'
+SENDER = 'DoNotReply@stand-in.example.com'
+
+
+def build_submission(index, priority):
+    return Submission(
+        name=f'Burst {index}',
+        email=f'burst.{index}@example.com',
+        phone='',
+        company='Benchmark & Co.',
+        subject='Urgent: interim injunction' if priority else 'Delay analysis enquiry',
+        message='Please call me back about an extension of time claim.',
+        recaptcha_token=None,
+    )
+
+
+def simulate(args, path):
+    box = outbox.Outbox(path)
+    buffer = digest.Digest(box)
+    client = FakeEmailClient()
+    sender = transport.EmailSender([transport.AcsTransport('stand-in')])
+    recipients = tuple(f'partner{index}@example.com' for index in range(args.recipients))
+    rng = random.Random(args.seed)
+
+    arrivals = sorted(rng.uniform(0, args.window) for _ in range(args.submissions))
+    buffered_at = {}
+    delays = []
+    priority_sends = 0
+
+    def tick(now):
+        flushed = buffer.flush_due(SENDER, recipients, args.interval, args.max_submissions, now=now)
+        if flushed['digests']:
+            for submission_id, created_at in list(buffered_at.items()):
+                if buffer.get(submission_id)['status'] == 'batched':
+                    delays.append(now - created_at)
+                    del buffered_at[submission_id]
+        # Short backoff so injected failures would retry within the simulation
+        with mock.patch.object(transport, 'get_email_client', lambda _: client):
+            outbox.dispatch(box, sender, batch_size=1000, backoff_seconds=0)
+
+    next_tick = args.tick
+    for index, arrival in enumerate(arrivals):
+        while next_tick <= arrival:
+            tick(next_tick)
+            next_tick += args.tick
+        submission = build_submission(index, rng.random() < args.priority_rate)
+        if digest.is_priority(submission, PRIORITY_RULES):
+            # Sent immediately: one ACS call, as without digest mode
+            client.begin_send({'recipients': {'to': [{'address': address} for address in recipients]}})
+            priority_sends += 1
+        else:
+            values = {'name': submission.name, 'email': submission.email, 'phone': 'Not provided',
+                      'company': submission.company, 'subject': submission.subject,
+                      'message': submission.message, 'submitted_on': f't+{arrival:.0f}s', 'ip_address': '10.0.0.1'}
+            submission_id = buffer.add(values, now=arrival)
+            buffered_at[submission_id] = arrival
+    # Keep ticking until the tail of the burst has been flushed
+    while buffered_at:
+        tick(next_tick)
+        next_tick += args.tick
+
+    stats = buffer.stats()
+    without_digest = args.submissions
+    with_digest = client.sent.value
+    delays.sort()
+    return {
+        'submissions': args.submissions,
+        'priority_sends': priority_sends,
+        'digests': stats['digests'],
+        'digest_messages': stats['messages'],
+        'acs_calls_without_digest': without_digest,
+        'acs_calls_with_digest': with_digest,
+        'acs_calls_saved': without_digest - with_digest,
+        'saved_percent': round((1 - with_digest / without_digest) * 100, 1) if without_digest else 0.0,
+        'digest_delay_seconds': {
+            'p50': round(statistics.median(delays), 1) if delays else 0.0,
+            'max': round(delays[-1], 1) if delays else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ACS calls saved by digest mode during a burst')
+    parser.add_argument('--submissions', type=int, default=500, help='submissions in the burst')
+    parser.add_argument('--window', type=float, default=600, help='burst duration in seconds')
+    parser.add_argument('--recipients', type=int, default=2, help='addresses in LAWGATE_EMAIL')
+    parser.add_argument('--priority-rate', type=float, default=0.02, help='fraction matching the priority rules')
+    parser.add_argument('--interval', type=float, default=300, help='DIGEST_INTERVAL_SECONDS')
+    parser.add_argument('--max-submissions', type=int, default=20, help='DIGEST_MAX_SUBMISSIONS')
+    parser.add_argument('--tick', type=float, default=15, help='dispatcher timer period in seconds')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/digest-<commit>.json)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = simulate(args, os.path.join(directory, 'outbox.sqlite3'))
+
+    for key, value in result.items():
+        print(f'{key:<28}{value}')
+    output = write_report('digest', {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'result': result,
+    }, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
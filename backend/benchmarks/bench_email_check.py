@@ -0,0 +1,190 @@
+"""
+Email validation cost and the effect of the domain cache.
+
+- syntax: time per address of shared_code.email_check.normalize over a mix
+  of valid, internationalised and malformed addresses, and how many of the
+  malformed ones the old ``'@' in email and '.' in email`` check let
+  through (each of those cost a siteverify call and an ACS send)
+- domains: a stream of addresses whose domains follow a Zipf distribution
+  (a few common providers, a long tail, some that don't exist or don't take
+  mail) validated against a stand-in resolver with --dns latency, with the
+  cache off and on; the report has the latency per address and the lookups
+  that reached the resolver
+- end to end: contact_form.main with invalid addresses and the domain check
+  on, counting the calls that reached siteverify and ACS (should be none)
+
+    python -m benchmarks.bench_email_check
+    python -m benchmarks.bench_email_check --addresses 20000 --domains 2000 --dns 40:20
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+# Configuration must be in place before the function modules are imported
+os.environ.update({
+    'AZURE_COMMUNICATION_CONNECTION_STRING': 'endpoint=https://stand-in.communication.azure.com/;accesskey=c3RhbmQtaW4=',
+    'SENDGRID_API_KEY': '',
+    'RECAPTCHA_SECRET_KEY': 'stand-in',
+    'SKIP_RECAPTCHA': 'false',
+    'EMAIL_DELIVERY_MODE': 'sync',
+    'SUBMISSION_LOG': 'false',
+    'RATE_LIMIT_MAX': '1000000',
+})
+
+from benchmarks.load_test import build_requests, percentile  # noqa: E402
+from benchmarks.reporting import write_report  # noqa: E402
+from benchmarks.stand_ins import FakeEmailClient, FakeResolver, FakeSiteverifySession, Fault  # noqa: E402
+from shared_code import email_check  # noqa: E402
+
+VALID = [
+    'priya.sharma@example.com', 'a.k.gupta+contracts@lawgate.in', 'info@sub.domain.co.uk',
+    'o\'connor@example.ie', 'Ana@Bücher.example', 'user@ｅxample。com', 'x_y-z@xn--bcher-kva.example',
+]
+INVALID = [
+    'plainaddress', 'missing-at.example.com', '@example.com', 'user@', 'user@localhost',
+    'user..name@example.com', '.user@example.com', 'user.@example.com', 'user@-example.com',
+    'user@example..com', 'user@example.c', 'user@example.123', 'user name@example.com',
+    'user@[192.168.0.1]', '"quoted"@example.com', 'ü@example.com', 'user@exa_mple.com',
+    'user@example.com.', 'user@.example.com', 'a' * 65 + '@example.com',
+]
+
+
+def old_check(address):
+    return '@' in address and '.' in address
+
+
+def bench_syntax(repeat):
+    samples = [(address, True) for address in VALID] + [(address, False) for address in INVALID]
+    errors = [address for address, expected in samples if (email_check.normalize(address)[2] is None) != expected]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for address, _ in samples:
+            email_check.normalize(address)
+        timings.append((time.perf_counter_ns() - started) / len(samples))
+    return {
+        'addresses': len(samples),
+        'ns_per_address': round(statistics.median(timings)),
+        'misclassified': errors,
+        'old_check_accepted_invalid': sum(old_check(address) for address in INVALID),
+        'invalid': len(INVALID),
+    }
+
+
+def build_stream(args):
+    """Addresses over --domains domains with Zipf(1.1) popularity; every tenth domain doesn't take mail"""
+    rng = random.Random(7)
+    domains = [f'domain{index}.example' for index in range(args.domains)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(args.domains)]
+    statuses = {}
+    for index, domain in enumerate(domains):
+        if index % 10 == 9:
+            statuses[domain] = email_check.NO_MAIL if index % 20 == 9 else email_check.NO_DOMAIN
+        else:
+            statuses[domain] = email_check.MAIL
+    picks = rng.choices(domains, weights, k=args.addresses)
+    return [f'user{index}@{domain}' for index, domain in enumerate(picks)], statuses
+
+
+def bench_domains(args):
+    addresses, statuses = build_stream(args)
+    results = []
+    for cached in (False, True):
+        resolver = FakeResolver(statuses, Fault.parse(args.dns, seed=3))
+        validator = email_check.EmailValidator(
+            domain_check=True, resolver=resolver, cache_max_entries=args.cache_entries if cached else 0)
+        latencies = []
+        rejected = 0
+        for address in addresses:
+            started = time.perf_counter()
+            result = validator.validate(address)
+            latencies.append((time.perf_counter() - started) * 1000)
+            rejected += not result.valid
+        latencies.sort()
+        results.append({
+            'cache': cached,
+            'lookups': resolver.calls.value,
+            'rejected': rejected,
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'stats': validator.get_stats(),
+        })
+    return results
+
+
+def bench_end_to_end(args):
+    import contact_form
+    from shared_code import transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    email_client = FakeEmailClient()
+    siteverify = FakeSiteverifySession()
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify)
+    resolver = FakeResolver({'example.com': email_check.MAIL, 'null-mx.example': email_check.NO_MAIL})
+    validator = email_check.EmailValidator(domain_check=True, resolver=resolver)
+    statuses = {}
+    requests = build_requests('valid', args.end_to_end, 90)
+    bad = INVALID + ['someone@null-mx.example', 'someone@no-such-domain.example']
+    for index, req in enumerate(requests):
+        body = json.loads(req.get_body())
+        body['email'] = bad[index % len(bad)]
+        requests[index] = req.__class__(method='POST', url=req.url, headers=dict(req.headers),
+                                        body=json.dumps(body).encode('utf-8'))
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+        stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+        stack.enter_context(mock.patch.object(email_check, 'get_validator', lambda: validator))
+        for req in requests:
+            status = str(contact_form.main(req).status_code)
+            statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'requests': len(requests),
+        'status_codes': statuses,
+        'siteverify_calls': siteverify.calls.value,
+        'acs_sends': email_client.sent.value,
+        'dns_lookups': resolver.calls.value,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Email validation cost and domain cache effect')
+    parser.add_argument('--repeat', type=int, default=2000, help='passes over the syntax samples')
+    parser.add_argument('--addresses', type=int, default=5000, help='addresses in the domain stream')
+    parser.add_argument('--domains', type=int, default=500, help='distinct domains in the stream')
+    parser.add_argument('--dns', default='20:10', help='stand-in resolver fault spec (latency_ms[:jitter[:errors]])')
+    parser.add_argument('--cache-entries', type=int, default=4096, help='EMAIL_DOMAIN_CACHE_MAX_ENTRIES')
+    parser.add_argument('--end-to-end', type=int, default=200, help='invalid submissions sent to contact_form')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/email_check-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    report = {'config': vars(args), 'syntax': bench_syntax(args.repeat)}
+    report['domains'] = bench_domains(args)
+    report['end_to_end'] = bench_end_to_end(args)
+
+    syntax = report['syntax']
+    print(f"syntax: {syntax['ns_per_address']} ns/address over {syntax['addresses']} samples, "
+          f"misclassified: {syntax['misclassified'] or 'none'}; old check accepted "
+          f"{syntax['old_check_accepted_invalid']}/{syntax['invalid']} invalid addresses")
+    print(f"\n{'cache':<7}{'lookups':>9}{'rejected':>10}{'p50 ms':>9}{'p99 ms':>9}{'mean ms':>9}")
+    for row in report['domains']:
+        print(f"{'on' if row['cache'] else 'off':<7}{row['lookups']:>9}{row['rejected']:>10}"
+              f"{row['p50_ms']:>9}{row['p99_ms']:>9}{row['mean_ms']:>9}")
+    print(f"\nend to end: {report['end_to_end']}")
+
+    output = write_report('email_check', report, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
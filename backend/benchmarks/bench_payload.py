@@ -0,0 +1,145 @@
+"""
+Request body decoding: the old two-pass parse against shared_code.payload.
+
+Each input is decoded by the parse contact_form used before payload.py
+(req.get_json(), then decode and json.loads again on ValueError, no size
+limit) and by payload.decode with orjson and with the stdlib fallback. The
+report has the median time per call, the outcome (decoded or the exception
+raised) and the peak memory traced while decoding.
+
+    python -m benchmarks.bench_payload
+    python -m benchmarks.bench_payload --oversized-mb 1 8 --min-seconds 0.5
+"""
+
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from unittest import mock
+
+import azure.functions as func
+
+from benchmarks.reporting import write_report
+from shared_code import payload
+
+MAX_BODY_BYTES = 32 * 1024  # the Settings default
+
+BASE = {
+    'name': 'Priya Sharma',
+    'email': 'priya.sharma@example.com',
+    'phone': '+91 98765 43210',
+    'company': 'Sharma Infra Pvt Ltd',
+    'subject': 'Delay analysis',
+    'message': 'We need support with a delay analysis for an extension of time claim. ' * 4,
+    'captcha': 'token-' + 'x' * 400,
+    'submissionTime': 21000,
+}
+
+
+def build_inputs(oversized_mb):
+    def body(**changes):
+        return json.dumps({**BASE, **changes}).encode('utf-8')
+
+    inputs = {
+        'valid': body(),
+        'valid_long_message': body(message='Detailed background. ' * 450),
+        'field_too_long': body(message='x' * 20000),
+        'malformed': body()[:-20],
+        'not_object': json.dumps([BASE]).encode('utf-8'),
+    }
+    for size in oversized_mb:
+        inputs[f'oversized_{size}mb'] = body(message='spam ' * (size * 1024 * 1024 // 5))
+        inputs[f'malformed_{size}mb'] = inputs[f'oversized_{size}mb'][:-20]
+    return inputs
+
+
+def legacy_parse(req):
+    """contact_form's body parsing before shared_code.payload"""
+    try:
+        return req.get_json()
+    except ValueError:
+        raw = req.get_body()
+        return json.loads(raw.decode('utf-8') if raw else '{}')
+
+
+def _request(body):
+    return func.HttpRequest(method='POST', url='http://localhost:7071/api/contact', headers={}, body=body)
+
+
+def decoders():
+    """``(name, decode, orjson module to use)``; payload_stdlib runs with orjson hidden"""
+    def decode(body):
+        return payload.decode(body, MAX_BODY_BYTES)
+
+    return [
+        ('legacy', lambda body: legacy_parse(_request(body)), payload.orjson),
+        ('payload_orjson', decode, payload.orjson),
+        ('payload_stdlib', decode, None),
+    ]
+
+
+def outcome(decoder, body):
+    try:
+        decoder(body)
+    except Exception as e:
+        return type(e).__name__
+    return 'decoded'
+
+
+def measure(decoder, body, min_seconds):
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline or len(timings) < 5:
+        started = time.perf_counter()
+        try:
+            decoder(body)
+        except Exception:
+            pass
+        timings.append((time.perf_counter() - started) * 1e6)
+
+    tracemalloc.start()
+    try:
+        decoder(body)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(statistics.median(timings), 2), round(peak / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Request body decoding: legacy vs shared_code.payload')
+    parser.add_argument('--oversized-mb', type=int, nargs='+', default=[1, 8], help='oversized body sizes')
+    parser.add_argument('--min-seconds', type=float, default=0.3, help='timing budget per input and decoder')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/payload-<commit>.json)')
+    args = parser.parse_args()
+
+    payload.loads(b'{}')  # resolve the optional orjson import before patching it
+    results = []
+    print(f"{'input':<22}{'bytes':>10}  {'decoder':<16}{'median us':>12}{'peak KiB':>11}  outcome")
+    for name, body in build_inputs(args.oversized_mb).items():
+        for decoder_name, decoder, json_module in decoders():
+            with mock.patch.object(payload, 'orjson', json_module):
+                median_us, peak_kib = measure(decoder, body, args.min_seconds)
+                result = {
+                    'input': name,
+                    'bytes': len(body),
+                    'decoder': decoder_name,
+                    'median_us': median_us,
+                    'peak_memory_kib': peak_kib,
+                    'outcome': outcome(decoder, body),
+                }
+            results.append(result)
+            print(f"{name:<22}{len(body):>10}  {decoder_name:<16}{median_us:>12.2f}{peak_kib:>11.1f}  {result['outcome']}")
+
+    output = write_report('payload', {
+        'config': {'oversized_mb': args.oversized_mb, 'max_body_bytes': MAX_BODY_BYTES,
+                   'orjson': payload.orjson is not None},
+        'results': results,
+    }, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
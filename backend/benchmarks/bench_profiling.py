@@ -0,0 +1,170 @@
+"""
+Cost of the profiling hook (shared_code.profiling) on contact_form.main.
+
+- disabled: the decorated main against the undecorated one
+  (``main.__wrapped__``) on cheap requests, where a fixed per-call cost
+  shows most. Runs alternate between the two in rounds so drift on the
+  machine affects both alike; the overhead is reported in ns per call.
+  A cheap request still takes tens of microseconds, so the hook is also
+  timed around a function that does nothing, which isolates its own cost.
+- token set: the same, with PROFILE_TOKEN configured but no header sent
+  (the extra header lookup and nothing else).
+- enabled: valid submissions with PROFILE_SAMPLE_RATE=1 against plain
+  ones, per PROFILE_MODE, with the size of the files written.
+
+    python -m benchmarks.bench_profiling
+    python -m benchmarks.bench_profiling --calls 50000 --rounds 7 --profiled 100
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+# Configuration must be in place before the function modules are imported
+os.environ.update({
+    'AZURE_COMMUNICATION_CONNECTION_STRING': 'endpoint=https://stand-in.communication.azure.com/;accesskey=c3RhbmQtaW4=',
+    'SENDGRID_API_KEY': '',
+    'RECAPTCHA_SECRET_KEY': 'stand-in',
+    'SKIP_RECAPTCHA': 'false',
+    'EMAIL_DELIVERY_MODE': 'sync',
+    'SUBMISSION_LOG': 'false',
+    'PROFILE_SAMPLE_RATE': '0',
+    'PROFILE_TOKEN': '',
+})
+
+import azure.functions as func  # noqa: E402
+
+from benchmarks.load_test import build_requests, percentile  # noqa: E402
+from benchmarks.reporting import write_report  # noqa: E402
+from benchmarks.stand_ins import FakeEmailClient, FakeSiteverifySession  # noqa: E402
+from shared_code.settings import reload_settings  # noqa: E402
+
+
+def per_call_ns(fn, requests):
+    started = time.perf_counter_ns()
+    for req in requests:
+        fn(req)
+    return (time.perf_counter_ns() - started) / len(requests)
+
+
+def wrapper_overhead(main, requests, rounds):
+    """Median ns per call of the decorated and undecorated main, alternating"""
+    raw = main.__wrapped__
+    wrapped_ns, raw_ns = [], []
+    per_call_ns(main, requests[:1000])  # warm up
+    for _ in range(rounds):
+        wrapped_ns.append(per_call_ns(main, requests))
+        raw_ns.append(per_call_ns(raw, requests))
+    wrapped, plain = statistics.median(wrapped_ns), statistics.median(raw_ns)
+    return {
+        'calls': len(requests),
+        'wrapped_ns': round(wrapped),
+        'raw_ns': round(plain),
+        'overhead_ns': round(wrapped - plain),
+        'overhead_pct': round((wrapped - plain) / plain * 100, 2),
+    }
+
+
+def hook_ns(requests, rounds):
+    """ns per call the hook adds around a function that does nothing"""
+    from shared_code import profiling
+
+    noop = profiling.profiled('noop')(lambda req: None)
+    requests = requests * 10
+    return wrapper_overhead(noop, requests, rounds)['overhead_ns']
+
+
+def cheap_requests(count):
+    preflight = func.HttpRequest(method='OPTIONS', url='http://localhost:7071/api/contact', headers={}, body=b'')
+    invalid = build_requests('missing_fields', count // 2, 50)
+    return [preflight] * (count - len(invalid)) + invalid
+
+
+def profiled_cost(main, mode, args, directory, run_id):
+    """Latency of valid submissions with every one profiled in ``mode``, against none"""
+    results = {}
+    for label, rate in (('plain', '0'), ('profiled', '1')):
+        os.environ.update({'PROFILE_SAMPLE_RATE': rate, 'PROFILE_MODE': mode, 'PROFILE_DIR': directory})
+        reload_settings()
+        latencies = []
+        for req in build_requests('valid', args.profiled, run_id + (rate == '1')):
+            started = time.perf_counter()
+            main(req)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        results[label] = {
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+        }
+
+    written = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            kind = name.split('.', 1)[1]
+            count, size = written.get(kind, (0, 0))
+            written[kind] = (count + 1, size + os.path.getsize(os.path.join(root, name)))
+    return {
+        'mode': mode,
+        **results,
+        'files': {kind: {'count': count, 'mean_bytes': round(size / count)} for kind, (count, size) in written.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost of the profiling hook')
+    parser.add_argument('--calls', type=int, default=20000, help='cheap requests per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--profiled', type=int, default=50, help='valid submissions per enabled-mode run')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/profiling-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    import contact_form
+    from shared_code import transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    email_client = FakeEmailClient()
+    siteverify = FakeSiteverifySession()
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify)
+    requests = cheap_requests(args.calls)
+    report = {'config': vars(args)}
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+        stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+
+        report['disabled'] = wrapper_overhead(contact_form.main, requests, args.rounds)
+        report['disabled']['hook_ns'] = hook_ns(requests, args.rounds)
+        os.environ['PROFILE_TOKEN'] = 'bench-token'
+        reload_settings()
+        report['token_set'] = wrapper_overhead(contact_form.main, requests, args.rounds)
+        report['token_set']['hook_ns'] = hook_ns(requests, args.rounds)
+        os.environ['PROFILE_TOKEN'] = ''
+
+        report['enabled'] = []
+        for index, mode in enumerate(('cpu', 'memory', 'cpu,memory')):
+            with tempfile.TemporaryDirectory() as directory:
+                report['enabled'].append(profiled_cost(contact_form.main, mode, args, directory, 60 + 2 * index))
+
+    print(f"{'hook':<11}{'wrapped ns':>12}{'raw ns':>10}{'overhead ns':>13}{'overhead':>10}{'hook alone ns':>15}")
+    for label in ('disabled', 'token_set'):
+        row = report[label]
+        print(f"{label:<11}{row['wrapped_ns']:>12}{row['raw_ns']:>10}{row['overhead_ns']:>13}"
+              f"{row['overhead_pct']:>9}%{row['hook_ns']:>15}")
+    print(f"\n{'mode':<12}{'plain p50':>11}{'profiled p50':>14}{'profiled p95':>14}  files")
+    for row in report['enabled']:
+        files = ', '.join(f"{kind} {info['mean_bytes']} B" for kind, info in row['files'].items())
+        print(f"{row['mode']:<12}{row['plain']['p50']:>11}{row['profiled']['p50']:>14}{row['profiled']['p95']:>14}  {files}")
+
+    output = write_report('profiling', report, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
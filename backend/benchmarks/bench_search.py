@@ -0,0 +1,228 @@
+"""
+Query latency and index size for the article search (shared_code.search).
+
+- corpus: the real articles and PDFs, read the way build_search_index.py
+  reads them, plus synthetic corpora of --scale documents drawn from the
+  same vocabulary (Zipf-like term frequencies, real document lengths), so
+  the numbers hold up as articles are added
+- size: file and section sizes per corpus, bytes per posting and the index
+  against the source text
+- open: time to map an index and read its header and document list, what a
+  cold worker pays once
+- queries: p50/p99/mean per query shape (one term, two terms, a 2-4
+  character prefix, a term not in the index) through SearchIndex.search
+- naive: on the real corpus only, the same queries answered by tokenizing
+  every document and scoring in a loop, i.e. parsing per request
+- end to end: search.main (the /api/search function) on the real index,
+  including the JSON response
+
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --scale 1000,10000,50000 --queries 2000
+"""
+
+import argparse
+import logging
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+import azure.functions as func
+
+from benchmarks.load_test import percentile
+from benchmarks.reporting import write_report
+from shared_code import search
+
+SHAPES = ('one_term', 'two_terms', 'prefix', 'missing')
+
+
+def real_documents(pdfs):
+    import build_search_index
+
+    documents = build_search_index.read_articles(build_search_index.DEFAULT_ARTICLES)
+    if pdfs:
+        documents += build_search_index.read_pdfs(
+            build_search_index.DEFAULT_PDFS, None, build_search_index.DEFAULT_MIN_WORDS, [])
+    return documents
+
+
+def synthetic_documents(documents, count, seed):
+    """``count`` documents of real lengths whose words follow the real corpus' term frequencies"""
+    rng = random.Random(seed)
+    frequencies = Counter(term for document in documents for term in search.tokenize(document.body))
+    words, weights = zip(*frequencies.items())
+    lengths = [len(search.tokenize(document.body)) for document in documents]
+    generated = []
+    for index in range(count):
+        body = ' '.join(rng.choices(words, weights, k=rng.choice(lengths)))
+        generated.append(search.Document(
+            id=f'doc-{index}', kind='article', title=' '.join(rng.choices(words, weights, k=6)),
+            url=f'/latest-in-construction/article/doc-{index}', date='2024-01-01',
+            excerpt=body[:200], tags=rng.choices(words, weights, k=2), body=body,
+        ))
+    return generated
+
+
+def build_queries(index, count, seed):
+    """``count`` queries per shape, from the index's own terms weighted by document frequency"""
+    rng = random.Random(seed)
+    terms = [term for term in index.terms() if len(term) > 3 and not term.isdigit()]
+    weights = [index.document_frequency(index.lookup(term)) for term in terms]
+    queries = {}
+    for shape in SHAPES:
+        if shape == 'one_term':
+            queries[shape] = rng.choices(terms, weights, k=count)
+        elif shape == 'two_terms':
+            queries[shape] = [' '.join(rng.choices(terms, weights, k=2)) for _ in range(count)]
+        elif shape == 'prefix':
+            queries[shape] = [term[:rng.randint(2, 4)] for term in rng.choices(terms, weights, k=count)]
+        else:
+            queries[shape] = [f'zq{rng.randrange(10 ** 6)}' for _ in range(count)]
+    return queries
+
+
+def latencies(search_fn, queries):
+    search_fn(queries[0])  # warm up
+    timings = []
+    for query in queries:
+        started = time.perf_counter_ns()
+        search_fn(query)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+    timings.sort()
+    return {
+        'p50_us': round(percentile(timings, 0.50), 1),
+        'p99_us': round(percentile(timings, 0.99), 1),
+        'mean_us': round(statistics.fmean(timings), 1),
+    }
+
+
+def naive_search(documents):
+    """Tokenize and score every document on each query, as a search without an index would"""
+    def run(query, limit=10):
+        words = search.tokenize(query)
+        counts = [Counter(search.tokenize(document.body)) for document in documents]
+        average = statistics.fmean(sum(c.values()) for c in counts)
+        scores = []
+        for doc_id, document_counts in enumerate(counts):
+            score = 0.0
+            length = sum(document_counts.values())
+            for word in words:
+                frequency = sum(1 for c in counts if c[word])
+                tf = document_counts[word]
+                if tf:
+                    idf = math.log(1 + (len(counts) - frequency + 0.5) / (frequency + 0.5))
+                    score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / average))
+            if score:
+                scores.append((score, doc_id))
+        return sorted(scores, reverse=True)[:limit]
+    return run
+
+
+def open_time(path, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        index = search.SearchIndex(path)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+        index.close()
+    return round(statistics.median(timings), 1)
+
+
+def bench_corpus(label, documents, args, directory):
+    path = os.path.join(directory, f'{label}.bin')
+    started = time.perf_counter()
+    sizes = search.write_index(documents, path)
+    build_seconds = time.perf_counter() - started
+    index = search.SearchIndex(path)
+    text_bytes = sum(len(document.body.encode('utf-8')) for document in documents)
+    queries = build_queries(index, args.queries, seed=len(documents))
+    result = {
+        'corpus': label,
+        'documents': index.doc_count,
+        'terms': index.term_count,
+        'postings': index.posting_count,
+        'build_seconds': round(build_seconds, 2),
+        'source_bytes': text_bytes,
+        'index_bytes': index.size(),
+        'sections': sizes,
+        'bytes_per_posting': round((sizes['posting_docs'] + sizes['posting_tfs']) / max(index.posting_count, 1), 2),
+        'open_us': open_time(path, 20),
+        'queries': {shape: latencies(index.search, queries[shape]) for shape in SHAPES},
+    }
+    if label == 'real':
+        naive = naive_search(documents)
+        result['naive'] = {shape: latencies(naive, queries[shape][:args.naive_queries]) for shape in SHAPES}
+    index.close()
+    return result, path
+
+
+def bench_end_to_end(path, args):
+    os.environ['SEARCH_INDEX_PATH'] = path
+    from shared_code.settings import reload_settings
+    import search as search_function
+
+    reload_settings()
+    index = search.get_searcher().index
+    queries = build_queries(index, args.queries, seed=5)['two_terms']
+    requests = [func.HttpRequest(method='GET', url='http://localhost:7071/api/search', headers={}, body=b'',
+                                 params={'q': query}) for query in queries]
+    search_function.main(requests[0])  # warm up
+    statuses = Counter()
+    timings = []
+    for req in requests:
+        started = time.perf_counter_ns()
+        statuses[search_function.main(req).status_code] += 1
+        timings.append((time.perf_counter_ns() - started) / 1000)
+    timings.sort()
+    return {
+        'requests': len(requests),
+        'status_codes': {str(code): count for code, count in statuses.items()},
+        'p50_us': round(percentile(timings, 0.50), 1),
+        'p99_us': round(percentile(timings, 0.99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Article search latency and index size')
+    parser.add_argument('--scale', default='1000,10000', help='synthetic corpus sizes, comma-separated')
+    parser.add_argument('--queries', type=int, default=1000, help='queries per shape')
+    parser.add_argument('--naive-queries', type=int, default=100, help='queries per shape for the naive scan')
+    parser.add_argument('--no-pdfs', action='store_true', help='leave the PDFs out of the real corpus')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/search-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    documents = real_documents(not args.no_pdfs)
+    report = {'config': vars(args), 'corpora': []}
+    with tempfile.TemporaryDirectory() as directory:
+        result, real_path = bench_corpus('real', documents, args, directory)
+        report['corpora'].append(result)
+        for count in (int(value) for value in args.scale.split(',') if value.strip()):
+            generated = synthetic_documents(documents, count, seed=count)
+            report['corpora'].append(bench_corpus(f'synthetic-{count}', generated, args, directory)[0])
+        report['end_to_end'] = bench_end_to_end(real_path, args)
+
+    print(f"{'corpus':<18}{'docs':>7}{'terms':>8}{'postings':>10}{'source KB':>11}{'index KB':>10}"
+          f"{'B/posting':>11}{'open us':>9}{'build s':>9}")
+    for row in report['corpora']:
+        print(f"{row['corpus']:<18}{row['documents']:>7}{row['terms']:>8}{row['postings']:>10}"
+              f"{row['source_bytes'] / 1024:>11.1f}{row['index_bytes'] / 1024:>10.1f}"
+              f"{row['bytes_per_posting']:>11}{row['open_us']:>9}{row['build_seconds']:>9}")
+    print(f"\n{'corpus':<18}{'shape':<11}{'p50 us':>9}{'p99 us':>9}{'mean us':>9}")
+    for row in report['corpora']:
+        for label, queries in (('', row['queries']), (' naive', row.get('naive', {}))):
+            for shape, timing in queries.items():
+                print(f"{row['corpus'] + label:<18}{shape:<11}{timing['p50_us']:>9}{timing['p99_us']:>9}"
+                      f"{timing['mean_us']:>9}")
+    print(f"\nend to end (/api/search, real index): {report['end_to_end']}")
+
+    output = write_report('search', report, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
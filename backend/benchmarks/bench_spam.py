@@ -0,0 +1,126 @@
+"""
+Spam pre-filter cost and accuracy over a labelled corpus of sample payloads.
+
+Scores every payload in the corpus (JSON lines of ``{"label": "ham"|"spam",
+"payload": {...}}``, the contact form body) with shared_code.spam, reports
+per-check latency and the confusion matrix, and times a rule reload.
+Every spam payload caught here is a siteverify call and an email send that
+never happen.
+
+    python -m benchmarks.bench_spam
+    python -m benchmarks.bench_spam --corpus my_corpus.jsonl --rules my_rules.json --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from benchmarks.load_test import percentile
+from benchmarks.reporting import write_report
+from shared_code import payload, spam
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'spam_corpus.jsonl')
+
+
+def load_corpus(path):
+    samples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                # Decoded the way the contact functions decode a request body
+                samples.append((row['label'], payload.decode(json.dumps(row['payload']).encode('utf-8'), 1 << 20)))
+    return samples
+
+
+def classify(spam_filter, samples):
+    matrix = {'true_positive': 0, 'false_positive': 0, 'true_negative': 0, 'false_negative': 0}
+    misses = []
+    reasons = {}
+    for label, submission in samples:
+        verdict = spam_filter.check(submission)
+        if verdict.spam:
+            matrix['true_positive' if label == 'spam' else 'false_positive'] += 1
+            for reason in verdict.reasons:
+                reasons[reason] = reasons.get(reason, 0) + 1
+        else:
+            matrix['false_negative' if label == 'spam' else 'true_negative'] += 1
+        if verdict.spam != (label == 'spam'):
+            misses.append({'label': label, 'name': submission.name, 'score': verdict.score, 'reasons': verdict.reasons})
+    caught = matrix['true_positive'] + matrix['false_positive']
+    spam_total = matrix['true_positive'] + matrix['false_negative']
+    return {
+        **matrix,
+        'precision': round(matrix['true_positive'] / caught, 3) if caught else 0.0,
+        'recall': round(matrix['true_positive'] / spam_total, 3) if spam_total else 0.0,
+        'reasons': reasons,
+        'misclassified': misses,
+    }
+
+
+def time_checks(spam_filter, samples, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for _, submission in samples:
+            started = time.perf_counter_ns()
+            spam_filter.check(submission)
+            latencies.append((time.perf_counter_ns() - started) / 1000)
+    latencies.sort()
+    return {
+        'checks': len(latencies),
+        'mean': round(statistics.fmean(latencies), 2),
+        'p50': round(percentile(latencies, 0.50), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+        'max': round(latencies[-1], 2),
+    }
+
+
+def time_reload(path, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        spam.SpamRules.load(path)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spam pre-filter cost and accuracy')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSON lines of labelled payloads')
+    parser.add_argument('--rules', default=spam.DEFAULT_RULES_PATH, help='rules file (SPAM_RULES_PATH)')
+    parser.add_argument('--repeat', type=int, default=1000, help='passes over the corpus for the timings')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/spam-<commit>.json)')
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    # A long reload interval keeps file checks out of the timings
+    spam_filter = spam.SpamFilter(args.rules, reload_seconds=3600)
+
+    accuracy = classify(spam_filter, samples)
+    latency = time_checks(spam_filter, samples, args.repeat)
+    reload_ms = time_reload(args.rules)
+
+    print(f"corpus: {len(samples)} payloads from {args.corpus}")
+    print(f"precision {accuracy['precision']}  recall {accuracy['recall']}  "
+          f"(tp {accuracy['true_positive']}, fp {accuracy['false_positive']}, "
+          f"tn {accuracy['true_negative']}, fn {accuracy['false_negative']})")
+    for miss in accuracy['misclassified']:
+        print(f"  missed {miss['label']}: {miss['name']!r} score {miss['score']} {miss['reasons']}")
+    print(f"check latency (us): p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+          f"max {latency['max']}  over {latency['checks']} checks")
+    print(f'rule reload: {reload_ms} ms')
+
+    output = write_report('spam', {
+        'config': {'corpus': args.corpus, 'rules': args.rules, 'repeat': args.repeat},
+        'accuracy': accuracy,
+        'latency_us': latency,
+        'reload_ms': reload_ms,
+    }, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
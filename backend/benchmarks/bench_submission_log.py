@@ -0,0 +1,122 @@
+"""
+Submission log write cost: group commit against one commit per submission.
+
+Concurrent threads each record a submission the way a contact function does
+(a received entry, then a delivered one). ``group`` goes through
+shared_code.submission_log, where append() only queues and the writer thread
+commits batches; ``per_request`` commits each entry inline on a per-thread
+connection, the straightforward alternative. The report has the latency each
+request spends recording, entries per second until everything is committed,
+and the batch sizes the writer reached.
+
+    python -m benchmarks.bench_submission_log
+    python -m benchmarks.bench_submission_log --submissions 5000 --concurrency 16 --flush-ms 20
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load_test import percentile
+from benchmarks.reporting import write_report
+from shared_code import submission_log
+
+VALUES = {
+    'name': 'Priya Sharma',
+    'email': 'priya.sharma@example.com',
+    'phone': '+91 98765 43210',
+    'company': 'Sharma Infra Pvt Ltd',
+    'subject': 'Delay analysis',
+    'message': 'We need support with a delay analysis for an extension of time claim. ' * 4,
+    'submitted_on': 'January 01, 2026 at 10:00 AM',
+    'ip_address': '203.0.113.7',
+}
+
+
+class PerRequestLog:
+    """Each append is its own connection, transaction and commit"""
+
+    def __init__(self, path):
+        self.path = path
+        submission_log.SubmissionLog(path)  # creates the schema
+        self._local = threading.local()
+
+    def append(self, submission_id, kind, data, email=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+        with conn:
+            conn.execute(
+                'INSERT INTO entries (submission_id, kind, created_at, email, data) VALUES (?, ?, ?, ?, ?)',
+                (submission_id, kind, time.time(), email, json.dumps(data)),
+            )
+
+    def flush(self, timeout=None):
+        return True
+
+
+def run(log, submissions, concurrency):
+    def record(index):
+        started = time.perf_counter_ns()
+        submission_id = f'bench-{index}'
+        log.append(submission_id, submission_log.RECEIVED, {'values': VALUES, 'subject': 'New Contact'},
+                   email=VALUES['email'])
+        log.append(submission_id, submission_log.DELIVERED, {'provider': 'acs', 'message_id': submission_id})
+        return (time.perf_counter_ns() - started) / 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(record, range(submissions)))
+    log.flush(timeout=60)
+    elapsed = time.perf_counter() - started
+    return {
+        'entries_per_second': round(submissions * 2 / elapsed),
+        'record_us': {
+            'p50': round(percentile(latencies, 0.50), 1),
+            'p95': round(percentile(latencies, 0.95), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(latencies[-1], 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Submission log: group commit vs per-request commit')
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8, help='threads recording submissions')
+    parser.add_argument('--flush-ms', type=int, default=submission_log.DEFAULT_FLUSH_MS)
+    parser.add_argument('--batch-size', type=int, default=submission_log.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/submission_log-<commit>.json)')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        group = submission_log.SubmissionLog(os.path.join(directory, 'group.sqlite3'), args.flush_ms, args.batch_size)
+        results['group'] = run(group, args.submissions, args.concurrency)
+        stats = group.get_stats()
+        results['group']['batches'] = stats['batches']
+        results['group']['mean_batch'] = round(stats['committed'] / max(stats['batches'], 1), 1)
+        group.close()
+
+        per_request = PerRequestLog(os.path.join(directory, 'per_request.sqlite3'))
+        results['per_request'] = run(per_request, args.submissions, args.concurrency)
+
+    print(f"{'mode':<14}{'entries/s':>11}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'max us':>11}")
+    for mode, result in results.items():
+        latency = result['record_us']
+        print(f"{mode:<14}{result['entries_per_second']:>11}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{latency['max']:>11}")
+    print(f"group commit: {results['group']['batches']} batches, {results['group']['mean_batch']} entries each")
+
+    output = write_report('submission_log', {'config': vars(args), 'results': results}, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
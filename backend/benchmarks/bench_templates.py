@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: precompiled CONTACT_EMAIL template vs the inline f-string
+the contact functions used to build on every request.
+
+    python -m benchmarks.bench_templates [--iterations N]
+"""
+
+import argparse
+import html
+import timeit
+import tracemalloc
+
+from shared_code.templating import CONTACT_EMAIL
+
+VALUES = {
+    'name': 'Jane O\'Connor',
+    'email': 'jane@example.com',
+    'phone': '+91 98765 43210',
+    'company': 'Acme Infrastructure & Co.',
+    'subject': 'Delay claim on <Phase 2> works',
+    'message': 'We would like advice on an extension of time claim. ' * 20,
+    'submitted_on': 'January 01, 2026 at 10:00 AM',
+    'ip_address': '203.0.113.7',
+}
+
+
+def legacy_fstring(name, email, phone, company, subject, message, **_):
+    """The pre-template body from contact_form.main, unescaped"""
+    return f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #1a365d; border-bottom: 3px solid #d4af37; padding-bottom: 10px;">
+                    New Contact Form Submission
+                </h2>
+                
+                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <p><strong>Name:</strong> {name}</p>
+                    <p><strong>Email:</strong> <a href="mailto:{email}">{email}</a></p>
+                    <p><strong>Phone:</strong> {phone}</p>
+                    <p><strong>Company:</strong> {company if company else 'Not provided'}</p>
+                    <p><strong>Subject:</strong> {subject}</p>
+                </div>
+                
+                <div style="margin: 20px 0;">
+                    <h3 style="color: #1a365d;">Message:</h3>
+                    <p style="background-color: #fff; padding: 15px; border-left: 4px solid #d4af37; border-radius: 3px;">
+                        {message}
+                    </p>
+                </div>
+                
+                <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666;">
+                    <p>Submitted via Lawgate Website Contact Form</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+
+def legacy_fstring_escaped(**values):
+    """The f-string with html.escape applied per field, for a like-for-like comparison"""
+    return legacy_fstring(**{key: html.escape(str(value)) for key, value in values.items()})
+
+
+CASES = [
+    ('f-string (unescaped)', lambda: legacy_fstring(**VALUES)),
+    ('f-string + html.escape', lambda: legacy_fstring_escaped(**VALUES)),
+    ('template html', lambda: CONTACT_EMAIL.render_html(VALUES)),
+    ('template html + text', lambda: CONTACT_EMAIL.render(VALUES)),
+]
+
+
+def measure_allocations(func, iterations):
+    """Bytes allocated per call and peak traced memory over ``iterations`` calls"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [func() for _ in range(iterations)]
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del keep
+    return allocated / iterations, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'case':<26}{'µs/render':>12}{'bytes/render':>15}{'peak KiB':>11}{'output bytes':>14}")
+    for label, func in CASES:
+        seconds = min(timeit.repeat(func, number=args.iterations, repeat=5))
+        per_call, peak = measure_allocations(func, 1000)
+        output = func()
+        size = sum(len(part) for part in output) if isinstance(output, tuple) else len(output)
+        print(f'{label:<26}{seconds / args.iterations * 1e6:>12.2f}{per_call:>15.0f}'
+              f'{peak / 1024:>11.1f}{size:>14}')
+
+
+if __name__ == '__main__':
+    main()
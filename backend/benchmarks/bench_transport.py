@@ -0,0 +1,171 @@
+"""
+Email transport failover and hedging under a slow or failing primary.
+
+Sends messages through shared_code.transport.EmailSender against an ACS
+stand-in with a latency tail (a fraction of sends take ``--slow-ms``) and an
+error rate, with SendGrid as the secondary. Each scenario reports latency
+percentiles, sends per provider, failovers, hedge overhead (extra ACS
+requests per message) and messages that reached both providers, which must
+stay at zero.
+
+    python -m benchmarks.bench_transport --messages 500 --concurrency 8
+    python -m benchmarks.bench_transport --slow-rate 0.1 --slow-ms 800 --hedge-delay 100
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from benchmarks.load_test import percentile
+from benchmarks.reporting import write_report
+from benchmarks.stand_ins import FakeEmailClient, Fault, fake_sendgrid_client
+from shared_code import transport
+
+MESSAGE = {
+    'senderAddress': 'DoNotReply@stand-in.example.com',
+    'recipients': {'to': [{'address': 'partner@example.com'}]},
+    'content': {'subject': 'New Contact: benchmark', 'html': '<p>Hello</p>', 'plainText': 'Hello'},
+    'replyTo': [{'address': 'client@example.com'}],
+}
+
+
+class TailFault(Fault):
+    """Fault whose latency is usually ``latency_ms`` but ``slow_ms`` for a ``slow_rate`` fraction of calls"""
+
+    def __init__(self, latency_ms, slow_ms, slow_rate, error_rate, seed=None):
+        super().__init__(latency_ms, 0.0, error_rate, seed)
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+
+    def _draw(self):
+        with self._lock:
+            slow = self._random.random() < self.slow_rate
+            fail = self.error_rate and self._random.random() < self.error_rate
+        return (self.slow_ms if slow else self.latency_ms) / 1000, fail
+
+
+class RecordingEmailClient(FakeEmailClient):
+    """FakeEmailClient that also counts send requests, failed ones included"""
+
+    def __init__(self, send_fault):
+        super().__init__(send_fault)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def begin_send(self, message, operation_id=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return super().begin_send(message, operation_id=operation_id, **kwargs)
+
+
+def run_scenario(name, args, error_rate, hedge_delay_ms):
+    acs = RecordingEmailClient(TailFault(args.acs_ms, args.slow_ms, args.slow_rate, error_rate, seed=1))
+    sendgrid = fake_sendgrid_client(Fault.parse(args.sendgrid, seed=2))
+    sendgrid_keys = set()
+    send = sendgrid.send
+
+    def record_sendgrid(self, message):
+        response = send(self, message)
+        sendgrid_keys.add(message.get()['headers'][transport.IDEMPOTENCY_HEADER])
+        return response
+
+    sender = transport.EmailSender(
+        [transport.AcsTransport('stand-in'), transport.SendGridTransport('stand-in', 'noreply@example.com')],
+        send_timeout_ms=args.send_timeout, hedge_delay_ms=hedge_delay_ms,
+    )
+    latencies = []
+    providers = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def one(index):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            result = sender.send(MESSAGE, f'bench-{name}-{index}')
+        except transport.TransportError:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+            providers[result.provider] = providers.get(result.provider, 0) + 1
+
+    with mock.patch.object(transport, 'get_email_client', lambda _: acs), \
+            mock.patch('sendgrid.SendGridAPIClient', sendgrid), \
+            mock.patch.object(sendgrid, 'send', record_sendgrid):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(one, range(args.messages)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'acs_error_rate': error_rate,
+        'hedge_delay_ms': hedge_delay_ms,
+        'messages': args.messages,
+        'errors': errors,
+        'throughput_mps': round(args.messages / elapsed, 1),
+        'providers': providers,
+        'acs_requests_per_message': round(acs.requests / args.messages, 3),
+        'delivered_by_both': len(acs.operations & sendgrid_keys),
+        'health': {name: round(state['score'], 4) for name, state in sender.health.snapshot().items()},
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50), 3) if latencies else 0.0,
+            'p95': round(percentile(latencies, 0.95), 3) if latencies else 0.0,
+            'p99': round(percentile(latencies, 0.99), 3) if latencies else 0.0,
+        },
+    }
+
+
+def print_result(result):
+    latency = result['latency_ms']
+    print(f"{result['scenario']:<18}{result['throughput_mps']:>8.1f}{latency['p50']:>9.1f}{latency['p95']:>9.1f}"
+          f"{latency['p99']:>9.1f}{result['acs_requests_per_message']:>8.2f}{result['delivered_by_both']:>6}"
+          f"  {result['providers']} errors={result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Email transport failover and hedging')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--acs-ms', type=float, default=40, help='usual ACS send latency')
+    parser.add_argument('--slow-ms', type=float, default=600, help='ACS latency for slow sends')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='fraction of slow ACS sends')
+    parser.add_argument('--error-rate', type=float, default=0.2, help='ACS error rate in the failover scenario')
+    parser.add_argument('--hedge-delay', type=float, default=80, help='EMAIL_HEDGE_DELAY_MS for hedged scenarios')
+    parser.add_argument('--send-timeout', type=float, default=5000, help='EMAIL_SEND_TIMEOUT_MS')
+    parser.add_argument('--sendgrid', default='60:10', help='SendGrid send fault spec')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/transport-<commit>.json)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    scenarios = [
+        ('baseline', 0.0, 0),
+        ('hedged', 0.0, args.hedge_delay),
+        ('failover', args.error_rate, 0),
+        ('failover_hedged', args.error_rate, args.hedge_delay),
+    ]
+    print(f"{'scenario':<18}{'msg/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'acs/msg':>8}{'both':>6}  providers")
+    results = []
+    for name, error_rate, hedge_delay in scenarios:
+        results.append(run_scenario(name, args, error_rate, hedge_delay))
+        print_result(results[-1])
+
+    output = write_report('transport', {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }, args.output)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Offline load test for the contact endpoint.
+
+Drives contact_form.main and contact_form_azure_native.main with synthetic
+func.HttpRequest objects against local stand-ins for ACS, SendGrid and
+Google siteverify, and reports throughput, latency percentiles and peak
+traced memory per scenario. Results are written as JSON so runs can be
+compared between commits:
+
+    python -m benchmarks.load_test --requests 5000 --concurrency 8
+    python -m benchmarks.load_test --acs-send 40:10 --acs-poll 300:50:0.02
+    python -m benchmarks.load_test --compare benchmarks/results/load_test-abc1234.json
+
+Fault specs are ``latency_ms[:jitter_ms[:error_rate]]``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+# Configuration must be in place before the function modules are imported
+os.environ.update({
+    'AZURE_COMMUNICATION_CONNECTION_STRING': 'endpoint=https://stand-in.communication.azure.com/;accesskey=c3RhbmQtaW4=',
+    'SENDGRID_API_KEY': 'stand-in',
+    'RECAPTCHA_SECRET_KEY': 'stand-in',
+    'SKIP_RECAPTCHA': 'false',
+    'EMAIL_DELIVERY_MODE': 'sync',
+})
+
+import azure.functions as func  # noqa: E402
+
+from benchmarks.reporting import write_report  # noqa: E402
+from benchmarks.stand_ins import (  # noqa: E402
+    FakeEmailClient, FakeSiteverifySession, Fault, fake_sendgrid_client,
+)
+
+SCENARIOS = ('valid', 'missing_fields', 'captcha_fail', 'honeypot', 'spam', 'rate_limited', 'duplicate')
+FUNCTIONS = ('contact_form', 'contact_form_azure_native')
+
+
+def build_payload(scenario, index, run_id):
+    if scenario == 'duplicate':
+        # The same submission replayed (double-clicks, retries, bots)
+        index = 0
+    payload = {
+        'name': f'Load Test {index}',
+        # run_id keeps scenarios from being deduplicated against each other
+        'email': f'load.test.{run_id}.{index}@example.com',
+        'phone': '+91 98765 43210',
+        'company': 'Benchmark & Co.',
+        'subject': 'Delay analysis enquiry',
+        'message': 'Please call me back about an extension of time claim. ' * 8,
+        # Unique tokens so the reCAPTCHA verdict cache doesn't hide siteverify
+        'captcha': f'ok-{run_id}-{index}',
+        'submissionTime': 12000,
+    }
+    if scenario == 'missing_fields':
+        del payload['name'], payload['message']
+    elif scenario == 'captcha_fail':
+        payload['captcha'] = f'fail-{run_id}-{index}'
+    elif scenario == 'honeypot':
+        payload['website'] = 'http://spam.example.com'
+    elif scenario == 'spam':
+        # Link stuffing and SEO phrases, rejected by the pre-filter
+        payload['message'] = ('We offer SEO services and link building to rank your website: '
+                              + ' '.join(f'http://seo{n}.example.com' for n in range(5)))
+    return payload
+
+
+def build_requests(scenario, count, run_id):
+    """Pre-build requests so construction cost stays out of the timings"""
+    requests = []
+    for index in range(count):
+        # Unique client IPs keep the rate limiter out of the other scenarios
+        ip = f'198.51.100.{run_id}' if scenario == 'rate_limited' else f'10.{run_id}.{index // 256 % 256}.{index % 256}'
+        requests.append(func.HttpRequest(
+            method='POST',
+            url='http://localhost:7071/api/contact',
+            headers={'Content-Type': 'application/json', 'X-Forwarded-For': ip},
+            body=json.dumps(build_payload(scenario, index, run_id)).encode('utf-8'),
+        ))
+    return requests
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def drive(handler, requests, concurrency):
+    """Invoke ``handler`` for every request; return (elapsed seconds, latencies ms, status counts)"""
+    def invoke(req):
+        started = time.perf_counter()
+        response = handler(req)
+        return (time.perf_counter() - started) * 1000, response.status_code
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(invoke, requests))
+    else:
+        outcomes = [invoke(req) for req in requests]
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return elapsed, [latency for latency, _ in outcomes], statuses
+
+
+def install_stand_ins(stack, args):
+    """Patch the function modules to talk to local stand-ins; return them for reporting"""
+    import contact_form
+    import contact_form_azure_native
+    from shared_code import transport
+    from shared_code.recaptcha import RecaptchaVerifier
+
+    email_client = FakeEmailClient(
+        send_fault=Fault.parse(args.acs_send, seed=1),
+        poll_fault=Fault.parse(args.acs_poll, seed=2),
+    )
+    siteverify = FakeSiteverifySession(Fault.parse(args.siteverify, seed=3))
+    verifier = RecaptchaVerifier(session_factory=lambda: siteverify)
+    sendgrid_client = fake_sendgrid_client(Fault.parse(args.sendgrid, seed=4))
+
+    # Both functions send through shared_code.transport (ACS first, SendGrid on failover)
+    stack.enter_context(mock.patch.object(transport, 'get_email_client', lambda _: email_client))
+    stack.enter_context(mock.patch.object(contact_form, 'get_verifier', lambda: verifier))
+    # The SendGrid transport imports the SDK lazily, so patch it at the source
+    stack.enter_context(mock.patch('sendgrid.SendGridAPIClient', sendgrid_client))
+    return {
+        'contact_form': contact_form.main,
+        'contact_form_azure_native': contact_form_azure_native.main,
+    }, {'acs_sends': email_client.sent, 'siteverify_calls': siteverify.calls, 'sendgrid_sends': sendgrid_client.sent}
+
+
+def run(args):
+    results = []
+    with ExitStack() as stack:
+        handlers, counters = install_stand_ins(stack, args)
+        run_id = 0
+        for function_name in args.functions:
+            for scenario in args.scenarios:
+                run_id += 1
+                handler = handlers[function_name]
+                # Warm up lazily created state outside the measurement
+                drive(handler, build_requests(scenario, 3, 200 + run_id), 1)
+
+                requests = build_requests(scenario, args.requests, run_id)
+                elapsed, latencies, statuses = drive(handler, requests, args.concurrency)
+
+                # Separate, shorter pass for memory: tracemalloc slows everything down
+                memory_requests = build_requests(scenario, min(args.requests, args.memory_requests), 100 + run_id)
+                tracemalloc.start()
+                drive(handler, memory_requests, args.concurrency)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                latencies.sort()
+                result = {
+                    'function': function_name,
+                    'scenario': scenario,
+                    'requests': len(latencies),
+                    'concurrency': args.concurrency,
+                    'status_codes': statuses,
+                    'throughput_rps': round(len(latencies) / elapsed, 1),
+                    'latency_ms': {
+                        'mean': round(statistics.fmean(latencies), 3),
+                        'p50': round(percentile(latencies, 0.50), 3),
+                        'p95': round(percentile(latencies, 0.95), 3),
+                        'p99': round(percentile(latencies, 0.99), 3),
+                        'max': round(latencies[-1], 3),
+                    },
+                    'peak_memory_kib': round(peak / 1024, 1),
+                }
+                results.append(result)
+                print_result(result)
+    return results, {name: counter.value for name, counter in counters.items()}
+
+
+def print_result(result):
+    latency = result['latency_ms']
+    print(f"{result['function']:<27}{result['scenario']:<16}{result['throughput_rps']:>10.1f}"
+          f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}"
+          f"{result['peak_memory_kib']:>11.1f}  {result['status_codes']}")
+
+
+def compare(previous_path, results):
+    """Print throughput and p95 changes against an earlier results file"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(r['function'], r['scenario']): r for r in json.load(f)['results']}
+    print(f'\nCompared with {previous_path}:')
+    for result in results:
+        before = previous.get((result['function'], result['scenario']))
+        if before is None:
+            continue
+        rps_change = (result['throughput_rps'] / before['throughput_rps'] - 1) * 100 if before['throughput_rps'] else 0
+        p95_change = result['latency_ms']['p95'] - before['latency_ms']['p95']
+        print(f"{result['function']:<27}{result['scenario']:<16}throughput {rps_change:+7.1f}%   p95 {p95_change:+8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test for the contact endpoint')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='worker threads driving the handler')
+    parser.add_argument('--memory-requests', type=int, default=500, help='requests in the tracemalloc pass')
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, default=list(FUNCTIONS))
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--acs-send', default='0', help='ACS begin_send fault spec')
+    parser.add_argument('--acs-poll', default='0', help='ACS poller.result fault spec')
+    parser.add_argument('--sendgrid', default='0', help='SendGrid send fault spec')
+    parser.add_argument('--siteverify', default='0', help='Google siteverify fault spec')
+    parser.add_argument('--log-level', default='INFO', help='function log level (output goes to /dev/null)')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/load_test-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    # Keep the functions' logging cost realistic without flooding the terminal
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=open(os.devnull, 'w'),
+    )
+
+    print(f"{'function':<27}{'scenario':<16}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KiB':>11}  status")
+    results, calls = run(args)
+
+    output = write_report('load_test', {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'stand_in_calls': calls,
+        'results': results,
+    }, args.output)
+    print(f'\nStand-in calls: {calls}')
+    print(f'Results written to {output}')
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Shared helpers for writing benchmark results"""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_report(name, report, output=None):
+    """
+    Write ``report`` as JSON, stamped with the commit, time and Python version.
+
+    Defaults to benchmarks/results/<name>-<commit>.json and returns the path.
+    """
+    commit = git_commit()
+    stamped = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        **report,
+    }
+    output = output or os.path.join(RESULTS_DIR, f'{name}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(stamped, f, indent=2)
+    return output
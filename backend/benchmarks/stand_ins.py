@@ -0,0 +1,270 @@
+"""
+Local stand-ins for the external services the contact functions call.
+
+Each stand-in takes a ``Fault`` describing the latency to simulate and the
+fraction of calls that should fail, so benchmarks run fully offline and can
+reproduce a slow or flaky dependency on demand.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import types
+import uuid
+
+from azure.core.exceptions import ServiceRequestError
+
+
+class Fault:
+    """Latency (milliseconds, with uniform jitter) and error rate for one dependency"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self.error_rate and self._random.random() < self.error_rate
+        return max(0.0, self.latency_ms + jitter) / 1000, fail
+
+    def apply(self, name):
+        """Sleep for the configured latency, then raise if this call is chosen to fail"""
+        delay, fail = self._draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ServiceRequestError(f'Injected {name} failure')
+
+    async def apply_async(self, name):
+        """apply() for async stand-ins: yields to the event loop instead of blocking"""
+        delay, fail = self._draw()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise ServiceRequestError(f'Injected {name} failure')
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        """Build a Fault from ``latency_ms[:jitter_ms[:error_rate]]``"""
+        parts = [float(part) for part in spec.split(':')] if spec else []
+        return cls(*parts, seed=seed)
+
+
+class Counter:
+    """Thread-safe call counter shared by a stand-in's instances"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.value += 1
+
+
+class FakeClock:
+    """Manually advanced clock for the ``clock`` argument of the limiters, caches and breakers"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakePoller:
+    """Mimics the LROPoller returned by EmailClient.begin_send"""
+
+    def __init__(self, fault, message_id):
+        self._fault = fault
+        self._message_id = message_id
+        self._done = False
+
+    def result(self, timeout=None):
+        self._fault.apply('ACS poll')
+        self._done = True
+        return {'id': self._message_id, 'status': 'Succeeded'}
+
+    def done(self):
+        return self._done
+
+    def status(self):
+        return 'Succeeded' if self._done else 'InProgress'
+
+
+class FakeStatusResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeEmailClient:
+    """
+    Stand-in for azure.communication.email.EmailClient.
+
+    Operations it accepted are kept in ``operations``, so send_request() can
+    answer the operation-status lookups of transport.AcsTransport.accepted:
+    200 for a known operation, 404 for an unknown one, and raising when
+    ``status_fault`` fails the call.
+    """
+
+    def __init__(self, send_fault=None, poll_fault=None, status_fault=None):
+        self.send_fault = send_fault or Fault()
+        self.poll_fault = poll_fault or Fault()
+        self.status_fault = status_fault or Fault()
+        self.sent = Counter()
+        self.operations = set()
+
+    def begin_send(self, message, operation_id=None, **kwargs):
+        self.send_fault.apply('ACS send')
+        self.sent.increment()
+        operation_id = operation_id or str(uuid.uuid4())
+        self.operations.add(operation_id)
+        return FakePoller(self.poll_fault, operation_id)
+
+    def send_request(self, request, **kwargs):
+        self.status_fault.apply('ACS operation status')
+        operation_id = request.url.split('?')[0].rsplit('/', 1)[-1]
+        return FakeStatusResponse(200 if operation_id in self.operations else 404)
+
+    def close(self):
+        pass
+
+
+class FakeAsyncPoller(FakePoller):
+    """Mimics the AsyncLROPoller returned by the aio EmailClient"""
+
+    async def result(self, timeout=None):
+        await self._fault.apply_async('ACS poll')
+        self._done = True
+        return {'id': self._message_id, 'status': 'Succeeded'}
+
+
+class FakeAsyncEmailClient(FakeEmailClient):
+    """Stand-in for azure.communication.email.aio.EmailClient"""
+
+    async def begin_send(self, message, operation_id=None, **kwargs):
+        await self.send_fault.apply_async('ACS send')
+        self.sent.increment()
+        operation_id = operation_id or str(uuid.uuid4())
+        self.operations.add(operation_id)
+        return FakeAsyncPoller(self.poll_fault, operation_id)
+
+    async def close(self):
+        pass
+
+
+class FakeSendGridResponse:
+    status_code = 202
+    headers = {'X-Message-Id': 'stand-in'}
+
+
+def fake_sendgrid_client(fault=None):
+    """
+    Return a stand-in for the SendGridAPIClient class.
+
+    The contact function constructs a client per request, so configuration
+    lives on the returned class rather than on instances.
+    """
+    fault = fault or Fault()
+    sent = Counter()
+
+    class FakeSendGridAPIClient:
+        def __init__(self, api_key=None):
+            self.api_key = api_key
+            # python_http_client.Client, whose timeout the transport sets
+            self.client = types.SimpleNamespace(timeout=None)
+
+        def send(self, message):
+            fault.apply('SendGrid send')
+            sent.increment()
+            return FakeSendGridResponse()
+
+    FakeSendGridAPIClient.fault = fault
+    FakeSendGridAPIClient.sent = sent
+    return FakeSendGridAPIClient
+
+
+class FakeSiteverifyResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def _siteverify_payload(data):
+    token = (data or {}).get('response', '')
+    if token.startswith('fail'):
+        return {'success': False, 'error-codes': ['invalid-input-response']}
+    return {'success': True, 'score': 0.9, 'action': 'contact', 'hostname': 'localhost'}
+
+
+class FakeSiteverifySession:
+    """
+    Stand-in for the requests.Session used against Google siteverify.
+
+    Tokens starting with ``fail`` are rejected; everything else passes with a
+    v3-style score.
+    """
+
+    def __init__(self, fault=None):
+        self.fault = fault or Fault()
+        self.calls = Counter()
+
+    def post(self, url, data=None, timeout=None):
+        self.fault.apply('siteverify')
+        self.calls.increment()
+        return FakeSiteverifyResponse(_siteverify_payload(data))
+
+
+class FakeAsyncSiteverifyResponse:
+    def __init__(self, fault, data, calls):
+        self._fault = fault
+        self._data = data
+        self._calls = calls
+
+    async def __aenter__(self):
+        await self._fault.apply_async('siteverify')
+        self._calls.increment()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def json(self, content_type='application/json'):
+        return _siteverify_payload(self._data)
+
+
+class FakeAsyncSiteverifySession(FakeSiteverifySession):
+    """Stand-in for the aiohttp.ClientSession used by RecaptchaVerifier.verify_async"""
+
+    def post(self, url, data=None, **kwargs):
+        return FakeAsyncSiteverifyResponse(self.fault, data, self.calls)
+
+
+class FakeResolver:
+    """
+    Stand-in DNS resolver for shared_code.email_check.
+
+    ``domains`` maps a domain to its status (email_check.MAIL, NO_MAIL or
+    NO_DOMAIN); any other domain is NO_DOMAIN. A failing lookup raises, the
+    way a DNS timeout does.
+    """
+
+    def __init__(self, domains, fault=None):
+        self.domains = dict(domains)
+        self.fault = fault or Fault()
+        self.calls = Counter()
+
+    def lookup(self, domain):
+        self.fault.apply('DNS lookup')
+        self.calls.increment()
+        return self.domains.get(domain, 'no_domain')
@@ -0,0 +1,244 @@
+"""
+Build the article search index served by /api/search (see shared_code.search)
+Run this inside the backend directory after adding or editing an article, and
+commit the rebuilt shared_code/search_index.bin with it
+
+    python build_search_index.py
+    python build_search_index.py --no-pdfs --output /tmp/search_index.bin
+    python build_search_index.py --min-words 100 --exclude "LATEST IN CONSTRUCTION*"
+
+Articles are read from the TypeScript files in frontend/src/data/articles
+(one ``Article`` object literal each). PDFs in frontend/public/assets/articles
+are included when they have at least --min-words words of text, which leaves
+out the design-export fragments (shapes, photos, title cards); their text
+comes from PyMuPDF, or the pdftotext command when it isn't installed. A PDF
+listed in src/data/articles/pdf-manifest.json (frontend/scripts/optimize_pdfs.py)
+links to its optimised copy.
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from importlib.util import find_spec
+from urllib.parse import quote
+
+from shared_code import search
+
+FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+DEFAULT_ARTICLES = os.path.join(FRONTEND, 'src', 'data', 'articles')
+DEFAULT_PDFS = os.path.join(FRONTEND, 'public', 'assets', 'articles')
+ARTICLE_URL = '/latest-in-construction/article/{id}'
+PDF_URL = '/assets/articles/{name}'
+EXCERPT_LENGTH = 200
+# Least match score (see _match_title_cards) for a body page to take a title card's title
+CARD_MIN_SCORE = 0.5
+DEFAULT_MIN_WORDS = 50
+
+# Fields of an Article literal: 'single-quoted' strings, the `content` template and the tags array
+_STRING_FIELD = re.compile(r"^\s*(\w+):\s*'((?:[^'\\]|\\.)*)'", re.MULTILINE)
+_CONTENT = re.compile(r'^\s*content:\s*`((?:[^`\\]|\\.)*)`', re.MULTILINE | re.DOTALL)
+_TAGS = re.compile(r'^\s*tags:\s*\[(.*?)\]', re.MULTILINE | re.DOTALL)
+_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'")
+_ESCAPE = re.compile(r'\\(.)')
+
+# "... Posted on 17 Dec 2023.pdf"
+_POSTED = re.compile(r'\s*Posted on (\d{1,2} \w{3} \d{4})\s*$')
+_SPACE = re.compile(r'\s+')
+_SLUG = re.compile(r'[a-z0-9]+')
+
+
+def _unescape(value):
+    return _ESCAPE.sub(r'\1', value)
+
+
+def _excerpt(text):
+    text = _SPACE.sub(' ', text).strip()
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    return text[:EXCERPT_LENGTH].rsplit(' ', 1)[0] + '…'
+
+
+def read_article(path):
+    """Document for one article module, or None when it holds no Article literal"""
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    content = _CONTENT.search(source)
+    strings = {name: _unescape(value) for name, value in _STRING_FIELD.findall(source)}
+    if content is None or 'id' not in strings or 'title' not in strings:
+        return None
+    tags = _TAGS.search(source)
+    return search.Document(
+        id=strings['id'],
+        kind='article',
+        title=strings['title'],
+        url=ARTICLE_URL.format(id=strings['id']),
+        date=strings.get('date'),
+        excerpt=strings.get('excerpt', ''),
+        tags=[_unescape(tag) for tag in _QUOTED.findall(tags.group(1))] if tags else [],
+        body=_unescape(content.group(1)),
+    )
+
+
+def read_articles(directory):
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.ts') and name not in ('index.ts', 'types.ts'):
+            document = read_article(os.path.join(directory, name))
+            if document is None:
+                print(f'⚠️  {name}: no Article literal, skipped')
+            else:
+                documents.append(document)
+    return documents
+
+
+def pdf_text(path):
+    if find_spec('pymupdf') or find_spec('fitz'):
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf
+        with pymupdf.open(path) as pdf:
+            return '\n'.join(page.get_text() for page in pdf)
+    return subprocess.run(['pdftotext', '-enc', 'UTF-8', path, '-'],
+                          check=True, capture_output=True).stdout.decode('utf-8')
+
+
+def _pdf_title(name):
+    """Title and ISO date from a file name like 'Some Title_ A Guide Posted on 12 Feb 2024.pdf'"""
+    stem = os.path.splitext(name)[0]
+    date = None
+    posted = _POSTED.search(stem)
+    if posted:
+        date = datetime.strptime(posted.group(1), '%d %b %Y').date().isoformat()
+        stem = stem[:posted.start()]
+    # Figma exports replace ':' with '_'
+    title = re.sub(r'\s*_\s+', ': ', stem).strip()
+    return (title.title() if title.isupper() else title), date
+
+
+def _match_title_cards(texts, cards):
+    """
+    Pair body pages exported without a title ('ARTICLE 2.pdf') with the
+    title cards ('Title Posted on <date>.pdf'): each pair is scored by the
+    title words found in the body, weighted by how rare they are among the
+    bodies and by how often they appear, and the best pairs are taken first
+    """
+    bodies = {name: Counter(search.tokenize(text)) for name, text in texts.items() if _pdf_title(name)[1] is None}
+    frequency = Counter(term for counts in bodies.values() for term in counts)
+
+    def weight(term):
+        return math.log(1 + len(bodies) / (1 + frequency[term]))
+
+    scored = []
+    for card, (title, _) in cards.items():
+        terms = set(search.tokenize(title))
+        total = sum(weight(term) for term in terms)
+        for name, counts in bodies.items():
+            score = sum(weight(term) * math.log(1 + counts[term]) for term in terms) / total if total else 0.0
+            if score >= CARD_MIN_SCORE:
+                scored.append((score, name, card))
+    pairs = {}
+    for _, name, card in sorted(scored, reverse=True):
+        if name not in pairs and card not in pairs.values():
+            pairs[name] = card
+    return pairs
+
+
+def read_pdfs(directory, manifest, min_words, exclude):
+    if not (find_spec('pymupdf') or find_spec('fitz') or shutil.which('pdftotext')):
+        print('⚠️  Neither PyMuPDF nor pdftotext is available, PDFs skipped')
+        return []
+    urls = {}
+    if manifest and os.path.exists(manifest):
+        with open(manifest, encoding='utf-8') as f:
+            urls = {name: entry['pdf'] for name, entry in json.load(f).get('files', {}).items()}
+
+    texts, cards = {}, {}
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith('.pdf') or any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+            continue
+        try:
+            text = pdf_text(os.path.join(directory, name))
+        except Exception as e:
+            print(f'❌ {name}: {str(e)}')
+            continue
+        if len(text.split()) >= min_words:
+            texts[name] = text
+        elif _POSTED.search(os.path.splitext(name)[0]):
+            cards[name] = _pdf_title(name)
+
+    pairs = _match_title_cards(texts, cards)
+    documents = []
+    for name, text in texts.items():
+        title, date = cards[pairs[name]] if name in pairs else _pdf_title(name)
+        documents.append(search.Document(
+            id='-'.join(_SLUG.findall(title.lower())),
+            kind='pdf',
+            title=title,
+            url=urls.get(name) or PDF_URL.format(name=quote(name)),
+            date=date,
+            excerpt=_excerpt(text),
+            tags=[],
+            body=text,
+        ))
+    return documents
+
+
+def report(documents, sizes, path, elapsed):
+    """Index-size report: what went in, the size of each section and of the whole file"""
+    index = search.SearchIndex(path)
+    text_bytes = sum(len(document.body.encode('utf-8')) for document in documents)
+    total = index.size()
+    kinds = {}
+    for document in documents:
+        kinds[document.kind] = kinds.get(document.kind, 0) + 1
+
+    print(f"{'documents':<18}{len(documents):>10}  ({', '.join(f'{count} {kind}' for kind, count in sorted(kinds.items()))})")
+    print(f"{'source text':<18}{text_bytes:>10} B")
+    print(f"{'terms':<18}{index.term_count:>10}")
+    print(f"{'postings':<18}{index.posting_count:>10}")
+    print(f"{'avg length':<18}{index.average_length:>10.1f} weighted terms")
+    print()
+    for name, size in sizes.items():
+        print(f'{name:<18}{size:>10} B{size / total:>8.1%}')
+    print(f"{'file':<18}{total:>10} B{total / text_bytes:>8.1%} of the source text" if text_bytes else '')
+    if index.posting_count:
+        print(f"{'per posting':<18}{(sizes['posting_docs'] + sizes['posting_tfs']) / index.posting_count:>10.1f} B")
+    print(f'\nBuilt {path} in {elapsed:.2f}s')
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the article search index')
+    parser.add_argument('--articles', default=DEFAULT_ARTICLES, help='directory of article .ts files')
+    parser.add_argument('--pdfs', default=DEFAULT_PDFS, help='directory of article PDFs')
+    parser.add_argument('--manifest', default=os.path.join(DEFAULT_ARTICLES, 'pdf-manifest.json'),
+                        help='optimize_pdfs.py manifest, for links to the optimised PDFs')
+    parser.add_argument('--no-pdfs', action='store_true', help='index the articles only')
+    parser.add_argument('--min-words', type=int, default=DEFAULT_MIN_WORDS, help='skip PDFs with fewer words of text')
+    parser.add_argument('--exclude', action='append', default=[], help='PDF name glob to leave out (repeatable)')
+    parser.add_argument('--output', default=search.DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    documents = read_articles(args.articles)
+    if not args.no_pdfs:
+        documents += read_pdfs(args.pdfs, args.manifest, args.min_words, args.exclude)
+    if not documents:
+        print('❌ Nothing to index')
+        sys.exit(1)
+    sizes = search.write_index(documents, args.output)
+    report(documents, sizes, args.output, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
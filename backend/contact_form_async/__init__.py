@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import azure.functions as func
+from shared_code import admission, breaker, contact, email_check, metrics, outbox
+from shared_code.recaptcha import get_verifier
+from shared_code.request_log import RequestLog
+from shared_code.settings import get_settings
+from shared_code.transport import SendResult, get_sender
+
+logger = logging.getLogger(__name__)
+
+# Same pipeline as contact_form (see shared_code.contact), but the two network
+# calls -- Google siteverify and the ACS send/poll -- are awaited, so one
+# worker process serves many in-flight submissions on its event loop instead
+# of one per thread-pool thread. Blocking local work that can touch the disk
+# or network (the Redis rate limiter, the SQLite outbox) runs in a thread.
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    log = RequestLog(logger, req)
+    response = await _handle(req, log)
+    metrics.record_request('contact_form_async', log.outcome, log.elapsed())
+    log.finish(response.status_code)
+    return response
+
+async def _handle(req: func.HttpRequest, log: RequestLog) -> func.HttpResponse:
+    logger.debug('Async contact form function triggered: %s %s', req.method, req.url)
+
+    # Handle CORS preflight
+    if req.method == 'OPTIONS':
+        return contact.preflight(log)
+
+    settings = get_settings()
+
+    # Rate limiting per client IP; the in-memory backend never blocks
+    if settings.rate_limit_backend == 'redis':
+        client_ip, response = await asyncio.to_thread(contact.check_rate_limit, req, log)
+    else:
+        client_ip, response = contact.check_rate_limit(req, log)
+    if response:
+        return response
+
+    try:
+        submission, response = contact.read_submission(req, log)
+        if response:
+            return response
+
+        # Cheap local spam checks before any network call (see shared_code.spam)
+        response = contact.check_spam(submission, log)
+        if response:
+            return response
+
+        # Address checks; a domain lookup that misses the cache runs in a thread
+        with metrics.timer('email'):
+            validation = await email_check.get_validator().validate_async(submission.email)
+        response = contact.check_email(submission, log, validation)
+        if response:
+            return response
+
+        # Replay the original response for a repeated submission; may wait
+        # for an identical request in flight, so off the event loop
+        dedup_key, response = await asyncio.to_thread(contact.check_duplicate, submission, settings, log)
+        if response:
+            return response
+
+        # Only submissions that got this far wait for a send slot (see shared_code.admission)
+        response = None
+        try:
+            async with admission.admit_async('contact_form_async'):
+                response = await _submit(submission, client_ip, settings, log)
+        except admission.Overloaded as e:
+            response = contact.overloaded(e, log)
+        finally:
+            contact.record_result(dedup_key, response, log)
+        return response
+
+    except ValueError as e:
+        return contact.invalid_request(e, log)
+
+    except Exception as e:
+        return contact.failed(e, log)
+
+async def _submit(submission, client_ip, settings, log: RequestLog) -> func.HttpResponse:
+    """Verify reCAPTCHA, then buffer, queue or send the email"""
+    # Verify reCAPTCHA
+    if not settings.skip_recaptcha:
+        response = contact.check_recaptcha_token(submission, settings, log)
+        if response:
+            return response
+        with metrics.timer('recaptcha'):
+            verification = await get_verifier().verify_async(submission.recaptcha_token, settings.recaptcha_secret)
+        response = contact.check_verification(verification, settings, log)
+        if response:
+            return response
+
+    # Durable record before any hand-off, so a failed send can be replayed
+    # (see shared_code.submission_log)
+    submission_id = contact.record_received(submission, client_ip, log)
+
+    if contact.should_buffer(submission, settings, log):
+        # Digest mode: held for the next digest email (see shared_code.digest)
+        return await asyncio.to_thread(contact.buffer, submission, client_ip, settings, log, submission_id)
+
+    email_message, response = contact.build_message(submission, client_ip, settings, log)
+    if response:
+        return response
+
+    if outbox.is_enabled():
+        return await asyncio.to_thread(contact.enqueue, email_message, log, submission_id)
+
+    try:
+        return contact.sent(await _send(email_message, settings, submission_id), log, submission_id)
+
+    except breaker.CircuitOpen as e:
+        # Every provider's circuit breaker is open: queue it (SQLite, so in a thread) or answer 503
+        return await asyncio.to_thread(contact.email_unavailable, e, email_message, settings, log, submission_id)
+
+    except Exception as email_error:
+        return contact.send_failed(email_error, log, submission_id)
+
+async def _send(email_message, settings, operation_id) -> SendResult:
+    """Await the email transport on the event loop (see EmailSender.send_async)"""
+    return await get_sender().send_async(email_message, operation_id)
@@ -1,14 +1,14 @@
 import logging
 import json
-import os
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime
 import azure.functions as func
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-
-# Simple in-memory rate limiting (use Redis/Cosmos DB for production)
-submission_tracker = {}
+from shared_code.rate_limit import get_client_ip, get_rate_limiter
+from shared_code import breaker, email_check, payload, profiling, spam, submission_log, transport
+from shared_code.settings import get_settings
+from shared_code.templating import CONTACT_EMAIL
 
+@profiling.profiled('contact_form_azure_native')
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Contact form submission received')
 
@@ -25,33 +25,44 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         # Get client IP
-        client_ip = req.headers.get('X-Forwarded-For', 'unknown').split(',')[0].strip()
-        
-        # Rate limiting - max 3 submissions per IP per hour
-        current_time = datetime.now()
-        if client_ip in submission_tracker:
-            last_submission, count = submission_tracker[client_ip]
-            if current_time - last_submission < timedelta(hours=1):
-                if count >= 3:
-                    logging.warning(f'Rate limit exceeded for IP: {client_ip}')
-                    return func.HttpResponse(
-                        json.dumps({'error': 'Too many submissions. Please try again later.'}),
-                        status_code=429,
-                        mimetype='application/json',
-                        headers={'Access-Control-Allow-Origin': '*'}
-                    )
-                submission_tracker[client_ip] = (current_time, count + 1)
-            else:
-                submission_tracker[client_ip] = (current_time, 1)
-        else:
-            submission_tracker[client_ip] = (current_time, 1)
-
-        # Parse request body
-        req_body = req.get_json()
+        client_ip = get_client_ip(req)
         
-        # Honeypot field check (add a hidden field in your form)
-        if req_body.get('website'):  # Bots often fill this
-            logging.warning(f'Honeypot triggered for IP: {client_ip}')
+        # Rate limiting - max 3 submissions per IP per hour (sliding window)
+        limit = get_rate_limiter().hit(client_ip)
+        if not limit.allowed:
+            logging.warning(f'Rate limit exceeded for IP: {client_ip}')
+            return func.HttpResponse(
+                json.dumps({'error': 'Too many submissions. Please try again later.'}),
+                status_code=429,
+                mimetype='application/json',
+                headers={'Access-Control-Allow-Origin': '*', 'Retry-After': str(limit.retry_after)}
+            )
+
+        # Parse request body once, within the size and field limits (see shared_code.payload)
+        try:
+            submission = payload.decode(req.get_body())
+        except payload.BodyTooLarge as e:
+            logging.warning(f'Request body too large ({e.size} bytes) from IP: {client_ip}')
+            return func.HttpResponse(
+                json.dumps({'error': 'Message too long'}),
+                status_code=413,
+                mimetype='application/json',
+                headers={'Access-Control-Allow-Origin': '*'}
+            )
+        except payload.FieldTooLong as e:
+            return func.HttpResponse(
+                json.dumps({'error': f'The {e.field} field is too long (at most {e.limit} characters)'}),
+                status_code=400,
+                mimetype='application/json',
+                headers={'Access-Control-Allow-Origin': '*'}
+            )
+
+        # Honeypot, timing and content checks (see shared_code.spam), before
+        # anything that answers differently for a bot or makes a DNS lookup
+        spam_filter = spam.get_filter()
+        verdict = spam_filter.check(submission) if spam_filter else None
+        if verdict and verdict.silent:
+            logging.warning(f'Spam pre-filter ({",".join(verdict.reasons)}) for IP: {client_ip}')
             # Return success to not alert the bot
             return func.HttpResponse(
                 json.dumps({'message': 'Message sent successfully'}),
@@ -59,14 +70,22 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype='application/json',
                 headers={'Access-Control-Allow-Origin': '*'}
             )
+        if verdict and verdict.spam:
+            logging.warning(f'Spam pre-filter ({",".join(verdict.reasons)}, score {verdict.score}) for IP: {client_ip}')
+            return func.HttpResponse(
+                json.dumps({'error': 'Your message looks like spam. Please remove links or promotional text and try again.'}),
+                status_code=400,
+                mimetype='application/json',
+                headers={'Access-Control-Allow-Origin': '*'}
+            )
 
         # Validate required fields
-        name = req_body.get('name', '').strip()
-        email = req_body.get('email', '').strip()
-        phone = req_body.get('phone', '').strip()
-        company = req_body.get('company', '').strip()
-        subject = req_body.get('subject', '').strip()
-        message = req_body.get('message', '').strip()
+        name = submission.name
+        email = submission.email
+        phone = submission.phone
+        company = submission.company
+        subject = submission.subject
+        message = submission.message
 
         if not all([name, email, message]):
             return func.HttpResponse(
@@ -76,34 +95,24 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 headers={'Access-Control-Allow-Origin': '*'}
             )
 
-        # Basic email validation
-        if '@' not in email or '.' not in email:
+        # Email validation: syntax, IDN normalisation and the optional domain
+        # lookup (see shared_code.email_check)
+        validation = email_check.get_validator().validate(email)
+        if not validation.valid:
+            logging.warning(f'Invalid email address ({validation.reason}) from IP: {client_ip}')
             return func.HttpResponse(
                 json.dumps({'error': 'Invalid email address'}),
                 status_code=400,
                 mimetype='application/json',
                 headers={'Access-Control-Allow-Origin': '*'}
             )
+        email = submission.email = validation.address
 
-        # Time-based validation - submission should take at least 3 seconds
-        submission_time = req_body.get('submissionTime', 0)
-        if submission_time > 0 and submission_time < 3000:  # milliseconds
-            logging.warning(f'Suspicious fast submission from IP: {client_ip}')
-            return func.HttpResponse(
-                json.dumps({'message': 'Message sent successfully'}),
-                status_code=200,
-                mimetype='application/json',
-                headers={'Access-Control-Allow-Origin': '*'}
-            )
-
-        # Send email using SendGrid
-        sendgrid_key = os.environ.get('SENDGRID_API_KEY')
-        # Support comma-separated list of recipient emails, including ddhuvgupta@gmail.com
-        recipient_emails_str = os.environ.get('LAWGATE_EMAIL', 'shishir@lawgate.in,ddhuvgupta@gmail.com')
-        recipient_emails = [email.strip() for email in recipient_emails_str.split(',') if email.strip()]
+        # Send email through the configured providers (see shared_code.transport)
+        settings = get_settings()
 
-        if not sendgrid_key:
-            logging.error('SendGrid API key not configured')
+        if not transport.is_configured(settings):
+            logging.error('No email provider configured (ACS connection string or SendGrid API key)')
             return func.HttpResponse(
                 json.dumps({'error': 'Email service not configured'}),
                 status_code=500,
@@ -111,55 +120,50 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 headers={'Access-Control-Allow-Origin': '*'}
             )
 
-        # Create email content
-        email_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #1a365d; border-bottom: 3px solid #d4af37; padding-bottom: 10px;">
-                    New Contact Form Submission
-                </h2>
-                
-                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 5px; margin: 20px 0;">
-                    <p><strong>Name:</strong> {name}</p>
-                    <p><strong>Email:</strong> <a href="mailto:{email}">{email}</a></p>
-                    <p><strong>Phone:</strong> {phone if phone else 'Not provided'}</p>
-                    <p><strong>Company:</strong> {company if company else 'Not provided'}</p>
-                    <p><strong>Subject:</strong> {subject if subject else 'No subject'}</p>
-                </div>
-                
-                <div style="margin: 20px 0;">
-                    <h3 style="color: #1a365d;">Message:</h3>
-                    <p style="background-color: #fff; padding: 15px; border-left: 4px solid #d4af37; border-radius: 3px;">
-                        {message}
-                    </p>
-                </div>
-                
-                <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666;">
-                    <p>Submitted on: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
-                    <p>IP Address: {client_ip}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        # Create SendGrid message
-        message_obj = Mail(
-            from_email='noreply@lawgate.in',
-            to_emails=recipient_emails,
-            subject=f'Contact Form: {subject if subject else "New Inquiry from " + name}',
-            html_content=email_content
-        )
-
-        # Set reply-to as the sender's email
-        message_obj.reply_to = email
-
-        # Send email
-        sg = SendGridAPIClient(sendgrid_key)
-        response = sg.send(message_obj)
-
-        logging.info(f'Email sent successfully. Status code: {response.status_code}')
+        # Render the email body and its plain-text alternative
+        values = {
+            'name': name,
+            'email': email,
+            'phone': phone or 'Not provided',
+            'company': company or 'Not provided',
+            'subject': subject or 'No subject',
+            'message': message,
+            'submitted_on': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+            'ip_address': client_ip,
+        }
+        email_subject = f'Contact Form: {subject if subject else "New Inquiry from " + name}'
+        email_content = CONTACT_EMAIL.render(values)
+
+        # Durable record before the send, so a failure can be replayed
+        # (see shared_code.submission_log); its id is the idempotency key
+        submission_id = str(uuid.uuid4())
+        entries = submission_log.get_log()
+        if entries is not None:
+            entries.append(submission_id, submission_log.RECEIVED,
+                           {'values': values, 'subject': email_subject}, email=email)
+
+        # LAWGATE_EMAIL is a comma-separated list, split once into settings.recipients
+        try:
+            result = transport.get_sender().send(
+                transport.email_message(settings, email_content, email_subject, email), submission_id)
+        except Exception as e:
+            if entries is not None:
+                entries.append(submission_id, submission_log.FAILED, {'error': str(e)})
+            if isinstance(e, breaker.CircuitOpen):
+                # Every provider's circuit breaker is open (see shared_code.breaker)
+                logging.warning(f'Email providers unavailable: {str(e)}')
+                return func.HttpResponse(
+                    json.dumps({'error': 'Email service temporarily unavailable'}),
+                    status_code=503,
+                    mimetype='application/json',
+                    headers={'Access-Control-Allow-Origin': '*', 'Retry-After': str(max(1, e.retry_after))}
+                )
+            raise
+        if entries is not None:
+            entries.append(submission_id, submission_log.DELIVERED,
+                           {'provider': result.provider, 'message_id': result.message_id})
+
+        logging.info(f'Email sent successfully via {result.provider}. Message id: {result.message_id}')
 
         return func.HttpResponse(
             json.dumps({'message': 'Message sent successfully'}),
@@ -0,0 +1,36 @@
+import json
+import azure.functions as func
+from shared_code import digest, outbox
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Report the delivery state of a queued contact form submission"""
+    if req.method == 'OPTIONS':
+        return func.HttpResponse(
+            status_code=200,
+            headers={
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            }
+        )
+
+    submission_id = req.route_params.get('submission_id')
+    state = outbox.get_outbox().get(submission_id) if submission_id else None
+    if state is None and submission_id and digest.is_enabled():
+        # Digest mode: buffered, or already batched into a digest email
+        state = digest.get_digest().get(submission_id)
+    if state is None:
+        return func.HttpResponse(
+            json.dumps({'success': False, 'message': 'Unknown submission id'}),
+            status_code=404,
+            headers={'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'}
+        )
+
+    # last_error can contain provider details, keep it server-side
+    state.pop('last_error', None)
+    return func.HttpResponse(
+        json.dumps({'success': True, **state}),
+        status_code=200,
+        headers={'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'}
+    )
@@ -0,0 +1,181 @@
+"""
+Replay and export submissions from the submission log
+Run this inside the backend directory, with the same .env as the functions
+
+    python manage_submissions.py stats
+    python manage_submissions.py replay --older-than 600 --dry-run
+    python manage_submissions.py export --since 2026-01-01 --format csv --output january.csv
+    python manage_submissions.py export --email client@example.com
+    python manage_submissions.py purge --older-than-days 30
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from shared_code import submission_log, transport
+from shared_code.settings import get_settings
+from shared_code.templating import CONTACT_EMAIL
+
+EXPORT_FIELDS = ('submission_id', 'received_at', 'status', 'name', 'email', 'phone', 'company', 'subject', 'message')
+
+
+def _timestamp(value):
+    """ISO date or datetime (UTC unless it has an offset) to epoch seconds"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _open_log(args):
+    return submission_log.SubmissionLog(args.path) if args.path else submission_log.SubmissionLog()
+
+
+def replay(args):
+    """Send every undelivered submission older than --older-than seconds"""
+    entries = _open_log(args)
+    settings = get_settings()
+    if not args.dry_run and not transport.is_configured(settings):
+        print('❌ ERROR: no email provider is configured')
+        return 1
+
+    # Younger submissions may still be in flight in a running function
+    cutoff = time.time() - args.older_than
+    pending = list(entries.query(until=cutoff, undelivered=True, limit=args.limit))
+    print(f'{len(pending)} undelivered submission(s) received before {datetime.fromtimestamp(cutoff):%Y-%m-%d %H:%M:%S}')
+    if args.dry_run:
+        for entry in pending:
+            print(f"  {entry['submission_id']}  {entry['status']:<9} {entry['email']}  {entry['subject']}")
+        return 0
+
+    sender = transport.get_sender()
+
+    def send(entry):
+        values = entry['values']
+        message = transport.email_message(settings, CONTACT_EMAIL.render(values), entry['subject'], values['email'])
+        try:
+            # The submission id is the idempotency key, so a submission the
+            # provider already accepted isn't delivered twice
+            result = sender.send(message, entry['submission_id'])
+        except Exception as e:
+            entries.append(entry['submission_id'], submission_log.FAILED, {'error': str(e), 'replay': True})
+            return entry, str(e)
+        entries.append(entry['submission_id'], submission_log.DELIVERED,
+                       {'provider': result.provider, 'message_id': result.message_id, 'replay': True})
+        return entry, None
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for entry, error in pool.map(send, pending):
+            if error:
+                failures += 1
+                print(f"❌ {entry['submission_id']}: {error}")
+            else:
+                print(f"✅ {entry['submission_id']} delivered")
+    entries.close()
+    print(f'\nReplayed {len(pending) - failures}, failed {failures}')
+    return 1 if failures else 0
+
+
+def _rows(entries, args):
+    since = _timestamp(args.since) if args.since else 0.0
+    until = _timestamp(args.until) if args.until else None
+    for entry in entries.query(since, until, email=args.email, limit=args.limit):
+        values = entry['values']
+        yield {
+            'submission_id': entry['submission_id'],
+            'received_at': datetime.fromtimestamp(entry['created_at'], timezone.utc).isoformat(),
+            'status': entry['status'],
+            **{name: values.get(name, '') for name in EXPORT_FIELDS[3:]},
+        }
+
+
+def export(args):
+    """Write submissions in a time range as JSON lines or CSV"""
+    entries = _open_log(args)
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    count = 0
+    try:
+        if args.format == 'csv':
+            writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            for row in _rows(entries, args):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in _rows(entries, args):
+                out.write(json.dumps(row, ensure_ascii=False) + '\n')
+                count += 1
+    finally:
+        if args.output:
+            out.close()
+    print(f'Exported {count} submission(s)', file=sys.stderr)
+    return 0
+
+
+def stats(args):
+    """Count submissions by latest status"""
+    entries = _open_log(args)
+    counts = {}
+    for entry in entries.query():
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    print(f'Submission log: {entries.path}')
+    for status, count in sorted(counts.items()):
+        print(f'  {status:<11}{count:>8}')
+    print(f'  {"total":<11}{sum(counts.values()):>8}')
+    return 0
+
+
+def purge(args):
+    """Delete submissions received more than --older-than-days days ago"""
+    days = args.older_than_days if args.older_than_days is not None else get_settings().submission_log_retention_days
+    if days <= 0:
+        print('Nothing to purge: retention is unlimited (SUBMISSION_LOG_RETENTION_DAYS=0)')
+        return 0
+    entries = _open_log(args)
+    deleted = entries.purge(time.time() - days * 86400)
+    print(f'Purged {deleted} entries older than {days:g} day(s) from {entries.path}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay and export submissions from the submission log')
+    parser.add_argument('--path', help='log database (default: SUBMISSION_LOG_PATH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help='send undelivered submissions again')
+    replay_parser.add_argument('--older-than', type=float, default=300,
+                               help='only submissions received at least this many seconds ago')
+    replay_parser.add_argument('--limit', type=int, help='replay at most this many')
+    replay_parser.add_argument('--concurrency', type=int, default=4, help='parallel sends')
+    replay_parser.add_argument('--dry-run', action='store_true', help='list them without sending')
+    replay_parser.set_defaults(handler=replay)
+
+    export_parser = commands.add_parser('export', help='write submissions as JSON lines or CSV')
+    export_parser.add_argument('--since', help='ISO date or datetime, inclusive (UTC unless given)')
+    export_parser.add_argument('--until', help='ISO date or datetime, exclusive')
+    export_parser.add_argument('--email', help='only submissions from this address')
+    export_parser.add_argument('--limit', type=int, help='export at most this many')
+    export_parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    export_parser.add_argument('--output', help='file to write (default: stdout)')
+    export_parser.set_defaults(handler=export)
+
+    stats_parser = commands.add_parser('stats', help='count submissions by status')
+    stats_parser.set_defaults(handler=stats)
+
+    purge_parser = commands.add_parser('purge', help='delete old submissions')
+    purge_parser.add_argument('--older-than-days', type=float,
+                              help='age in days (default: SUBMISSION_LOG_RETENTION_DAYS)')
+    purge_parser.set_defaults(handler=purge)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
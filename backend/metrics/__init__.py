@@ -0,0 +1,19 @@
+import json
+import azure.functions as func
+from shared_code import metrics
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Expose per-stage latency histograms and outcome counters for this worker"""
+    if req.params.get('format') == 'json':
+        return func.HttpResponse(
+            json.dumps(metrics.REGISTRY.snapshot()),
+            status_code=200,
+            headers={'Content-Type': 'application/json'}
+        )
+
+    return func.HttpResponse(
+        metrics.REGISTRY.prometheus(),
+        status_code=200,
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
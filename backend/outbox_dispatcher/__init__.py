@@ -0,0 +1,45 @@
+import logging
+import azure.functions as func
+from shared_code import breaker, digest, outbox, transport
+from shared_code.settings import get_settings
+
+
+def main(timer: func.TimerRequest) -> None:
+    """Flush due digests (digest mode) and deliver queued contact form emails from the outbox"""
+    settings = get_settings()
+    # EMAIL_BREAKER_POLICY=queue puts messages on the outbox while every
+    # provider's breaker is open, in any delivery mode. In sync mode that is
+    # rare, so only open the outbox once something has been queued on it.
+    queues_when_open = settings.circuit_breakers and settings.email_breaker_policy == 'queue'
+    if not (outbox.is_enabled() or digest.is_enabled() or (queues_when_open and outbox.has_backlog())):
+        return
+
+    # Queued messages go through the same providers, failover and breakers
+    # as inline sends (see shared_code.transport)
+    providers = transport.configured_transports(settings)
+    if not providers:
+        if outbox.is_enabled() or digest.is_enabled():
+            logging.error('❌ No email provider configured (ACS connection string or SendGrid API key)')
+        return
+
+    if digest.is_enabled():
+        flushed = digest.get_digest().flush_due(
+            settings.sender_email,
+            settings.recipients,
+            interval_seconds=settings.digest_interval_seconds,
+            max_submissions=settings.digest_max_submissions,
+        )
+        if flushed['digests']:
+            logging.info(f'📬 Digest flush: {flushed}, '
+                         f'ACS calls saved: {flushed["submissions"] - flushed["messages"]}')
+
+    summary = outbox.dispatch(
+        outbox.get_outbox(),
+        transport.get_sender(),
+        batch_size=settings.outbox_batch_size,
+        max_workers=settings.outbox_max_workers,
+        max_attempts=settings.outbox_max_attempts,
+        circuits=[breaker.get_breaker(provider.name) for provider in providers],
+    )
+    if any(summary.values()):
+        logging.info(f'📤 Outbox dispatch: {summary}')
@@ -0,0 +1,49 @@
+import json
+import azure.functions as func
+from shared_code import metrics, search
+from shared_code.settings import get_settings
+
+# Results only change when a new index is deployed
+CACHE_CONTROL = 'public, max-age=300'
+
+
+def _response(body, status_code, cache=False):
+    headers = {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'}
+    if cache:
+        headers['Cache-Control'] = CACHE_CONTROL
+    return func.HttpResponse(json.dumps(body), status_code=status_code, headers=headers)
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Search the articles: /api/search?q=delay+analysis&limit=5&prefix=false"""
+    if req.method == 'OPTIONS':
+        return func.HttpResponse(
+            status_code=200,
+            headers={
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            }
+        )
+
+    query = (req.params.get('q') or '').strip()
+    if not query or len(query) > get_settings().search_max_query_length:
+        metrics.increment('search_queries_total', result='rejected')
+        return _response({'success': False, 'message': 'Query missing or too long'}, 400)
+    try:
+        limit = int(req.params.get('limit') or 0)
+    except ValueError:
+        limit = 0
+
+    # The index is memory-mapped once per worker (see shared_code.search)
+    searcher = search.get_searcher()
+    if searcher is None:
+        return _response({'success': False, 'message': 'Search is unavailable'}, 503)
+
+    prefix = req.params.get('prefix', 'true').lower() not in ('0', 'false', 'no')
+    hits = searcher.search(query, max(limit, 0) or None, prefix)
+    return _response({
+        'success': True,
+        'query': query,
+        'results': [{**hit.document, 'score': round(hit.score, 4)} for hit in hits],
+    }, 200, cache=True)
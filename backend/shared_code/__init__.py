@@ -0,0 +1,6 @@
+"""
+Helpers shared by the contact form functions.
+
+The Functions host puts the app root on sys.path, so function folders import
+these as ``from shared_code import ...``.
+"""
@@ -0,0 +1,258 @@
+"""
+Admission control for the send path of the contact functions.
+
+Without a limit every invocation a worker accepts goes on to verify and
+send, so a burst piles up behind slow ACS polls until the host times the
+requests out. Each function now has a controller per worker process:
+
+- at most ADMISSION_MAX_CONCURRENT submissions are verified and sent at once
+- up to ADMISSION_MAX_QUEUE more wait for a slot, first come first served,
+  for at most ADMISSION_QUEUE_TIMEOUT_MS
+- anything beyond that is shed at once with a 503 and a Retry-After
+  estimated from the recent time a slot is held
+
+Only the expensive part of a request is admitted: CORS preflights, rate
+limiting, body validation, the spam pre-filter and duplicate replays run
+before it and never wait behind sends. A queued contact_form request still
+holds one of the worker's threads, so keep ADMISSION_MAX_CONCURRENT plus
+ADMISSION_MAX_QUEUE below the worker's thread count
+(PYTHON_THREADPOOL_THREAD_COUNT, by default min(32, CPUs + 4)) to leave
+threads free for those cheap requests.
+
+contact_form_async admits with acquire_async(), which waits on the event
+loop instead of blocking a thread; it has its own, larger limit
+(ADMISSION_MAX_CONCURRENT_ASYNC) since one process serves many sends at once.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+DEFAULT_MAX_CONCURRENT = 8
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_QUEUE_TIMEOUT_MS = 2000
+
+metrics.REGISTRY.describe('admission_shed_total', 'Submissions refused by admission control, by reason')
+
+
+class Overloaded(Exception):
+    """The submission was shed; ``reason`` is queue_full or timeout"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'Shed ({reason}), retry in {retry_after}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'loop', 'future', 'granted')
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded FIFO wait queue and a wait deadline"""
+
+    def __init__(self, name, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queue=DEFAULT_MAX_QUEUE,
+                 queue_timeout_ms=DEFAULT_QUEUE_TIMEOUT_MS, alpha=0.2):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = deque()
+        self._held = 0.0  # EWMA of the seconds a slot is held
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0}
+
+    def retry_after(self):
+        """Whole seconds until the current backlog has likely drained"""
+        with self._lock:
+            backlog = len(self._waiters) + self._in_flight
+            held = self._held
+        return max(1, math.ceil(held * backlog / max(self.max_concurrent, 1)))
+
+    def _shed(self, reason):
+        # Called with the lock held
+        self.stats[f'shed_{reason}'] += 1
+        metrics.increment('admission_shed_total', function=self.name, reason=reason)
+
+    def _enter(self, waiter_factory):
+        """Take a free slot (returns None) or join the queue (returns the waiter); raises when full"""
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not self._waiters:
+                self._in_flight += 1
+                self.stats['admitted'] += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self._shed('queue_full')
+                waiter = None
+            else:
+                waiter = waiter_factory()
+                self._waiters.append(waiter)
+                self.stats['queued'] += 1
+        if waiter is None:
+            raise Overloaded('queue_full', self.retry_after())
+        return waiter
+
+    def _give_up(self, waiter):
+        """True if ``waiter`` left the queue without a slot; False if it was granted one meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._shed('timeout')
+            return True
+
+    def acquire(self):
+        """Wait for a slot; raises Overloaded when the queue is full or the deadline passes"""
+        waiter = self._enter(lambda: _Waiter(event=threading.Event()))
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        if not waiter.event.wait(self.queue_timeout) and self._give_up(waiter):
+            raise Overloaded('timeout', self.retry_after())
+        metrics.observe('contact_stage_seconds', time.perf_counter() - started, stage='admission')
+
+    async def acquire_async(self):
+        """acquire() for coroutines: waits on the running event loop"""
+        loop = asyncio.get_running_loop()
+        waiter = self._enter(lambda: _Waiter(loop=loop, future=loop.create_future()))
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if not self._give_up(waiter):
+                self.release(0.0)
+            raise
+        if not waiter.future.done() and self._give_up(waiter):
+            raise Overloaded('timeout', self.retry_after())
+        metrics.observe('contact_stage_seconds', time.perf_counter() - started, stage='admission')
+
+    def release(self, held_seconds):
+        """Free a slot, handing it straight to the longest waiter if there is one"""
+        with self._lock:
+            self._held += self.alpha * (held_seconds - self._held)
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.stats['admitted'] += 1
+            else:
+                self._in_flight -= 1
+                return
+        waiter.wake()
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'in_flight': self._in_flight, 'queue_depth': len(self._waiters)}
+
+
+_controllers = (None, {})
+_controllers_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.admission_control,
+        settings.admission_max_concurrent,
+        settings.admission_max_concurrent_async,
+        settings.admission_max_queue,
+        settings.admission_queue_timeout_ms,
+    )
+
+
+def get_controller(name, concurrent=False):
+    """
+    Return the process-wide controller for function ``name``, or None when
+    ADMISSION_CONTROL is off. ``concurrent`` selects the async limit.
+    """
+    global _controllers
+    key = _config()
+    current_key, controllers = _controllers
+    if current_key == key and name in controllers:
+        return controllers[name]
+
+    with _controllers_lock:
+        current_key, controllers = _controllers
+        if current_key != key:
+            controllers = {}
+            _controllers = (key, controllers)
+        if name not in controllers:
+            enabled, max_concurrent, max_concurrent_async, max_queue, queue_timeout_ms = key
+            controllers[name] = AdmissionController(
+                name,
+                max_concurrent=max_concurrent_async if concurrent else max_concurrent,
+                max_queue=max_queue,
+                queue_timeout_ms=queue_timeout_ms,
+            ) if enabled else None
+        return controllers[name]
+
+
+@contextmanager
+def admit(name):
+    """Hold a send slot of function ``name`` for the block; raises Overloaded when shed"""
+    controller = get_controller(name)
+    if controller is None:
+        yield
+        return
+    controller.acquire()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        controller.release(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def admit_async(name):
+    """admit() for contact_form_async, waiting on the event loop"""
+    controller = get_controller(name, concurrent=True)
+    if controller is None:
+        yield
+        return
+    await controller.acquire_async()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        controller.release(time.perf_counter() - started)
+
+
+def _collect_stats():
+    _, controllers = _controllers
+    gauges = {}
+    for name, controller in list(controllers.items()):
+        if controller is None:
+            continue
+        labels = (('function', name),)
+        for stat, value in controller.get_stats().items():
+            gauges[(f'admission_{stat}', labels)] = value
+    return gauges
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,251 @@
+"""
+Circuit breakers for the external dependencies: Google siteverify, ACS and SendGrid.
+
+Without them every request waits out the full timeout of a dependency that
+is already known to be down, and workers pile up behind it. Each dependency
+has one breaker per worker process:
+
+- closed: calls go through; outcomes are kept for the last
+  BREAKER_WINDOW_SECONDS. Once at least BREAKER_MIN_CALLS were made, the
+  breaker opens when the share of failed calls reaches BREAKER_ERROR_RATE
+  or the share of calls slower than the dependency's BREAKER_SLOW_CALL_MS
+  reaches BREAKER_SLOW_RATE.
+- open: calls are refused without touching the network for
+  BREAKER_OPEN_SECONDS.
+- half_open: BREAKER_HALF_OPEN_CALLS probe calls go through; if they all
+  succeed in time the breaker closes, otherwise it opens again.
+
+What a refused call means is each caller's policy: a refused reCAPTCHA
+check fails closed with a 503, or with RECAPTCHA_BREAKER_POLICY=local passes
+on the local pre-checks alone (shared_code.spam); a refused email provider
+is skipped in favour of the next one, and when every provider is refused
+the submission is queued on the outbox (EMAIL_BREAKER_POLICY=queue) or
+answered with a 503.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Gauge values for circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+RECAPTCHA = 'recaptcha'
+ACS = 'acs'
+SENDGRID = 'sendgrid'
+
+# siteverify answers in ~100 ms; an ACS send includes polling the operation
+DEFAULT_SLOW_CALL_MS = {RECAPTCHA: 1000, ACS: 8000, SENDGRID: 3000}
+
+metrics.REGISTRY.describe('circuit_breaker_transitions_total', 'Circuit breaker state changes by dependency')
+metrics.REGISTRY.describe('circuit_breaker_rejections_total', 'Calls refused by an open circuit breaker')
+
+
+class CircuitOpen(Exception):
+    """A call was refused by an open breaker; ``retry_after`` is in seconds"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} circuit is open, retry in {retry_after}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of call outcomes"""
+
+    def __init__(self, name, error_rate=0.5, slow_call_ms=0, slow_rate=0.8, min_calls=10,
+                 window_seconds=30.0, open_seconds=30.0, half_open_calls=1, clock=time.monotonic):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_call = slow_call_ms / 1000 if slow_call_ms else None
+        self.slow_rate = slow_rate
+        self.min_calls = min_calls
+        self.window = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0  # when it opened, or went half-open
+        self._calls = deque()  # (finished_at, failed, slow)
+        self._failed = 0
+        self._slow = 0
+        self._probes = 0  # half-open calls let through
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._expire(self.clock())
+            return self._state
+
+    def _transition(self, state, now, reason=''):
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = now
+        if state != HALF_OPEN:
+            self._probes = self._probe_successes = 0
+        if state == CLOSED:
+            self._calls.clear()
+            self._failed = self._slow = 0
+        metrics.increment('circuit_breaker_transitions_total', dependency=self.name, state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log(f'Circuit breaker {self.name}: {previous} -> {state}{reason}')
+
+    def _expire(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now)
+            self._opened_at = now
+        elif self._state == HALF_OPEN and now - self._opened_at >= self.open_seconds:
+            # A probe never reported back (its caller died); let another through
+            self._probes = self._probe_successes
+            self._opened_at = now
+
+    def retry_after(self):
+        """Whole seconds until the breaker lets a probe through (0 when closed)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0 if self._state == CLOSED else 1
+            return max(1, int(self._opened_at + self.open_seconds - self.clock() + 0.999))
+
+    def allow(self):
+        """True if a call may go ahead now; every True must be followed by record()"""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+        metrics.increment('circuit_breaker_rejections_total', dependency=self.name)
+        return False
+
+    def record(self, seconds, ok):
+        """Record the outcome of an allowed call that took ``seconds``"""
+        slow = self.slow_call is not None and seconds >= self.slow_call
+        with self._lock:
+            now = self.clock()
+            if self._state == HALF_OPEN:
+                if not ok or slow:
+                    self._transition(OPEN, now, ' (probe failed)' if not ok else ' (probe slow)')
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED, now)
+                return
+            if self._state == OPEN:
+                return  # a call that started before the breaker opened
+
+            self._calls.append((now, not ok, slow))
+            self._failed += not ok
+            self._slow += slow
+            while self._calls and self._calls[0][0] <= now - self.window:
+                _, failed, was_slow = self._calls.popleft()
+                self._failed -= failed
+                self._slow -= was_slow
+
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            if self._failed / calls >= self.error_rate:
+                self._transition(OPEN, now, f' ({self._failed}/{calls} calls failed)')
+            elif self.slow_call is not None and self._slow / calls >= self.slow_rate:
+                self._transition(OPEN, now, f' ({self._slow}/{calls} calls slower than {self.slow_call}s)')
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` through the breaker; raises CircuitOpen when refused"""
+        if not self.allow():
+            raise CircuitOpen(self.name, self.retry_after())
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(time.perf_counter() - started, ok=False)
+            raise
+        self.record(time.perf_counter() - started, ok=True)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            self._expire(self.clock())
+            calls = len(self._calls)
+            return {
+                'state': self._state,
+                'calls': calls,
+                'error_rate': self._failed / calls if calls else 0.0,
+                'slow_rate': self._slow / calls if calls else 0.0,
+            }
+
+
+_breakers = (None, {})
+_breakers_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.circuit_breakers,
+        settings.breaker_error_rate,
+        settings.breaker_slow_rate,
+        tuple(sorted(settings.breaker_slow_call_ms.items())),
+        settings.breaker_min_calls,
+        settings.breaker_window_seconds,
+        settings.breaker_open_seconds,
+        settings.breaker_half_open_calls,
+    )
+
+
+def get_breaker(name):
+    """Return the process-wide breaker for dependency ``name``, or None when CIRCUIT_BREAKERS is off"""
+    global _breakers
+    key = _config()
+    current_key, breakers = _breakers
+    if current_key == key and name in breakers:
+        return breakers[name]
+
+    with _breakers_lock:
+        current_key, breakers = _breakers
+        if current_key != key:
+            breakers = {}
+            _breakers = (key, breakers)
+        if name not in breakers:
+            enabled, error_rate, slow_rate, slow_call_ms, min_calls, window, open_seconds, half_open = key
+            breakers[name] = CircuitBreaker(
+                name,
+                error_rate=error_rate,
+                slow_call_ms=dict(slow_call_ms).get(name, DEFAULT_SLOW_CALL_MS.get(name, 0)),
+                slow_rate=slow_rate,
+                min_calls=min_calls,
+                window_seconds=window,
+                open_seconds=open_seconds,
+                half_open_calls=half_open,
+            ) if enabled else None
+        return breakers[name]
+
+
+def _collect_state():
+    _, breakers = _breakers
+    gauges = {}
+    for name, circuit in list(breakers.items()):
+        if circuit is None:
+            continue
+        state = circuit.snapshot()
+        labels = (('dependency', name),)
+        gauges[('circuit_breaker_state', labels)] = STATE_VALUES[state['state']]
+        gauges[('circuit_breaker_error_rate', labels)] = round(state['error_rate'], 4)
+        gauges[('circuit_breaker_slow_rate', labels)] = round(state['slow_rate'], 4)
+    return gauges
+
+
+metrics.add_collector(_collect_state)
@@ -0,0 +1,172 @@
+"""
+Process-wide registry of outbound clients.
+
+Creating an EmailClient or a bare requests.post() opens a fresh TCP+TLS
+connection for every submission. On a warm Functions worker the module stays
+loaded between invocations, so we keep one pooled client per dependency and
+only rebuild it when its configuration changes.
+
+requests and the ACS SDK are imported on first use rather than at module
+load, so cold starts and requests that never reach the network (CORS
+preflights, validation failures) don't pay for them.
+
+The async variants (aiohttp and azure.communication.email.aio, used by
+contact_form_async) are bound to the event loop that created them. The
+worker runs every async invocation on one loop, so their slots are keyed by
+that loop as well and need no lock: only the loop's thread touches them and
+there is no await between the check and the assignment.
+"""
+
+import asyncio
+import logging
+import threading
+
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# ACS Email REST API version, pinned for both the SDK clients and the
+# operation-status requests in shared_code.transport (the SDK keeps its
+# default in a private module)
+ACS_API_VERSION = '2025-09-01'
+
+_lock = threading.Lock()
+# Each slot holds (config_key, client); a new key replaces the old client.
+_http_session = (None, None)
+_email_client = (None, None)
+_async_http_session = (None, None)
+_async_email_client = (None, None)
+
+
+def _pool_config():
+    settings = get_settings()
+    return (settings.http_pool_connections, settings.http_pool_maxsize)
+
+
+def _build_session(pool_connections, pool_maxsize):
+    """Create a keep-alive session with a sized connection pool"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session():
+    """Return the shared requests.Session, rebuilding it if the pool config changed"""
+    global _http_session
+    key = _pool_config()
+    current_key, session = _http_session
+    if session is not None and current_key == key:
+        return session
+
+    with _lock:
+        current_key, session = _http_session
+        if session is None or current_key != key:
+            if session is not None:
+                session.close()
+            logger.info(f'Creating shared HTTP session (pool: {key[0]} hosts x {key[1]} connections)')
+            session = _build_session(*key)
+            _http_session = (key, session)
+        return session
+
+
+def get_email_client(connection_string):
+    """Return the shared ACS EmailClient for this connection string"""
+    global _email_client
+    key = (connection_string, _pool_config())
+    current_key, client = _email_client
+    if client is not None and current_key == key:
+        return client
+
+    with _lock:
+        current_key, client = _email_client
+        if client is None or current_key != key:
+            from azure.communication.email import EmailClient
+            from azure.core.pipeline.transport import RequestsTransport
+
+            if client is not None:
+                client.close()
+            logger.info('Creating shared Azure Email Client')
+            # The client owns a dedicated pooled session so ACS and Google
+            # traffic don't compete for the same connections.
+            transport = RequestsTransport(session=_build_session(*key[1]), session_owner=True)
+            client = EmailClient.from_connection_string(
+                connection_string, transport=transport, api_version=ACS_API_VERSION)
+            _email_client = (key, client)
+        return client
+
+
+def _build_async_session(pool_connections, pool_maxsize):
+    """Create an aiohttp session sized like the requests pool"""
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=pool_connections * pool_maxsize, limit_per_host=pool_maxsize)
+    return aiohttp.ClientSession(connector=connector)
+
+
+def _close_later(loop, resource):
+    """Schedule ``resource.close()`` if it belongs to the running loop; otherwise drop it"""
+    if loop is asyncio.get_running_loop():
+        loop.create_task(resource.close())
+
+
+def get_async_http_session():
+    """Return the shared aiohttp session for the running event loop"""
+    global _async_http_session
+    key = (asyncio.get_running_loop(), _pool_config())
+    current_key, session = _async_http_session
+    if session is None or current_key != key or session.closed:
+        if session is not None:
+            _close_later(current_key[0], session)
+        logger.info(f'Creating shared async HTTP session (pool: {key[1][0]} hosts x {key[1][1]} connections)')
+        session = _build_async_session(*key[1])
+        _async_http_session = (key, session)
+    return session
+
+
+def get_async_email_client(connection_string):
+    """Return the shared azure.communication.email.aio EmailClient for the running event loop"""
+    global _async_email_client
+    key = (asyncio.get_running_loop(), connection_string, _pool_config())
+    current_key, client = _async_email_client
+    if client is None or current_key != key:
+        from azure.communication.email.aio import EmailClient
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        if client is not None:
+            _close_later(current_key[0], client)
+        logger.info('Creating shared async Azure Email Client')
+        transport = AioHttpTransport(session=_build_async_session(*key[2]), session_owner=True)
+        client = EmailClient.from_connection_string(
+            connection_string, transport=transport, api_version=ACS_API_VERSION)
+        _async_email_client = (key, client)
+    return client
+
+
+async def reset_async():
+    """Close and forget the async clients created on the running loop"""
+    global _async_http_session, _async_email_client
+    loop = asyncio.get_running_loop()
+    for key, resource in (_async_http_session, _async_email_client):
+        if resource is not None and key[0] is loop:
+            await resource.close()
+    _async_http_session = (None, None)
+    _async_email_client = (None, None)
+
+
+def reset():
+    """Close and forget every shared client (used by scripts and benchmarks)"""
+    global _http_session, _email_client
+    with _lock:
+        _, session = _http_session
+        _, client = _email_client
+        if session is not None:
+            session.close()
+        if client is not None:
+            client.close()
+        _http_session = (None, None)
+        _email_client = (None, None)
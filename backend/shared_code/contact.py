@@ -0,0 +1,402 @@
+"""
+Request handling shared by the sync and async contact functions.
+
+contact_form and contact_form_async run the same pipeline: CORS preflight,
+per-IP rate limiting, body parsing and field validation, the reCAPTCHA
+checks, rendering the ACS message and the outbox/digest hand-off. Only the two
+network calls differ (requests and the blocking EmailClient versus aiohttp
+and azure.communication.email.aio), so each step here is synchronous and
+returns either what the next step needs or the response to send back, and
+the functions only own the I/O between them.
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime
+
+import azure.functions as func
+
+from shared_code import breaker, dedup, digest, email_check, metrics, outbox, payload, recaptcha, spam, submission_log, transport
+from shared_code.rate_limit import get_client_ip, get_rate_limiter
+from shared_code.templating import CONTACT_EMAIL
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'}
+
+def respond(log, outcome, status_code, body, headers=None):
+    """Record the outcome on ``log`` and build the JSON response"""
+    log.outcome = outcome
+    return func.HttpResponse(
+        json.dumps(body),
+        status_code=status_code,
+        headers={**HEADERS, **(headers or {})},
+    )
+
+
+def preflight(log):
+    log.outcome = 'preflight'
+    return func.HttpResponse(
+        status_code=200,
+        headers={
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    )
+
+
+def check_rate_limit(req, log):
+    """Return ``(client_ip, None)`` if the request is admitted, else ``(client_ip, 429 response)``"""
+    client_ip = get_client_ip(req)
+    log.set(client_ip=client_ip)
+    with metrics.timer('rate_limit'):
+        limit = get_rate_limiter().hit(client_ip)
+    if limit.allowed:
+        return client_ip, None
+    log.set(retry_after=limit.retry_after)
+    return client_ip, respond(log, 'rate_limited', 429, {
+        'success': False,
+        'message': 'Too many submissions. Please try again later.'
+    }, {'Retry-After': str(limit.retry_after)})
+
+
+def read_submission(req, log):
+    """
+    Decode and validate the body; return ``(submission, None)`` or ``(None, 4xx response)``.
+
+    Raises ValueError when the body isn't a JSON object.
+    """
+    try:
+        with metrics.timer('parse'):
+            submission = payload.decode(req.get_body(), default_subject='Contact Form')
+    except payload.BodyTooLarge as e:
+        log.set(body_bytes=e.size)
+        return None, respond(log, 'too_large', 413, {
+            'success': False,
+            'message': 'Your message is too long.'
+        })
+    except payload.FieldTooLong as e:
+        log.set(field=e.field, field_length=e.length)
+        return None, respond(log, 'field_too_long', 400, {
+            'success': False,
+            'message': f'The {e.field} field is too long (at most {e.limit} characters).'
+        })
+
+    # Validate required fields (only name, email, message required)
+    if not all([submission.name, submission.email, submission.message]):
+        log.set(has_name=bool(submission.name), has_email=bool(submission.email),
+                has_message=bool(submission.message))
+        return None, respond(log, 'missing_fields', 400, {
+            'success': False,
+            'message': 'Missing required fields: name, email and message are required.'
+        })
+    return submission, None
+
+
+def check_spam(submission, log):
+    """
+    Return None if the pre-filter lets the submission through, else the response.
+
+    Bot signals get the usual success response so the bot learns nothing;
+    content rejections get a 400.
+    """
+    spam_filter = spam.get_filter()
+    if spam_filter is None:
+        return None
+    with metrics.timer('spam'):
+        verdict = spam_filter.check(submission)
+    if not verdict.spam:
+        return None
+
+    log.set(spam_score=verdict.score, spam_reasons=','.join(verdict.reasons))
+    if verdict.silent:
+        return respond(log, 'spam_silent', 200, {
+            'success': True,
+            'message': 'Your message has been sent successfully!'
+        })
+    return respond(log, 'spam', 400, {
+        'success': False,
+        'message': 'Your message looks like spam. Please remove links or promotional text and try again.'
+    })
+
+
+def check_email(submission, log, validation=None):
+    """
+    Return None if the email address is valid, else the 400 response.
+
+    A valid address is replaced by its normalised form (ASCII domain), which
+    is what the reply-to and the duplicate fingerprint use. ``validation``
+    is the ValidationResult when the caller already has it (contact_form_async
+    validates on its event loop).
+    """
+    if validation is None:
+        with metrics.timer('email'):
+            validation = email_check.get_validator().validate(submission.email)
+    if validation.valid:
+        submission.email = validation.address
+        return None
+
+    log.set(email_reason=validation.reason)
+    return respond(log, 'invalid_email', 400, {
+        'success': False,
+        'message': 'Please enter a valid email address.'
+    })
+
+
+def check_duplicate(submission, settings, log):
+    """
+    Claim the submission's fingerprint before any external call.
+
+    Returns ``(key, None)`` to process the submission (pass ``key`` to
+    record_result afterwards) or ``(None, response)`` replaying the original.
+    May block up to DEDUP_WAIT_SECONDS, capped at the email send timeout,
+    while an identical request is in flight.
+    """
+    index = dedup.get_index()
+    if index is None:
+        return None, None
+    key = dedup.fingerprint(submission)
+    with metrics.timer('dedup'):
+        entry = index.claim(key, min(settings.dedup_wait_seconds, settings.email_send_timeout_ms / 1000))
+    if entry is None:
+        return key, None
+
+    log.set(duplicate_of=key[:12])
+    if entry.pending:
+        # Still in flight after the wait; don't start a second send
+        return None, respond(log, 'duplicate_pending', 409, {
+            'success': False,
+            'message': 'This message is already being processed.'
+        }, {'Retry-After': '5'})
+    log.set(original_outcome=entry.result.outcome)
+    log.outcome = 'duplicate'
+    return None, func.HttpResponse(entry.result.body, status_code=entry.result.status_code, headers={**HEADERS})
+
+
+def record_result(key, response, log):
+    """Remember a successful response for duplicates of ``key``, or release the claim"""
+    if key is None:
+        return
+    index = dedup.get_index()
+    if index is None:
+        return
+    if response is not None and 200 <= response.status_code < 300:
+        index.complete(key, dedup.DedupResult(response.status_code, response.get_body().decode('utf-8'), log.outcome))
+    else:
+        index.release(key)
+
+
+def check_recaptcha_token(submission, settings, log):
+    """
+    Return None if the token should be verified, or the 400 response when it
+    (or the secret to verify it with) is missing. Callers skip verification
+    entirely when ``settings.skip_recaptcha`` is set.
+    """
+    if settings.recaptcha_secret and submission.recaptcha_token:
+        return None
+    return respond(log, 'captcha_missing', 400, {
+        'success': False,
+        'message': 'Please complete the reCAPTCHA or set SKIP_RECAPTCHA=true for local testing.'
+    })
+
+
+def check_verification(verification, settings, log):
+    """
+    Return None if the siteverify verdict passed, else the 400 response.
+
+    When there is no verdict (the circuit breaker is open, or siteverify
+    failed or missed RECAPTCHA_BUDGET_MS) the submission is let through on
+    the local pre-checks alone (RECAPTCHA_BREAKER_POLICY=local) or answered
+    with a 503 (fail_closed).
+    """
+    log.set(captcha_score=verification.score, captcha_cached=verification.cached)
+    if verification.passed:
+        return None
+    log.set(captcha_errors=verification.error_codes)
+    if any(code in recaptcha.NO_VERDICT for code in verification.error_codes):
+        if settings.recaptcha_breaker_policy == 'local':
+            log.set(captcha_degraded=True)
+            return None
+        circuit = breaker.get_breaker(breaker.RECAPTCHA)
+        return unavailable(circuit.retry_after() if circuit is not None else 1, log)
+    return respond(log, 'captcha_failed', 400, {
+        'success': False,
+        'message': 'reCAPTCHA verification failed. Please try again.'
+    })
+
+
+def _email_values(submission, client_ip):
+    """Template values for one submission (the contact email and digest entries)"""
+    return {
+        'name': submission.name,
+        'email': submission.email,
+        'phone': submission.phone or 'Not provided',
+        'company': submission.company or 'Not provided',
+        'subject': submission.subject,
+        'message': submission.message,
+        'submitted_on': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+        'ip_address': client_ip,
+    }
+
+
+def record_received(submission, client_ip, log):
+    """
+    Append the submission to the submission log and return its id.
+
+    The id is reused as the outbox/digest id and the email idempotency key,
+    so a replay from the log can't deliver a second copy through ACS.
+    """
+    submission_id = str(uuid.uuid4())
+    log.set(submission_id=submission_id)
+    entries = submission_log.get_log()
+    if entries is not None:
+        entries.append(submission_id, submission_log.RECEIVED, {
+            'values': _email_values(submission, client_ip),
+            'subject': f"New Contact: {submission.subject}",
+        }, email=submission.email)
+    return submission_id
+
+
+def _record(submission_id, kind, data):
+    entries = submission_log.get_log() if submission_id else None
+    if entries is not None:
+        entries.append(submission_id, kind, data)
+
+
+def _check_configured(settings, log):
+    # LAWGATE_EMAIL is a comma-separated list, split once into settings.recipients
+    log.set(recipients=len(settings.recipients))
+    if transport.is_configured(settings):
+        return None
+    logger.error('❌ No email provider configured (ACS connection string or SendGrid API key)')
+    return respond(log, 'not_configured', 500, {
+        'success': False,
+        'message': 'Email service not configured'
+    })
+
+
+def should_buffer(submission, settings, log):
+    """True in digest mode unless the submission matches a priority rule"""
+    if not settings.digest_enabled:
+        return False
+    priority = digest.is_priority(submission, settings.digest_priority_rules)
+    log.set(priority=priority)
+    return not priority
+
+
+def buffer(submission, client_ip, settings, log, submission_id=None):
+    """Hold the submission for the next digest email and acknowledge with 202"""
+    response = _check_configured(settings, log)
+    if response:
+        return response
+    with metrics.timer('enqueue'):
+        submission_id = digest.get_digest().add(_email_values(submission, client_ip), submission_id)
+    log.set(submission_id=submission_id)
+    _record(submission_id, submission_log.HANDED_OFF, {'to': 'digest'})
+    return respond(log, 'buffered', 202, {
+        'success': True,
+        'message': 'Your message has been received and will be delivered shortly.',
+        'submissionId': submission_id
+    })
+
+
+def build_message(submission, client_ip, settings, log):
+    """Render the ACS message; return ``(message, None)`` or ``(None, 500 response)`` if ACS isn't configured"""
+    response = _check_configured(settings, log)
+    if response:
+        return None, response
+
+    # Render the email body and its plain-text alternative
+    with metrics.timer('render'):
+        email_content = CONTACT_EMAIL.render(_email_values(submission, client_ip))
+
+    return transport.email_message(
+        settings, email_content, f"New Contact: {submission.subject}", submission.email,
+    ), None
+
+
+def enqueue(email_message, log, submission_id=None):
+    """Queue the message for the outbox_dispatcher function and acknowledge with 202"""
+    with metrics.timer('enqueue'):
+        submission_id = outbox.get_outbox().enqueue(email_message, submission_id)
+    log.set(submission_id=submission_id)
+    _record(submission_id, submission_log.HANDED_OFF, {'to': 'outbox'})
+    return respond(log, 'queued', 202, {
+        'success': True,
+        'message': 'Your message has been received and will be delivered shortly.',
+        'submissionId': submission_id
+    })
+
+
+def overloaded(error, log):
+    """503 for a submission shed by admission control (``error`` is the Overloaded)"""
+    log.set(shed_reason=error.reason, retry_after=error.retry_after)
+    return respond(log, 'shed', 503, {
+        'success': False,
+        'message': 'We are receiving a lot of messages right now. Please try again shortly.'
+    }, {'Retry-After': str(error.retry_after)})
+
+
+def unavailable(retry_after, log):
+    """503 for a request refused by an open circuit breaker"""
+    retry_after = max(1, retry_after)
+    log.set(retry_after=retry_after)
+    return respond(log, 'unavailable', 503, {
+        'success': False,
+        'message': 'The service is temporarily unavailable. Please try again shortly.'
+    }, {'Retry-After': str(retry_after)})
+
+
+def email_unavailable(error, email_message, settings, log, submission_id=None):
+    """
+    Every email provider's breaker is open (``error`` is the CircuitOpen):
+    queue the message for outbox_dispatcher (EMAIL_BREAKER_POLICY=queue) or
+    answer 503.
+    """
+    log.set(circuit_open=error.name)
+    if settings.email_breaker_policy == 'queue':
+        return enqueue(email_message, log, submission_id)
+    _record(submission_id, submission_log.FAILED, {'error': str(error)})
+    return unavailable(error.retry_after, log)
+
+
+def sent(result, log, submission_id=None):
+    log.set(provider=result.provider, message_id=result.message_id)
+    _record(submission_id, submission_log.DELIVERED, {'provider': result.provider, 'message_id': result.message_id})
+    return respond(log, 'sent', 200, {
+        'success': True,
+        'message': 'Your message has been sent successfully!'
+    })
+
+
+def send_failed(error, log, submission_id=None):
+    """Called from the except block around the send, so the traceback is logged"""
+    logger.exception('❌ Error sending email: %s', error)
+    log.set(error_type=type(error).__name__)
+    # Still in the submission log; manage_submissions.py replays it
+    _record(submission_id, submission_log.FAILED, {'error': str(error)})
+    return respond(log, 'send_failed', 500, {
+        'success': False,
+        'message': 'Failed to send email. Please try again later.',
+        'error': str(error)
+    })
+
+
+def invalid_request(error, log):
+    log.set(error=str(error))
+    return respond(log, 'invalid_json', 400, {
+        'success': False,
+        'message': 'Invalid request format'
+    })
+
+
+def failed(error, log):
+    logger.exception('❌ Error processing contact form: %s', error)
+    log.set(error_type=type(error).__name__)
+    return respond(log, 'error', 500, {
+        'success': False,
+        'message': 'An error occurred. Please try again later.',
+        'error': str(error)
+    })
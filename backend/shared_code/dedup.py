@@ -0,0 +1,279 @@
+"""
+Deduplication of repeated contact submissions.
+
+Double-clicks, frontend retries after a timeout and bots replaying a payload
+used to repeat the whole pipeline, reCAPTCHA and ACS send included. Each
+valid submission is fingerprinted by a normalised hash of (email, name,
+subject, message) and claimed in a TTL-bounded index before any external
+call. A repeat within DEDUP_TTL_SECONDS gets the original response back;
+one that arrives while the original is still in flight is answered 409 at
+once, or after waiting up to DEDUP_WAIT_SECONDS (at most the email send
+timeout) for it. The wait happens before admission control, so it holds a
+worker thread that no concurrency limit accounts for.
+
+Only successful results are remembered. If the original fails (reCAPTCHA,
+ACS error), its claim is released so a retry is processed normally.
+
+Two backends are available, mirroring shared_code.rate_limit:
+
+- ``MemoryBackend`` (default): per-worker, insertion ordered with TTL
+  eviction and a hard cap on the number of entries.
+- ``RedisBackend``: shared between instances (SET NX with an expiry).
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 10000  # matches the Settings defaults
+# A claim whose request never finishes (worker recycled) expires after this
+PENDING_TTL_SECONDS = 60
+
+# The original response, replayed for duplicates
+DedupResult = namedtuple('DedupResult', ['status_code', 'body', 'outcome'])
+# ``result`` is None while the original request is still in flight
+DedupEntry = namedtuple('DedupEntry', ['pending', 'result'])
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _normalise(value):
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', str(value or ''))).strip().casefold()
+
+
+def fingerprint(submission):
+    """Hex digest identifying a submission regardless of case and whitespace"""
+    parts = (submission.email, submission.name, submission.subject, submission.message)
+    return hashlib.sha256('\x1f'.join(_normalise(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """In-process entries with TTL eviction and a hard size cap"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, DedupResult or None)
+        self._changed = threading.Condition()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def claim(self, key, now):
+        with self._changed:
+            entry = self._get(key, now)
+            if entry is not None:
+                return DedupEntry(entry[1] is None, entry[1])
+            self._entries[key] = (now + PENDING_TTL_SECONDS, None)
+            self._evict(now)
+            return None
+
+    def store(self, key, result, ttl, now):
+        with self._changed:
+            self._entries[key] = (now + ttl, result)
+            self._entries.move_to_end(key)
+            self._evict(now)
+            self._changed.notify_all()
+
+    def release(self, key):
+        with self._changed:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is None:
+                del self._entries[key]
+            self._changed.notify_all()
+
+    def wait(self, key, timeout, clock):
+        """Block until ``key`` is no longer pending; return its entry (None if released)"""
+        deadline = clock() + timeout
+        with self._changed:
+            while True:
+                now = clock()
+                entry = self._get(key, now)
+                if entry is None or entry[1] is not None:
+                    return None if entry is None else DedupEntry(False, entry[1])
+                if now >= deadline:
+                    return DedupEntry(True, None)
+                self._changed.wait(deadline - now)
+
+    def _evict(self, now):
+        # Drop expired entries from the front, then enforce the size cap
+        entries = self._entries
+        while entries and (len(entries) > self.max_entries or next(iter(entries.values()))[0] <= now):
+            entries.popitem(last=False)
+
+
+class RedisBackend:
+    """Entries shared through a Redis-protocol server"""
+
+    PENDING = b''
+
+    def __init__(self, url=None, client=None, prefix='lawgate:dedup:', poll_interval=0.05):
+        if client is None:
+            import redis  # only needed when DEDUP_BACKEND=redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client = client
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+
+    def _entry(self, value):
+        if value is None:
+            return None
+        if value == self.PENDING:
+            return DedupEntry(True, None)
+        return DedupEntry(False, DedupResult(*json.loads(value)))
+
+    def claim(self, key, now):
+        if self.client.set(self.prefix + key, self.PENDING, nx=True, ex=PENDING_TTL_SECONDS):
+            return None
+        entry = self._entry(self.client.get(self.prefix + key))
+        # Expired between SET and GET: the claim is free again
+        return entry if entry is not None else self.claim(key, now)
+
+    def store(self, key, result, ttl, now):
+        self.client.set(self.prefix + key, json.dumps(result), ex=max(1, int(ttl)))
+
+    def release(self, key):
+        # Only drop our pending marker, never a stored result
+        with self.client.pipeline() as pipe:
+            pipe.watch(self.prefix + key)
+            if pipe.get(self.prefix + key) == self.PENDING:
+                pipe.multi()
+                pipe.delete(self.prefix + key)
+                pipe.execute()
+
+    def wait(self, key, timeout, clock):
+        deadline = clock() + timeout
+        while True:
+            entry = self._entry(self.client.get(self.prefix + key))
+            if entry is None or not entry.pending or clock() >= deadline:
+                return entry
+            time.sleep(self.poll_interval)
+
+
+class DedupIndex:
+    """Claims submission fingerprints and remembers successful results for ``ttl_seconds``"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, backend=None, clock=time.monotonic):
+        self.ttl = ttl_seconds
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'pending_hits': 0, 'misses': 0, 'stored': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def claim(self, key, wait_seconds=0):
+        """
+        Claim ``key`` for this request.
+
+        Returns None when the caller should process the submission, or the
+        DedupEntry of the original: completed (replay its result) or, if it
+        is still in flight after ``wait_seconds``, pending. Backend errors
+        fail open.
+        """
+        try:
+            entry = self.backend.claim(key, self.clock())
+            if entry is not None and entry.pending and wait_seconds:
+                entry = self.backend.wait(key, wait_seconds, self.clock)
+                if entry is None:
+                    # The original failed and released its claim; take over
+                    entry = self.backend.claim(key, self.clock())
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Dedup backend error, processing request: {str(e)}')
+            return None
+
+        if entry is None:
+            self._count('misses')
+        else:
+            self._count('pending_hits' if entry.pending else 'hits')
+        return entry
+
+    def complete(self, key, result):
+        """Remember the result of a successful submission"""
+        try:
+            self.backend.store(key, result, self.ttl, self.clock())
+            self._count('stored')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Dedup backend error storing result: {str(e)}')
+
+    def release(self, key):
+        """Give up the claim so a retry of a failed submission is processed"""
+        try:
+            self.backend.release(key)
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Dedup backend error releasing claim: {str(e)}')
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if isinstance(self.backend, MemoryBackend):
+            stats['entries'] = len(self.backend)
+        return stats
+
+
+_index = (None, None)
+_index_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.dedup_ttl_seconds,
+        settings.dedup_max_entries,
+        settings.dedup_backend,
+        settings.dedup_redis_url or settings.rate_limit_redis_url,
+    )
+
+
+def get_index():
+    """Return the process-wide DedupIndex, or None when DEDUP_TTL_SECONDS is 0"""
+    global _index
+    key = _config()
+    current_key, index = _index
+    if current_key == key:
+        return index
+
+    with _index_lock:
+        current_key, index = _index
+        if current_key != key:
+            ttl, max_entries, backend_name, redis_url = key
+            if ttl <= 0:
+                index = None
+            elif backend_name == 'redis':
+                index = DedupIndex(ttl, RedisBackend(redis_url))
+            else:
+                index = DedupIndex(ttl, MemoryBackend(max_entries))
+            _index = (key, index)
+        return index
+
+
+def _collect_stats():
+    _, index = _index
+    if index is None:
+        return {}
+    return {(f'dedup_{name}', ()): value for name, value in index.get_stats().items()}
+
+
+metrics.add_collector(_collect_stats)
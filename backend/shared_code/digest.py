@@ -0,0 +1,238 @@
+"""
+Digest mode: coalesce contact submissions into periodic summary emails.
+
+With EMAIL_DELIVERY_MODE=digest the contact functions buffer each
+submission in the outbox database instead of sending one ACS email per
+submission. The outbox_dispatcher timer flushes the buffer as one digest
+email per recipient once the oldest buffered submission is
+DIGEST_INTERVAL_SECONDS old or DIGEST_MAX_SUBMISSIONS are waiting, whichever
+comes first. Digests are written to the outbox in the same transaction that
+claims the buffered rows, so they are delivered (and retried) like any other
+outbox message and a crash can't lose or duplicate a batch.
+
+Submissions matching DIGEST_PRIORITY_RULES still go out immediately. Rules
+are ``field=pattern`` pairs separated by ``;``, matched case-insensitively
+as regular expressions, e.g. ``subject=urgent|injunction;company=acme``.
+
+Each flush records how many submissions it covered and how many messages it
+queued; the difference is the number of ACS send calls saved, exposed as the
+``digest_api_calls_saved`` gauge.
+"""
+
+import json
+import logging
+import re
+import time
+import uuid
+from functools import lru_cache
+
+from shared_code import metrics, outbox
+from shared_code.settings import get_settings
+from shared_code.templating import RenderedEmail, load_template
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_FIELDS = ('name', 'email', 'phone', 'company', 'subject', 'message')
+
+DIGEST_EMAIL = load_template('contact_digest.html')
+DIGEST_ENTRY = load_template('contact_digest_entry.html')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest_buffer (
+    id TEXT PRIMARY KEY,
+    submission TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    digest_id TEXT,
+    flushed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_digest_buffer_pending ON digest_buffer (digest_id, created_at);
+CREATE TABLE IF NOT EXISTS digests (
+    id TEXT PRIMARY KEY,
+    submissions INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def is_enabled():
+    """True when non-priority submissions should be buffered for a digest"""
+    return get_settings().digest_enabled
+
+
+@lru_cache(maxsize=8)
+def parse_rules(spec):
+    """Compile a DIGEST_PRIORITY_RULES string into ``((field, regex), ...)``"""
+    rules = []
+    for item in spec.split(';'):
+        field, _, pattern = item.partition('=')
+        field, pattern = field.strip().lower(), pattern.strip()
+        if not field or not pattern:
+            continue
+        if field not in PRIORITY_FIELDS:
+            logger.warning(f'Ignoring digest priority rule on unknown field: {field}')
+            continue
+        try:
+            rules.append((field, re.compile(pattern, re.IGNORECASE)))
+        except re.error as e:
+            logger.warning(f'Ignoring invalid digest priority pattern {pattern!r}: {e}')
+    return tuple(rules)
+
+
+def is_priority(submission, spec=None):
+    """True if ``submission`` matches a priority rule and must not wait for a digest"""
+    spec = get_settings().digest_priority_rules if spec is None else spec
+    return any(
+        regex.search(getattr(submission, field) or '')
+        for field, regex in parse_rules(spec)
+    )
+
+
+def render_digest(entries):
+    """Render the digest email for a list of submission value dicts (oldest first)"""
+    rendered = [DIGEST_ENTRY.render(entry) for entry in entries]
+    return DIGEST_EMAIL.render(
+        {
+            'count': len(entries),
+            'first_submitted_on': entries[0]['submitted_on'],
+            'last_submitted_on': entries[-1]['submitted_on'],
+        },
+        fragments={'entries': RenderedEmail(
+            ''.join(entry.html for entry in rendered),
+            ''.join(f'\n{entry.text}' for entry in rendered),
+        )},
+    )
+
+
+_digest = None
+
+
+def get_digest():
+    """Return the process-wide Digest over the current outbox database"""
+    global _digest
+    box = outbox.get_outbox()
+    if _digest is None or _digest.outbox is not box:
+        _digest = Digest(box)
+    return _digest
+
+
+class Digest:
+    """Submission buffer stored next to the outbox it flushes into"""
+
+    def __init__(self, box):
+        self.outbox = box
+        with outbox.connect(box.path) as conn:
+            conn.executescript(_SCHEMA)
+
+    def add(self, values, submission_id=None, now=None):
+        """Buffer one submission's template values and return its id"""
+        submission_id = submission_id or str(uuid.uuid4())
+        with outbox.connect(self.outbox.path) as conn:
+            conn.execute(
+                'INSERT INTO digest_buffer (id, submission, created_at) VALUES (?, ?, ?)',
+                (submission_id, json.dumps(values), time.time() if now is None else now),
+            )
+        return submission_id
+
+    def get(self, submission_id):
+        """Return the state of a buffered submission, or None if unknown"""
+        with outbox.connect(self.outbox.path) as conn:
+            row = conn.execute(
+                'SELECT id, digest_id, created_at, flushed_at FROM digest_buffer WHERE id = ?',
+                (submission_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'status': 'batched' if row['digest_id'] else 'buffered',
+            'digest_id': row['digest_id'],
+            'created_at': row['created_at'],
+            'updated_at': row['flushed_at'] or row['created_at'],
+        }
+
+    def flush_due(self, sender, recipients, interval_seconds, max_submissions, now=None):
+        """
+        Move due submissions into digest messages on the outbox.
+
+        Full batches of ``max_submissions`` are always flushed; a partial
+        batch only once its oldest submission is ``interval_seconds`` old.
+        Returns ``{'digests', 'submissions', 'messages'}`` for this run.
+        """
+        now = time.time() if now is None else now
+        summary = {'digests': 0, 'submissions': 0, 'messages': 0}
+        if not recipients:
+            return summary
+
+        with outbox.connect(self.outbox.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id, submission, created_at FROM digest_buffer '
+                    'WHERE digest_id IS NULL ORDER BY created_at'
+                ).fetchall()
+                while rows:
+                    batch, rows = rows[:max_submissions], rows[max_submissions:]
+                    if len(batch) < max_submissions and now - batch[0]['created_at'] < interval_seconds:
+                        break
+                    self._flush_batch(conn, batch, sender, recipients, now)
+                    summary['digests'] += 1
+                    summary['submissions'] += len(batch)
+                    summary['messages'] += len(recipients)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return summary
+
+    @staticmethod
+    def _flush_batch(conn, batch, sender, recipients, now):
+        digest_id = str(uuid.uuid4())
+        entries = [json.loads(row['submission']) for row in batch]
+        content = render_digest(entries)
+        # One message per recipient: a digest is the only copy of these
+        # submissions, so a bounce for one address mustn't hold up the rest.
+        for address in recipients:
+            outbox.insert_message(conn, {
+                "senderAddress": sender,
+                "recipients": {"to": [{"address": address}]},
+                "content": {
+                    "subject": f"Contact digest: {len(entries)} new submissions",
+                    "html": content.html,
+                    "plainText": content.text
+                },
+            }, str(uuid.uuid4()), now)
+        conn.executemany(
+            'UPDATE digest_buffer SET digest_id = ?, flushed_at = ? WHERE id = ?',
+            [(digest_id, now, row['id']) for row in batch],
+        )
+        conn.execute(
+            'INSERT INTO digests (id, submissions, messages, created_at) VALUES (?, ?, ?, ?)',
+            (digest_id, len(batch), len(recipients), now),
+        )
+        logger.info(f'📬 Digest {digest_id}: {len(batch)} submissions queued as {len(recipients)} messages')
+
+    def stats(self):
+        """Buffered submissions and lifetime digest totals, including ACS calls saved"""
+        with outbox.connect(self.outbox.path) as conn:
+            buffered = conn.execute('SELECT COUNT(*) FROM digest_buffer WHERE digest_id IS NULL').fetchone()[0]
+            digests, submissions, messages = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(submissions), 0), COALESCE(SUM(messages), 0) FROM digests'
+            ).fetchone()
+        # Without digests every submission is one send to all recipients
+        return {
+            'buffered': buffered,
+            'digests': digests,
+            'submissions': submissions,
+            'messages': messages,
+            'api_calls_saved': submissions - messages,
+        }
+
+
+def _collect_stats():
+    if _digest is None:
+        return {}
+    return {(f'digest_{name}', ()): value for name, value in _digest.stats().items()}
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,379 @@
+"""
+Email address validation for the contact functions.
+
+A malformed address used to cost a reCAPTCHA call, an ACS send and a bounce,
+and ended up as a broken ``replyTo``. Every address is now checked before any
+paid external call:
+
+- syntax: an ASCII dot-atom local part (at most 64 characters) and a domain
+  of at least two labels, at most 254 characters in all, matched by
+  precompiled patterns
+- IDN: internationalised domains are normalised to their ASCII (punycode)
+  form, and the domain is lower-cased, so ``Ana@Bücher.Example`` is accepted
+  and sent on as ``Ana@xn--bcher-kva.example``
+- domain (EMAIL_DOMAIN_CHECK, off by default): the domain must exist and
+  accept mail, i.e. have an MX record that isn't a null MX (RFC 7505), or
+  failing that an A/AAAA record (the implicit MX of RFC 5321)
+
+Lookup results are kept in an LRU cache: domains that accept mail for
+EMAIL_DOMAIN_CACHE_TTL_SECONDS, domains that don't (negative caching) for
+EMAIL_DOMAIN_NEGATIVE_TTL_SECONDS. A lookup that fails or times out
+(EMAIL_DNS_TIMEOUT_MS) lets the address through, since an outage of the
+resolver is no reason to turn visitors away, and is retried after
+ERROR_TTL_SECONDS.
+
+Resolvers are pluggable: anything with a ``lookup(domain)`` method returning
+MAIL, NO_DOMAIN or NO_MAIL (and raising on errors) can be passed to
+EmailValidator. EMAIL_RESOLVER picks the built-in one: ``dnspython`` when it
+is installed (``auto``, the default), otherwise ``udp``, a minimal stdlib
+client asking the servers in EMAIL_DNS_SERVERS or /etc/resolv.conf.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Domain statuses
+MAIL = 'mail'
+NO_DOMAIN = 'no_domain'
+NO_MAIL = 'no_mail'
+UNKNOWN = 'unknown'  # the lookup failed; the address is let through
+
+# Defaults match Settings
+DEFAULT_CACHE_TTL_SECONDS = 3600
+DEFAULT_NEGATIVE_TTL_SECONDS = 300
+DEFAULT_CACHE_MAX_ENTRIES = 4096
+DEFAULT_DNS_TIMEOUT_MS = 1000
+ERROR_TTL_SECONDS = 30
+
+MAX_ADDRESS_LENGTH = 254
+MAX_LOCAL_LENGTH = 64
+
+_LOCAL = re.compile(r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*")
+# Lower-case ASCII labels; the top-level one is alphabetic or punycode
+_DOMAIN = re.compile(r'(?:(?!-)[a-z0-9-]{1,63}(?<!-)\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})')
+
+metrics.REGISTRY.describe('email_rejected_total', 'Submissions rejected for their email address, by reason')
+
+ValidationResult = namedtuple('ValidationResult', ['valid', 'address', 'reason', 'domain_status'])
+
+
+def normalize(address):
+    """
+    Return ``(address, domain, None)`` with the domain in lower-case ASCII, or
+    ``(None, None, reason)`` when the address is malformed.
+    """
+    local, at, domain = address.rpartition('@')
+    if not at or not local or not domain:
+        return None, None, 'syntax'
+    if len(local) > MAX_LOCAL_LENGTH or not _LOCAL.fullmatch(local):
+        return None, None, 'syntax'
+    if domain.isascii():
+        domain = domain.lower()
+    else:
+        try:
+            # IDNA 2003 (the stdlib codec): case-folds and maps full-width dots
+            domain = domain.encode('idna').decode('ascii').lower()
+        except UnicodeError:
+            return None, None, 'idna'
+    address = f'{local}@{domain}'
+    if len(address) > MAX_ADDRESS_LENGTH:
+        return None, None, 'too_long'
+    if not _DOMAIN.fullmatch(domain):
+        return None, None, 'syntax'
+    return address, domain, None
+
+
+class DnsPythonResolver:
+    """MX, then A/AAAA lookups with dnspython"""
+
+    def __init__(self, timeout_ms=DEFAULT_DNS_TIMEOUT_MS, servers=()):
+        import dns.resolver
+
+        self.resolver = dns.resolver.Resolver()
+        self.resolver.lifetime = timeout_ms / 1000
+        if servers:
+            self.resolver.nameservers = list(servers)
+
+    def lookup(self, domain):
+        from dns.resolver import NXDOMAIN, NoAnswer
+
+        try:
+            answer = self.resolver.resolve(domain, 'MX')
+        except NXDOMAIN:
+            return NO_DOMAIN
+        except NoAnswer:
+            answer = ()
+        exchanges = [record.exchange.to_text() for record in answer]
+        if exchanges:
+            return NO_MAIL if all(exchange == '.' for exchange in exchanges) else MAIL
+        for rdtype in ('A', 'AAAA'):
+            try:
+                self.resolver.resolve(domain, rdtype)
+                return MAIL
+            except NoAnswer:
+                continue
+        return NO_MAIL
+
+
+def _skip_name(data, offset):
+    """Offset just past the (possibly compressed) name at ``offset``"""
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def _nameservers(path='/etc/resolv.conf'):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return tuple(line.split()[1] for line in f if line.startswith('nameserver') and len(line.split()) > 1)
+    except OSError:
+        return ()
+
+
+class UdpResolver:
+    """
+    MX, then A/AAAA lookups over UDP with the standard library only.
+
+    Asks each server in turn within one overall timeout; answers are only
+    read for their record types (and whether an MX is a null MX), so name
+    compression in the answer section never needs expanding.
+    """
+
+    A, MX, AAAA = 1, 15, 28
+    NXDOMAIN = 3
+
+    def __init__(self, timeout_ms=DEFAULT_DNS_TIMEOUT_MS, servers=()):
+        self.timeout = timeout_ms / 1000
+        self.servers = tuple(servers) or _nameservers()
+
+    def _query(self, domain, rdtype, deadline):
+        """``(rcode, [(type, rdata), ...])`` for one question"""
+        query_id = os.urandom(2)
+        question = b''.join(bytes((len(label),)) + label for label in domain.encode('ascii').split(b'.'))
+        packet = query_id + struct.pack('!HHHHH', 0x0100, 1, 0, 0, 0) + question + struct.pack('!BHH', 0, rdtype, 1)
+        error = OSError(f'No DNS server configured for {domain}')
+        for server in self.servers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'DNS lookup of {domain} timed out')
+            family = socket.AF_INET6 if ':' in server else socket.AF_INET
+            try:
+                with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                    sock.settimeout(remaining)
+                    sock.sendto(packet, (server, 53))
+                    data = sock.recv(4096)
+                    while data[:2] != query_id:  # a late answer to an earlier query
+                        data = sock.recv(4096)
+            except OSError as e:
+                error = e
+                continue
+            return self._parse(data)
+        raise error
+
+    @staticmethod
+    def _parse(data):
+        flags, questions, answers = struct.unpack_from('!HHH', data, 2)
+        offset = 12
+        for _ in range(questions):
+            offset = _skip_name(data, offset) + 4
+        records = []
+        for _ in range(answers):
+            offset = _skip_name(data, offset)
+            rtype, _, _, length = struct.unpack_from('!HHIH', data, offset)
+            offset += 10
+            records.append((rtype, data[offset:offset + length]))
+            offset += length
+        return flags & 0x0F, records
+
+    def lookup(self, domain):
+        deadline = time.monotonic() + self.timeout
+        rcode, records = self._query(domain, self.MX, deadline)
+        if rcode == self.NXDOMAIN:
+            return NO_DOMAIN
+        if rcode:
+            raise OSError(f'DNS error {rcode} looking up {domain}')
+        exchanges = [rdata for rtype, rdata in records if rtype == self.MX]
+        if exchanges:
+            # A null MX is preference 0 and the root name (a single zero byte)
+            return NO_MAIL if all(rdata[2:] == b'\x00' for rdata in exchanges) else MAIL
+        for rdtype in (self.A, self.AAAA):
+            _, records = self._query(domain, rdtype, deadline)
+            if any(rtype == rdtype for rtype, _ in records):
+                return MAIL
+        return NO_MAIL
+
+
+def make_resolver(name='auto', timeout_ms=DEFAULT_DNS_TIMEOUT_MS, servers=()):
+    """The built-in resolver called ``name``: auto, dnspython or udp"""
+    if name in ('auto', 'dnspython'):
+        try:
+            return DnsPythonResolver(timeout_ms, servers)
+        except ImportError:
+            if name == 'dnspython':
+                logger.error('❌ EMAIL_RESOLVER=dnspython but dnspython is not installed; using udp')
+    return UdpResolver(timeout_ms, servers)
+
+
+class EmailValidator:
+    """Syntax and IDN checks, plus optional domain lookups cached with positive and negative TTLs"""
+
+    def __init__(self, domain_check=False, resolver=None, cache_ttl=DEFAULT_CACHE_TTL_SECONDS,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL_SECONDS, cache_max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                 clock=time.monotonic):
+        self.domain_check = domain_check
+        self.resolver = resolver
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache_max_entries = cache_max_entries
+        self.clock = clock
+        self._cache = OrderedDict()  # domain -> (expires_at, status)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _lookup(self, domain, now):
+        with self._lock:
+            entry = self._cache.get(domain)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(domain)
+                self.stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._cache[domain]
+            self.stats['misses'] += 1
+            return None
+
+    def _store(self, domain, status, now):
+        if status == MAIL:
+            ttl = self.cache_ttl
+        elif status == UNKNOWN:
+            ttl = min(ERROR_TTL_SECONDS, self.negative_ttl)
+        else:
+            ttl = self.negative_ttl
+        with self._lock:
+            self._cache[domain] = (now + ttl, status)
+            self._cache.move_to_end(domain)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _resolve(self, domain):
+        """Ask the resolver; never raises"""
+        try:
+            status = self.resolver.lookup(domain)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f'Email domain lookup failed for {domain}: {str(e) or type(e).__name__}')
+            status = UNKNOWN
+        self._store(domain, status, self.clock())
+        return status
+
+    def _result(self, address, status):
+        if status in (NO_DOMAIN, NO_MAIL):
+            metrics.increment('email_rejected_total', reason=status)
+            return ValidationResult(False, address, status, status)
+        return ValidationResult(True, address, None, status)
+
+    def _check_syntax(self, address):
+        normalized, domain, reason = normalize(address or '')
+        if reason:
+            metrics.increment('email_rejected_total', reason=reason)
+        return normalized, domain, reason
+
+    def validate(self, address):
+        """Return a ValidationResult for ``address``; ``address`` on it is the normalised form"""
+        normalized, domain, reason = self._check_syntax(address)
+        if reason:
+            return ValidationResult(False, None, reason, None)
+        if not self.domain_check or self.resolver is None:
+            return ValidationResult(True, normalized, None, None)
+        status = self._lookup(domain, self.clock())
+        if status is None:
+            with metrics.timer('email_domain'):
+                status = self._resolve(domain)
+        return self._result(normalized, status)
+
+    async def validate_async(self, address):
+        """validate() for coroutines: a lookup that misses the cache runs in a thread"""
+        normalized, domain, reason = self._check_syntax(address)
+        if reason:
+            return ValidationResult(False, None, reason, None)
+        if not self.domain_check or self.resolver is None:
+            return ValidationResult(True, normalized, None, None)
+        status = self._lookup(domain, self.clock())
+        if status is None:
+            with metrics.timer('email_domain'):
+                status = await asyncio.to_thread(self._resolve, domain)
+        return self._result(normalized, status)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._cache))
+
+
+_validator = (None, None)
+_validator_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.email_domain_check,
+        settings.email_resolver,
+        settings.email_dns_timeout_ms,
+        settings.email_dns_servers,
+        settings.email_domain_cache_ttl_seconds,
+        settings.email_domain_negative_ttl_seconds,
+        settings.email_domain_cache_max_entries,
+    )
+
+
+def get_validator():
+    """Return the process-wide EmailValidator, rebuilt when its configuration changes"""
+    global _validator
+    key = _config()
+    current_key, validator = _validator
+    if validator is not None and current_key == key:
+        return validator
+
+    with _validator_lock:
+        current_key, validator = _validator
+        if validator is None or current_key != key:
+            domain_check, resolver, timeout_ms, servers, ttl, negative_ttl, max_entries = key
+            validator = EmailValidator(
+                domain_check=domain_check,
+                resolver=make_resolver(resolver, timeout_ms, servers) if domain_check else None,
+                cache_ttl=ttl,
+                negative_ttl=negative_ttl,
+                cache_max_entries=max_entries,
+            )
+            _validator = (key, validator)
+        return validator
+
+
+def _collect_stats():
+    _, validator = _validator
+    if validator is None or not validator.domain_check:
+        return {}
+    return {
+        (f'email_domain_cache_{name}', ()): value
+        for name, value in validator.get_stats().items()
+    }
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,188 @@
+"""
+In-process latency histograms and counters for the contact pipeline.
+
+Each stage of a request (body parsing, reCAPTCHA, rendering, client
+creation, begin_send, poller.result, ...) is timed with a monotonic clock and
+recorded in a fixed-bucket histogram, and every request increments an
+outcome counter. The metrics function exposes the registry in Prometheus
+text format or as a JSON snapshot with bucket-interpolated percentiles.
+
+Values are per worker process; scrape every instance or aggregate in the
+monitoring backend.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# From 100µs (local stages) up to 30s (a stuck ACS poll)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observations are O(log buckets)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower  # beyond the last bucket; report its bound
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'p50': _round(self.quantile(0.50)),
+            'p95': _round(self.quantile(0.95)),
+            'p99': _round(self.quantile(0.99)),
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Registry:
+    """Named, labelled histograms and counters guarded by one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}  # (name, labels) -> int
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collect):
+        """
+        Register a callable returning ``{(name, labels_tuple): value}`` gauges,
+        read at scrape time (e.g. cache statistics owned by another module).
+        """
+        self._collectors.append(collect)
+
+    @contextmanager
+    def timer(self, stage, name='contact_stage_seconds'):
+        """Time the enclosed block into the per-stage histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, stage=stage)
+
+    def _gauges(self):
+        gauges = {}
+        for collect in self._collectors:
+            gauges.update(collect())
+        return gauges
+
+    def snapshot(self):
+        """JSON-friendly view with percentiles per histogram"""
+        with self._lock:
+            histograms = {key: histogram.snapshot() for key, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+        result = {'histograms': {}, 'counters': {}, 'gauges': {}}
+        for (name, labels), snap in sorted(histograms.items()):
+            result['histograms'].setdefault(name, []).append({'labels': dict(labels), **snap})
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), value in sorted(self._gauges().items()):
+            result['gauges'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        return result
+
+    def prometheus(self):
+        """Render the registry in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts), histogram.total, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+
+        def header(name, kind, emitted):
+            if name in emitted:
+                return
+            emitted.add(name)
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        emitted = set()
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            header(name, 'histogram', emitted)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter', emitted)
+            lines.append(f'{name}{_labels(labels)} {value}')
+        for (name, labels), value in sorted(self._gauges().items()):
+            header(name, 'gauge', emitted)
+            lines.append(f'{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REGISTRY.describe('contact_stage_seconds', 'Time spent in each stage of the contact pipeline')
+REGISTRY.describe('contact_request_seconds', 'End-to-end contact request latency by outcome')
+REGISTRY.describe('contact_requests_total', 'Contact requests by outcome')
+
+observe = REGISTRY.observe
+increment = REGISTRY.increment
+timer = REGISTRY.timer
+add_collector = REGISTRY.add_collector
+
+
+def record_request(function, outcome, seconds):
+    """Count a finished request and record its end-to-end latency"""
+    REGISTRY.increment('contact_requests_total', function=function, outcome=outcome)
+    REGISTRY.observe('contact_request_seconds', seconds, function=function, outcome=outcome)
@@ -0,0 +1,311 @@
+"""
+Durable outbox for contact form emails.
+
+In outbox mode the HTTP function only validates the submission, writes the
+prepared email message to a local SQLite queue and answers 202. The
+outbox_dispatcher function drains the queue in the background, so client
+latency is no longer tied to ACS long-running-operation polling.
+
+Each row moves through: pending -> sending -> sent, or back to pending with a
+backoff until max attempts is reached and it becomes failed. Rows are sent
+through shared_code.transport's EmailSender, so provider failover, health
+ordering and the per-provider circuit breakers apply as for inline sends.
+The submission id is the idempotency key (the ACS operation id), so a
+retried send is recognised by ACS instead of delivering a second copy.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from shared_code import breaker
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+DEFAULT_LEASE_SECONDS = 120
+
+JOURNAL_MODES = ('wal', 'delete')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    operation_status TEXT,
+    message_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+_PUBLIC_FIELDS = (
+    'id', 'status', 'attempts', 'operation_status', 'message_id',
+    'last_error', 'created_at', 'updated_at',
+)
+
+
+def is_enabled():
+    """True when submissions should be queued instead of sent inline"""
+    return get_settings().outbox_enabled
+
+
+def default_path():
+    """Location of the outbox database; keep OUTBOX_DB_PATH on local disk (see journal_mode)"""
+    return get_settings().outbox_db_path or os.path.join(tempfile.gettempdir(), 'lawgate_outbox.sqlite3')
+
+
+def journal_mode():
+    """
+    SQLITE_JOURNAL_MODE for the outbox and submission log databases.
+
+    WAL needs shared memory that network filesystems don't provide, so it is
+    only safe on local disk. A database on a network share such as Azure
+    Files (``/home`` in Azure Functions) must use ``delete``.
+    """
+    mode = get_settings().sqlite_journal_mode
+    if mode not in JOURNAL_MODES:
+        logger.error(f'❌ Invalid SQLITE_JOURNAL_MODE={mode!r}, using wal')
+        return 'wal'
+    return mode
+
+
+@contextmanager
+def connect(path):
+    """Open the outbox database; the connection is closed on exit"""
+    # A connection per operation keeps this safe to call from the
+    # dispatcher's worker threads and from several processes at once.
+    import sqlite3
+
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def insert_message(conn, message, submission_id, now):
+    """Queue ``message`` on an open connection (lets callers enqueue inside their own transaction)"""
+    conn.execute(
+        'INSERT INTO outbox (id, payload, status, next_attempt_at, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (submission_id, json.dumps(message), PENDING, now, now, now),
+    )
+
+
+def has_backlog(path=None):
+    """True if the outbox database exists and has undelivered rows; never creates it"""
+    import sqlite3
+
+    path = path or default_path()
+    if not os.path.exists(path):
+        return False
+    with connect(path) as conn:
+        try:
+            row = conn.execute(
+                'SELECT 1 FROM outbox WHERE status IN (?, ?) LIMIT 1', (PENDING, SENDING),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Created by something else, or the schema isn't there yet
+            return False
+    return row is not None
+
+
+_outbox = None
+
+
+def get_outbox():
+    """Return the process-wide Outbox, reopening it if OUTBOX_DB_PATH changed"""
+    global _outbox
+    path = default_path()
+    if _outbox is None or _outbox.path != path:
+        _outbox = Outbox(path)
+    return _outbox
+
+
+class Outbox:
+    """SQLite-backed queue of prepared email messages"""
+
+    def __init__(self, path=None, clock=time.time):
+        self.path = path or default_path()
+        self.clock = clock
+        with self._connect() as conn:
+            conn.execute(f'PRAGMA journal_mode={journal_mode()}')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return connect(self.path)
+
+    def enqueue(self, message, submission_id=None):
+        """Store a prepared email message and return its submission id"""
+        submission_id = submission_id or str(uuid.uuid4())
+        now = self.clock()
+        with self._connect() as conn:
+            insert_message(conn, message, submission_id, now)
+        return submission_id
+
+    def get(self, submission_id):
+        """Return the delivery state of a submission, or None if unknown"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM outbox WHERE id = ?', (submission_id,)).fetchone()
+        if row is None:
+            return None
+        return {field: row[field] for field in _PUBLIC_FIELDS}
+
+    def claim(self, limit, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Lease up to ``limit`` due rows for delivery.
+
+        Rows stuck in ``sending`` past their lease (e.g. the worker was
+        recycled mid-poll) are picked up again and re-sent with the same
+        idempotency key.
+        """
+        now = self.clock()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT * FROM outbox '
+                    'WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?) '
+                    'ORDER BY next_attempt_at LIMIT ?',
+                    (PENDING, now, SENDING, now, limit),
+                ).fetchall()
+                conn.executemany(
+                    'UPDATE outbox SET status = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? '
+                    'WHERE id = ?',
+                    [(SENDING, now + lease_seconds, now, row['id']) for row in rows],
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return [
+            {
+                'id': row['id'],
+                'message': json.loads(row['payload']),
+                'attempts': row['attempts'] + 1,
+            }
+            for row in rows
+        ]
+
+    def _update(self, submission_id, **fields):
+        fields['updated_at'] = self.clock()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f'UPDATE outbox SET {assignments} WHERE id = ?',
+                (*fields.values(), submission_id),
+            )
+
+    def mark_sent(self, submission_id, message_id, operation_status):
+        self._update(
+            submission_id, status=SENT, message_id=message_id,
+            operation_status=operation_status, lease_until=None, last_error=None,
+        )
+
+    def mark_retry(self, submission_id, error, retry_at):
+        self._update(
+            submission_id, status=PENDING, next_attempt_at=retry_at,
+            lease_until=None, last_error=error,
+        )
+
+    def release(self, submission_id, retry_at, error):
+        """Put a claimed row back without using up an attempt (nothing was sent)"""
+        fields = {'status': PENDING, 'next_attempt_at': retry_at, 'lease_until': None,
+                  'last_error': error, 'updated_at': self.clock()}
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f'UPDATE outbox SET {assignments}, attempts = MAX(attempts - 1, 0) WHERE id = ?',
+                (*fields.values(), submission_id),
+            )
+
+    def mark_failed(self, submission_id, error):
+        self._update(submission_id, status=FAILED, lease_until=None, last_error=error)
+
+    def counts(self):
+        """Number of rows per status"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+
+def _batch_limit(circuits, batch_size):
+    """Rows the providers' breakers can take now: none while all are open, the probes while none is closed"""
+    if not circuits or any(circuit is None for circuit in circuits):
+        return batch_size
+    states = [(circuit, circuit.state) for circuit in circuits]
+    if any(state == breaker.CLOSED for _, state in states):
+        return batch_size
+    probes = sum(circuit.half_open_calls for circuit, state in states if state == breaker.HALF_OPEN)
+    return min(batch_size, probes)
+
+
+def dispatch(outbox, sender, batch_size=20, max_workers=4,
+             max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_seconds=DEFAULT_BACKOFF_SECONDS, circuits=()):
+    """
+    Drain due outbox rows with bounded concurrency through ``sender`` (a
+    transport.EmailSender).
+
+    ``circuits`` are the breakers of the configured providers: while every
+    one of them is open nothing is claimed, so queued messages don't use up
+    attempts against providers known to be down, and while none is closed
+    only as many rows as the half-open breakers take probes are claimed.
+    A send the sender's breakers refused puts its row back without counting
+    the attempt.
+
+    Returns a summary dict with the number of messages sent, rescheduled and
+    permanently failed during this run.
+    """
+    summary = {'sent': 0, 'retried': 0, 'failed': 0}
+    batch_size = _batch_limit(circuits, batch_size)
+    if not batch_size:
+        return summary
+    items = outbox.claim(batch_size)
+    if not items:
+        return summary
+
+    def run(item):
+        try:
+            result = sender.send(item['message'], item['id'])
+            outbox.mark_sent(item['id'], result.message_id, result.status)
+            logger.info(f'✅ Outbox message {item["id"]} sent via {result.provider}')
+            return 'sent'
+        except breaker.CircuitOpen as e:
+            # Refused before any request: try again once a breaker lets probes through
+            outbox.release(item['id'], outbox.clock() + e.retry_after, f'{type(e).__name__}: {e}')
+            return 'retried'
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            if item['attempts'] >= max_attempts:
+                logger.error(f'❌ Outbox message {item["id"]} failed after {item["attempts"]} attempts: {error}')
+                outbox.mark_failed(item['id'], error)
+                return 'failed'
+            # Exponential backoff between attempts
+            retry_at = outbox.clock() + backoff_seconds * (2 ** (item['attempts'] - 1))
+            logger.warning(f'Outbox message {item["id"]} attempt {item["attempts"]} failed: {error}')
+            outbox.mark_retry(item['id'], error, retry_at)
+            return 'retried'
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for outcome in pool.map(run, items):
+            summary[outcome] += 1
+    return summary
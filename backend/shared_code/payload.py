@@ -0,0 +1,152 @@
+"""
+Size-bounded, single-pass decoding of contact form request bodies.
+
+The body is checked against MAX_BODY_BYTES before anything is parsed, parsed
+exactly once (orjson when it is installed, the stdlib json module otherwise,
+both straight from bytes), and each field is checked against FIELD_LIMITS
+before a Submission is built. A multi-megabyte payload is therefore rejected
+by a length check instead of being decoded and parsed twice.
+
+Errors are ValueError subclasses carrying the status code to answer with, so
+callers that only catch ValueError still answer 400.
+"""
+
+import json
+from dataclasses import dataclass
+
+from shared_code.settings import get_settings
+
+# orjson takes ~10 ms to import, so it is only loaded by the first body that
+# needs parsing (never by preflights); None when it isn't installed
+orjson = None
+_orjson_loaded = False
+
+# Longest accepted value per field, in characters after stripping whitespace
+FIELD_LIMITS = {
+    'name': 200,
+    'email': 254,
+    'phone': 40,
+    'company': 200,
+    'subject': 300,
+    'message': 10000,
+    'recaptcha_token': 4096,
+}
+
+# Clients may send 'captcha', 'recaptchaToken' or 'g-recaptcha-response'
+TOKEN_KEYS = ('captcha', 'recaptchaToken', 'g-recaptcha-response')
+
+
+class PayloadError(ValueError):
+    """The body can't be turned into a Submission"""
+
+    status_code = 400
+
+
+class BodyTooLarge(PayloadError):
+    status_code = 413
+
+    def __init__(self, size, limit):
+        super().__init__(f'Body is {size} bytes, limit is {limit}')
+        self.size = size
+        self.limit = limit
+
+
+class FieldTooLong(PayloadError):
+    def __init__(self, field, length, limit):
+        super().__init__(f'{field} is {length} characters, limit is {limit}')
+        self.field = field
+        self.length = length
+        self.limit = limit
+
+
+@dataclass(slots=True)
+class Submission:
+    """One decoded contact form submission"""
+
+    name: str = None
+    email: str = None
+    phone: str = ''
+    company: str = ''
+    subject: str = ''
+    message: str = None
+    recaptcha_token: str = None
+    honeypot: str = ''  # the hidden ``website`` field
+    elapsed_ms: float = 0.0  # ``submissionTime``
+
+
+def _load_orjson():
+    global orjson, _orjson_loaded
+    try:
+        import orjson as module
+    except ImportError:  # optional: falls back to the stdlib parser
+        module = None
+    orjson, _orjson_loaded = module, True
+
+
+def loads(body):
+    """Parse JSON from bytes with orjson, or the stdlib parser when orjson isn't installed"""
+    if not _orjson_loaded:
+        _load_orjson()
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _text(values, key, field):
+    value = values.get(key)
+    if value is None:
+        return None
+    if type(value) is not str:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise PayloadError(f'{field} must be a string')
+        value = str(value)
+    value = value.strip()
+    if len(value) > FIELD_LIMITS[field]:
+        raise FieldTooLong(field, len(value), FIELD_LIMITS[field])
+    return value
+
+
+def _elapsed_ms(value):
+    if isinstance(value, bool):
+        return 0.0
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def decode(body, max_bytes=None, default_subject=''):
+    """
+    Decode a request body into a Submission.
+
+    Raises BodyTooLarge, FieldTooLong or PayloadError (all ValueErrors), or
+    the parser's ValueError for malformed JSON. An empty body decodes to an
+    empty Submission so the caller reports the missing fields.
+    """
+    body = body or b''
+    max_bytes = get_settings().max_body_bytes if max_bytes is None else max_bytes
+    if len(body) > max_bytes:
+        raise BodyTooLarge(len(body), max_bytes)
+
+    values = loads(body) if body and not body.isspace() else {}
+    if not isinstance(values, dict):
+        raise PayloadError('Body must be a JSON object')
+
+    token = None
+    for key in TOKEN_KEYS:
+        token = _text(values, key, 'recaptcha_token')
+        if token:
+            break
+
+    return Submission(
+        name=_text(values, 'name', 'name'),
+        email=_text(values, 'email', 'email'),
+        phone=_text(values, 'phone', 'phone') or '',
+        company=_text(values, 'company', 'company') or '',
+        subject=_text(values, 'subject', 'subject') or default_subject,
+        message=_text(values, 'message', 'message'),
+        recaptcha_token=token,
+        # Any value trips the honeypot; never reject it as too long, which would tell the bot
+        honeypot=str(values.get('website') or '')[:100],
+        elapsed_ms=_elapsed_ms(values.get('submissionTime')),
+    )
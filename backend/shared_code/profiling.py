@@ -0,0 +1,245 @@
+"""
+Opt-in profiling of individual function invocations.
+
+``@profiled('contact_form')`` on a function's ``main`` runs a sample of
+invocations under cProfile and/or tracemalloc:
+
+- PROFILE_SAMPLE_RATE: fraction of invocations to profile (default 0, off)
+- PROFILE_TOKEN: an invocation whose ``X-Lawgate-Profile`` header equals
+  this secret is always profiled, e.g.
+  ``curl -H "X-Lawgate-Profile: $PROFILE_TOKEN" ...``
+- PROFILE_MODE: ``cpu``, ``memory`` or ``cpu,memory`` (default)
+
+Each profiled invocation writes ``<function>/<time>-<id>.collapsed``, the
+cProfile call graph as collapsed stacks (one ``frame;frame;frame
+microseconds`` line per path, ready for flamegraph.pl or speedscope), and
+``<function>/<time>-<id>.allocations.txt``, the top PROFILE_TOP_ALLOCATIONS
+allocation sites by size. Files go to PROFILE_DIR (default: a
+``lawgate_profiles`` directory in the system temp dir), or to the blob
+container at PROFILE_BLOB_URL (a SAS URL; needs azure-storage-blob).
+
+cProfile records deterministic call counts, and the collapsed stacks are
+rebuilt from its caller/callee graph, splitting a function's time between
+its callers in proportion to the time spent under each one. One invocation
+per process is profiled at a time, because tracemalloc is process-wide;
+others that are picked meanwhile run normally.
+
+When nothing picks an invocation the wrapper costs two settings reads (and a
+header lookup once PROFILE_TOKEN is set); benchmarks/bench_profiling.py
+measures it.
+"""
+
+import functools
+import hmac
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Lawgate-Profile'
+MAX_STACK_DEPTH = 64
+
+metrics.REGISTRY.describe('profiles_written_total', 'Profiled invocations by function and trigger')
+metrics.REGISTRY.describe('profile_overhead_seconds', 'Extra time a profiled invocation spent profiling')
+
+# tracemalloc and the output files are process-wide
+_profiling = threading.Lock()
+
+
+def default_dir():
+    return get_settings().profile_dir or os.path.join(tempfile.gettempdir(), 'lawgate_profiles')
+
+
+class DirectorySink:
+    """Writes profile files under a local directory"""
+
+    def __init__(self, path=None):
+        self.path = path or default_dir()
+
+    def write(self, name, text):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+
+class BlobSink:
+    """Uploads profile files to a blob container (SAS URL)"""
+
+    def __init__(self, container_url):
+        from azure.storage.blob import ContainerClient
+
+        self.container = ContainerClient.from_container_url(container_url)
+
+    def write(self, name, text):
+        self.container.upload_blob(name, text.encode('utf-8'), overwrite=True)
+        return name
+
+
+_sink = (None, None)
+
+
+def get_sink():
+    """Return the sink for PROFILE_BLOB_URL, or PROFILE_DIR when no container is configured"""
+    global _sink
+    settings = get_settings()
+    key = (settings.profile_blob_url, default_dir())
+    current_key, sink = _sink
+    if current_key != key:
+        sink = None
+        if settings.profile_blob_url:
+            try:
+                sink = BlobSink(settings.profile_blob_url)
+            except ImportError:
+                logger.error('❌ PROFILE_BLOB_URL needs azure-storage-blob; writing profiles to PROFILE_DIR')
+        if sink is None:
+            sink = DirectorySink(key[1])
+        _sink = (key, sink)
+    return sink
+
+
+def _frame(function):
+    filename, line, name = function
+    if filename == '~':
+        return name  # built-ins, e.g. <method 'join' of 'str' objects>
+    # The parent directory tells the functions' __init__.py files apart
+    path = os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+    return f'{path}:{name}:{line}'
+
+
+def collapsed_stacks(stats):
+    """
+    Collapsed stacks (``{"a;b;c": microseconds}``) from pstats-style stats:
+    ``{function: (calls, primitive calls, own time, cumulative time, callers)}``.
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    roots = [function for function, entry in stats.items() if not entry[4]]
+    stacks = {}
+
+    def walk(function, path, share):
+        own_time, total_time = stats[function][2], stats[function][3]
+        path = path + (function,)
+        if own_time * share > 0:
+            key = ';'.join(_frame(frame) for frame in path)
+            stacks[key] = stacks.get(key, 0.0) + own_time * share * 1e6
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(function, ()):
+            callee_total = stats[callee][3]
+            if callee in path or not callee_total or not total_time:
+                continue  # recursion is already counted in the callee's own time
+            walk(callee, path, share * edge_time / callee_total)
+
+    for root in roots:
+        walk(root, (), 1.0)
+    return stacks
+
+
+def _cpu_report(profile):
+    import pstats
+
+    stats = pstats.Stats(profile).stats
+    stacks = collapsed_stacks(stats)
+    return ''.join(f'{stack} {round(micros)}\n' for stack, micros in sorted(stacks.items()) if micros >= 1)
+
+
+def _memory_report(snapshot, top):
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    statistics = snapshot.statistics('lineno')
+    lines = [f'{"KiB":>10} {"blocks":>8}  site']
+    for stat in statistics[:top]:
+        frame = stat.traceback[0]
+        lines.append(f'{stat.size / 1024:>10.1f} {stat.count:>8}  {frame.filename}:{frame.lineno}')
+    lines.append(f'{sum(stat.size for stat in statistics) / 1024:>10.1f} {"":>8}  total allocated and still live')
+    return '\n'.join(lines) + '\n'
+
+
+def _trigger(req, settings):
+    """Why this invocation is profiled ('header' or 'sampled'), or None"""
+    if settings.profile_token:
+        header = req.headers.get(PROFILE_HEADER)
+        if header and hmac.compare_digest(header.encode('utf-8'), settings.profile_token.encode('utf-8')):
+            return 'header'
+    if settings.profile_sample_rate and random.random() < settings.profile_sample_rate:
+        return 'sampled'
+    return None
+
+
+def _run_profiled(name, main, req, trigger, settings):
+    import cProfile
+    import tracemalloc
+
+    cpu = 'cpu' in settings.profile_mode
+    memory = 'memory' in settings.profile_mode
+    started = time.perf_counter()
+    profile = cProfile.Profile() if cpu else None
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    invoked = time.perf_counter()
+    try:
+        if profile is not None:
+            profile.enable()
+        try:
+            response = main(req)
+        finally:
+            if profile is not None:
+                profile.disable()
+        elapsed = time.perf_counter() - invoked
+        snapshot = tracemalloc.take_snapshot() if memory else None
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+    base = f'{name}/{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    try:
+        sink = get_sink()
+        if profile is not None:
+            sink.write(f'{base}.collapsed', _cpu_report(profile))
+        if snapshot is not None:
+            sink.write(f'{base}.allocations.txt', _memory_report(snapshot, settings.profile_top_allocations))
+    except Exception as e:
+        # Profiling must never fail the request
+        logger.error(f'❌ Could not write profile {base}: {str(e)}')
+    else:
+        logger.info(f'Profiled {name} ({trigger}, {elapsed * 1000:.1f} ms): {base}')
+        metrics.increment('profiles_written_total', function=name, trigger=trigger)
+    metrics.observe('profile_overhead_seconds', time.perf_counter() - started - elapsed, function=name)
+    return response
+
+
+def profiled(name):
+    """Decorate a function's ``main`` so sampled invocations are profiled"""
+    def decorate(main):
+        @functools.wraps(main)
+        def wrapper(req):
+            settings = get_settings()
+            if not (settings.profile_sample_rate or settings.profile_token):
+                return main(req)
+            trigger = _trigger(req, settings)
+            if trigger is None or not _profiling.acquire(blocking=False):
+                return main(req)
+            try:
+                return _run_profiled(name, main, req, trigger, settings)
+            finally:
+                _profiling.release()
+
+        return wrapper
+    return decorate
@@ -0,0 +1,214 @@
+"""
+Sliding-window rate limiting for the contact form functions.
+
+Uses the sliding window counter algorithm: each key keeps the count of the
+current fixed window and of the previous one, and the previous count is
+weighted by how much of it still overlaps the sliding window. That is O(1)
+time and memory per key and, unlike a fixed window that restarts on every
+hit, a steady trickle of submissions cannot slip past the limit.
+
+Two backends are available:
+
+- ``MemoryBackend`` (default): per-worker, LRU ordered with TTL eviction and
+  a hard cap on the number of tracked keys.
+- ``RedisBackend``: shared between instances through any Redis-protocol
+  server (Redis, Azure Cache for Redis, or a local stand-in).
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 3
+DEFAULT_WINDOW_SECONDS = 3600
+DEFAULT_MAX_KEYS = 10000  # matches the Settings defaults
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'remaining', 'retry_after'])
+
+
+def get_client_ip(req):
+    """First address in X-Forwarded-For, as set by the Functions front end"""
+    return req.headers.get('X-Forwarded-For', 'unknown').split(',')[0].strip()
+
+
+def _estimate(current, previous, window, elapsed):
+    """Weighted request count over the sliding window ending now"""
+    return previous * (window - elapsed) / window + current
+
+
+class MemoryBackend:
+    """In-process counters with LRU/TTL eviction and a hard key cap"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (window_start, current, previous)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit(self, key, limit, window, now):
+        window_start = now - (now % window)
+        with self._lock:
+            entry = self._entries.get(key)
+            current = previous = 0
+            if entry is not None:
+                start, count, prior = entry
+                if start == window_start:
+                    current, previous = count, prior
+                elif start == window_start - window:
+                    previous = count
+
+            allowed = _estimate(current, previous, window, now - window_start) < limit
+            if allowed:
+                current += 1
+            self._entries[key] = (window_start, current, previous)
+            self._entries.move_to_end(key)
+            self._evict(window_start - window)
+        return allowed, current, previous
+
+    def _evict(self, expired_before):
+        # Entries are in least-recently-used order, so anything that can no
+        # longer affect a decision sits at the front.
+        entries = self._entries
+        while entries:
+            start = next(iter(entries.values()))[0]
+            if start >= expired_before and len(entries) <= self.max_keys:
+                break
+            entries.popitem(last=False)
+
+
+_REDIS_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+if previous * (window - elapsed) / window + current >= limit then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+return {1, current, previous}
+"""
+
+
+class RedisBackend:
+    """Counters shared through a Redis-protocol server, updated atomically by a Lua script"""
+
+    def __init__(self, url=None, client=None, prefix='lawgate:ratelimit:'):
+        if client is None:
+            import redis  # only needed when RATE_LIMIT_BACKEND=redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_SCRIPT)
+
+    def hit(self, key, limit, window, now):
+        window_index = int(now // window)
+        keys = [
+            f'{self.prefix}{key}:{window_index}',
+            f'{self.prefix}{key}:{window_index - 1}',
+        ]
+        allowed, current, previous = self._script(keys=keys, args=[limit, window, now % window])
+        return bool(allowed), int(current), int(previous)
+
+
+class UnavailableBackend:
+    """Stands in for a backend that couldn't be created (e.g. a bad Redis URL): every hit is allowed"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def hit(self, key, limit, window, now):
+        return True, 0, 0
+
+
+class RateLimiter:
+    """Allow ``limit`` hits per key in any sliding ``window_seconds`` span"""
+
+    def __init__(self, limit=DEFAULT_LIMIT, window_seconds=DEFAULT_WINDOW_SECONDS, backend=None, clock=time.time):
+        self.limit = limit
+        self.window = window_seconds
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.clock = clock
+
+    def hit(self, key):
+        """Record an attempt for ``key`` and report whether it is allowed"""
+        now = self.clock()
+        try:
+            allowed, current, previous = self.backend.hit(key, self.limit, self.window, now)
+        except Exception as e:
+            # A shared backend outage must not take the contact form down
+            logger.error(f'Rate limit backend error, allowing request: {str(e)}')
+            return RateLimitResult(True, self.limit, 0)
+
+        elapsed = now % self.window
+        remaining = max(0, math.floor(self.limit - _estimate(current, previous, self.window, elapsed)))
+        if allowed:
+            return RateLimitResult(True, remaining, 0)
+        return RateLimitResult(False, 0, self._retry_after(current, previous, elapsed))
+
+    def _retry_after(self, current, previous, elapsed):
+        """Seconds until the weighted count drops below the limit"""
+        until_next_window = self.window - elapsed
+        if current >= self.limit or previous == 0:
+            return math.ceil(until_next_window)
+        # Solve previous * (window - elapsed - t) / window + current < limit for t
+        wait = until_next_window - (self.limit - current) * self.window / previous
+        return max(1, math.ceil(wait))
+
+
+_limiter = (None, None)
+_limiter_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.rate_limit_max,
+        settings.rate_limit_window_seconds,
+        settings.rate_limit_max_keys,
+        settings.rate_limit_backend,
+        settings.rate_limit_redis_url,
+    )
+
+
+def get_rate_limiter():
+    """Return the process-wide RateLimiter, rebuilt when its configuration changes"""
+    global _limiter
+    key = _config()
+    current_key, limiter = _limiter
+    if limiter is not None and current_key == key:
+        return limiter
+
+    with _limiter_lock:
+        current_key, limiter = _limiter
+        if limiter is None or current_key != key:
+            limit, window, max_keys, backend_name, redis_url = key
+            try:
+                backend = RedisBackend(redis_url) if backend_name == 'redis' else MemoryBackend(max_keys)
+            except Exception as e:
+                # Fail open, as hit() does when the backend errors
+                logger.error(f'❌ Rate limit backend {backend_name} unavailable, allowing every request: {str(e)}')
+                backend = UnavailableBackend(e)
+            limiter = RateLimiter(limit, window, backend)
+            _limiter = (key, limiter)
+        return limiter
+
+
+def _collect_stats():
+    _, limiter = _limiter
+    if limiter is None or not isinstance(limiter.backend, MemoryBackend):
+        return {}
+    return {('rate_limit_tracked_keys', ()): len(limiter.backend)}
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,273 @@
+"""
+reCAPTCHA verification with a result cache and a latency budget.
+
+Google rejects a token the second time it is verified, so a frontend retry
+after a downstream email failure used to cost a network round trip and then
+fail anyway. Verdicts are cached for a short TTL keyed by a hash of the
+token, which lets the retry through without calling Google again and turns
+replays of a rejected token into a local lookup.
+
+Each verification is bounded by one overall deadline of RECAPTCHA_BUDGET_MS,
+connect and response included. For v3 keys the score, action and hostname are
+checked locally against RECAPTCHA_MIN_SCORE, RECAPTCHA_EXPECTED_ACTION and
+RECAPTCHA_EXPECTED_HOSTNAME when those are set.
+
+Calls go through the ``recaptcha`` circuit breaker (shared_code.breaker):
+while it is open no request is made and the result carries the
+``circuit-open`` error code. A request that fails or misses the deadline
+carries ``request-failed`` or ``budget-exceeded``. None of these is a
+verdict on the token, so callers handle all three (``NO_VERDICT``)
+according to RECAPTCHA_BREAKER_POLICY.
+
+verify_async() is the aiohttp-based equivalent for contact_form_async; both
+share the cache, the budget, the breaker and the local checks.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from shared_code import breaker, metrics
+from shared_code.clients import get_async_http_session, get_http_session
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+SITEVERIFY_URL = 'https://www.google.com/recaptcha/api/siteverify'
+
+# error_codes entries of a verification that got no verdict from Google:
+# refused by the open circuit breaker, failed, or over RECAPTCHA_BUDGET_MS
+CIRCUIT_OPEN = 'circuit-open'
+REQUEST_FAILED = 'request-failed'
+BUDGET_EXCEEDED = 'budget-exceeded'
+NO_VERDICT = (CIRCUIT_OPEN, REQUEST_FAILED, BUDGET_EXCEEDED)
+
+# Defaults match Settings; tokens are only valid for two minutes anyway
+DEFAULT_CACHE_TTL_SECONDS = 120
+DEFAULT_CACHE_MAX_ENTRIES = 1024
+DEFAULT_BUDGET_MS = 1500
+# Sync siteverify calls in flight at once; a call past its deadline keeps its
+# thread until the socket timeouts (the budget again) end it
+MAX_PENDING_CALLS = 16
+
+VerificationResult = namedtuple(
+    'VerificationResult',
+    ['passed', 'success', 'score', 'action', 'hostname', 'error_codes', 'cached'],
+)
+
+
+class RecaptchaVerifier:
+    """Verifies tokens against Google siteverify, caching verdicts by token hash"""
+
+    def __init__(self, cache_ttl=DEFAULT_CACHE_TTL_SECONDS, cache_max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                 budget_ms=DEFAULT_BUDGET_MS, min_score=None, expected_action=None,
+                 expected_hostname=None, session_factory=get_http_session,
+                 async_session_factory=get_async_http_session, clock=time.monotonic):
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self.budget = budget_ms / 1000
+        self.min_score = min_score
+        self.expected_action = expected_action
+        self.expected_hostname = expected_hostname
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.clock = clock
+        self._cache = OrderedDict()  # token hash -> (expires_at, VerificationResult)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MAX_PENDING_CALLS, thread_name_prefix='siteverify')
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0, 'timeouts': 0, 'circuit_open': 0}
+
+    def close(self):
+        """Stop the siteverify threads once their calls finish"""
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _cache_key(token, secret_key):
+        return hashlib.sha256(f'{secret_key}\0{token}'.encode('utf-8')).digest()
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.stats['hits'] += 1
+                return entry[1]._replace(cached=True)
+            if entry is not None:
+                del self._cache[key]
+            self.stats['misses'] += 1
+            return None
+
+    def _store(self, key, result, now):
+        with self._lock:
+            self._cache[key] = (now + self.cache_ttl, result)
+            self._cache.move_to_end(key)
+            # Drop expired entries from the front, then enforce the size cap
+            while self._cache and (len(self._cache) > self.cache_max_entries
+                                   or next(iter(self._cache.values()))[0] <= now):
+                self._cache.popitem(last=False)
+
+    def _evaluate(self, payload):
+        """Apply the local v3 thresholds to a siteverify response"""
+        success = bool(payload.get('success', False))
+        score = payload.get('score')
+        action = payload.get('action')
+        hostname = payload.get('hostname')
+        passed = success
+        if passed and self.min_score is not None and score is not None:
+            passed = score >= self.min_score
+        if passed and self.expected_action and action is not None:
+            passed = action == self.expected_action
+        if passed and self.expected_hostname and hostname is not None:
+            passed = hostname == self.expected_hostname
+        return VerificationResult(
+            passed, success, score, action, hostname,
+            tuple(payload.get('error-codes', ())), False,
+        )
+
+    def verify(self, token, secret_key):
+        """Return a VerificationResult for ``token``; never raises"""
+        key = self._cache_key(token, secret_key)
+        now = self.clock()
+        cached = self._lookup(key, now)
+        if cached is not None:
+            return cached
+
+        circuit = breaker.get_breaker(breaker.RECAPTCHA)
+        if circuit is not None and not circuit.allow():
+            return self._circuit_open()
+        started = time.perf_counter()
+        try:
+            # requests applies a timeout per connect and per read, so the
+            # deadline is held by waiting on the call from here instead
+            future = self._executor.submit(self._post, self.session_factory(), token, secret_key)
+            payload = future.result(timeout=self.budget)
+        except FutureTimeout:
+            future.cancel()  # still queued behind other slow calls
+            return self._request_failed(None, circuit, started)
+        except Exception as e:
+            return self._request_failed(e, circuit, started)
+
+        if circuit is not None:
+            circuit.record(time.perf_counter() - started, ok=True)
+        result = self._evaluate(payload)
+        self._store(key, result, self.clock())
+        return result
+
+    def _post(self, session, token, secret_key):
+        response = session.post(
+            SITEVERIFY_URL,
+            data={'secret': secret_key, 'response': token},
+            timeout=(self.budget, self.budget),
+        )
+        return response.json()
+
+    async def _post_async(self, token, secret_key):
+        session = self.async_session_factory()
+        async with session.post(SITEVERIFY_URL, data={'secret': secret_key, 'response': token}) as response:
+            # Google answers text/plain on some errors; parse regardless
+            return await response.json(content_type=None)
+
+    async def verify_async(self, token, secret_key):
+        """Async verify(): same cache and budget, over the shared aiohttp session"""
+        key = self._cache_key(token, secret_key)
+        now = self.clock()
+        cached = self._lookup(key, now)
+        if cached is not None:
+            return cached
+
+        circuit = breaker.get_breaker(breaker.RECAPTCHA)
+        if circuit is not None and not circuit.allow():
+            return self._circuit_open()
+        started = time.perf_counter()
+        try:
+            payload = await asyncio.wait_for(self._post_async(token, secret_key), self.budget)
+        except asyncio.TimeoutError:
+            return self._request_failed(None, circuit, started)
+        except Exception as e:
+            return self._request_failed(e, circuit, started)
+
+        if circuit is not None:
+            circuit.record(time.perf_counter() - started, ok=True)
+        result = self._evaluate(payload)
+        self._store(key, result, self.clock())
+        return result
+
+    def _request_failed(self, error, circuit=None, started=None):
+        """Result for a call with no verdict; ``error`` is None when the deadline passed"""
+        # Not cached: this is not a verdict on the token
+        if circuit is not None:
+            circuit.record(time.perf_counter() - started, ok=False)
+        with self._lock:
+            self.stats['errors' if error is not None else 'timeouts'] += 1
+        if error is None:
+            logger.error(f'reCAPTCHA verification exceeded its {self.budget}s budget')
+            code = BUDGET_EXCEEDED
+        else:
+            logger.error(f'reCAPTCHA verification error: {str(error) or type(error).__name__}')
+            code = REQUEST_FAILED
+        return VerificationResult(False, False, None, None, None, (code,), False)
+
+    def _circuit_open(self):
+        with self._lock:
+            self.stats['circuit_open'] += 1
+        return VerificationResult(False, False, None, None, None, (CIRCUIT_OPEN,), False)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._cache))
+
+
+_verifier = (None, None)
+_verifier_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.recaptcha_cache_ttl_seconds,
+        settings.recaptcha_cache_max_entries,
+        settings.recaptcha_budget_ms,
+        settings.recaptcha_min_score,
+        settings.recaptcha_expected_action,
+        settings.recaptcha_expected_hostname,
+    )
+
+
+def get_verifier():
+    """Return the process-wide RecaptchaVerifier, rebuilt when its configuration changes"""
+    global _verifier
+    key = _config()
+    current_key, verifier = _verifier
+    if verifier is not None and current_key == key:
+        return verifier
+
+    with _verifier_lock:
+        current_key, verifier = _verifier
+        if verifier is None or current_key != key:
+            previous, verifier = verifier, RecaptchaVerifier(*key)
+            _verifier = (key, verifier)
+            if previous is not None:
+                previous.close()
+        return verifier
+
+
+def verify_recaptcha(token, secret_key):
+    """Verify reCAPTCHA token with Google"""
+    return get_verifier().verify(token, secret_key).passed
+
+
+def _collect_stats():
+    _, verifier = _verifier
+    if verifier is None:
+        return {}
+    return {
+        (f'recaptcha_cache_{name}', ()): value
+        for name, value in verifier.get_stats().items()
+    }
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,105 @@
+"""
+One structured log record per contact form request.
+
+Instead of a dozen INFO lines per invocation, the function collects fields on
+a RequestLog and emits a single record when it finishes. The record is only
+built when the logger is enabled for INFO and the outcome is sampled in, and
+the JSON is serialised lazily by the handler, so a disabled or sampled-out
+path costs a level check and a random draw.
+
+Configuration:
+
+- ``LOG_FORMAT``: ``json`` (default) or ``text`` (``key=value`` pairs)
+- ``LOG_SAMPLE_RATES``: per-outcome rates, e.g. ``sent=0.1,preflight=0``;
+  outcomes not listed are always logged
+- ``LOG_HEADERS``: ``true`` to include request headers, with credentials
+  and cookies redacted
+"""
+
+import json
+import logging
+import random
+import time
+
+from shared_code.settings import get_settings
+
+REDACTED = '[redacted]'
+SENSITIVE_HEADERS = frozenset({
+    'authorization',
+    'proxy-authorization',
+    'cookie',
+    'set-cookie',
+    'x-functions-key',
+    'x-api-key',
+    'x-ms-client-principal',
+    'x-ms-token-aad-access-token',
+    'x-ms-token-aad-id-token',
+    'x-lawgate-profile',
+})
+
+def redact_headers(headers):
+    """Copy of ``headers`` with credentials and cookies masked"""
+    return {
+        name: REDACTED if name.lower() in SENSITIVE_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+class _LazyRecord:
+    """Defers serialisation until a handler actually formats the record"""
+
+    __slots__ = ('fields', 'fmt')
+
+    def __init__(self, fields, fmt):
+        self.fields = fields
+        self.fmt = fmt
+
+    def __str__(self):
+        if self.fmt == 'text':
+            return ' '.join(f'{key}={value}' for key, value in self.fields.items())
+        return json.dumps(self.fields, default=str, separators=(',', ':'))
+
+
+class RequestLog:
+    """Accumulates fields for one invocation and emits them as a single record"""
+
+    __slots__ = ('logger', 'req', 'fields', 'outcome', 'started')
+
+    def __init__(self, logger, req):
+        self.logger = logger
+        self.req = req
+        self.fields = {}
+        self.outcome = 'unknown'
+        self.started = time.perf_counter()
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def elapsed(self):
+        """Seconds since the request started"""
+        return time.perf_counter() - self.started
+
+    def finish(self, status_code):
+        """Emit the record for this request if its level is enabled and it is sampled in"""
+        level = logging.WARNING if status_code >= 500 else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+        settings = get_settings()
+        rate = settings.log_sample_rates.get(self.outcome, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        record = {
+            'event': 'contact_form_request',
+            'outcome': self.outcome,
+            'status': status_code,
+            'method': self.req.method,
+            'duration_ms': round(self.elapsed() * 1000, 3),
+        }
+        record.update(self.fields)
+        if rate < 1.0:
+            record['sample_rate'] = rate
+        if settings.log_headers:
+            record['headers'] = redact_headers(self.req.headers)
+
+        self.logger.log(level, '%s', _LazyRecord(record, settings.log_format))
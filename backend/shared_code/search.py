@@ -0,0 +1,361 @@
+"""
+Full-text search over the articles, from an index built offline.
+
+build_search_index.py extracts the text of the articles in
+frontend/src/data/articles and of the article PDFs, and writes it with
+``write_index`` to one binary file (the bundled search_index.bin unless
+SEARCH_INDEX_PATH points elsewhere). The function memory-maps that file, so
+a query parses nothing and a cold worker only reads the header and the
+document list; the pages holding terms and postings are read on first use
+and shared between workers through the page cache.
+
+Layout, little-endian, each section aligned to 8 bytes:
+
+- header: magic, version, the doc id type code, document, term and
+  posting counts, the average document length, then (offset, length) of
+  each section below
+- term_offsets: uint32 per term + 1, into term_text
+- term_text: the sorted terms, UTF-8, back to back
+- posting_offsets: uint32 per term + 1, into the two posting arrays
+- posting_docs: document ids, uint16 when there are fewer than 65536
+  documents and uint32 otherwise, ascending within a term
+- posting_tfs: uint16 weighted term frequency, parallel to posting_docs
+- doc_lengths: uint32 weighted length per document
+- documents: JSON list of what a result shows (id, kind, title, url, date,
+  excerpt, tags)
+
+Fixed-width postings are bigger than variable-length ones but are read
+straight from the map through memoryview.cast, without a decode loop in
+Python; ``section_sizes`` gives the split for the index-size report.
+
+Text is case-folded, stripped of accents and split on non-word characters;
+stop words are dropped and plural endings trimmed (``claims`` and
+``claim``, ``parties`` and ``party`` are one term). Title words count
+TITLE_WEIGHT times and tags TAG_WEIGHT times towards a term's frequency.
+
+Queries are scored with BM25 (SEARCH_BM25_K1, SEARCH_BM25_B) summed over
+the query terms. The last query term also matches as a prefix, once it has
+SEARCH_MIN_PREFIX characters, so ``arbitr`` finds arbitration and
+arbitrator as the visitor types; a prefix expands to at most
+SEARCH_MAX_PREFIX_TERMS terms, the most frequent first, which are scored
+together as one term so a prefix doesn't outweigh the words before it.
+SEARCH_MAX_RESULTS caps the results per query and SEARCH_MAX_QUERY_LENGTH
+the characters in one.
+"""
+
+import heapq
+import json
+import logging
+import math
+import mmap
+import operator
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, namedtuple
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), 'search_index.bin')
+
+MAGIC = b'LGSI'
+VERSION = 1
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+MAX_TERM_LENGTH = 40
+MAX_QUERY_TERMS = 8
+
+SECTIONS = ('term_offsets', 'term_text', 'posting_offsets', 'posting_docs', 'posting_tfs', 'doc_lengths', 'documents')
+
+# magic, version, doc id type code, pad, documents, terms, postings, average length
+_HEADER = struct.Struct('<4sHcxIIIf')
+_SECTION_TABLE = struct.Struct(f'<{2 * len(SECTIONS)}I')
+
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'for', 'from', 'has', 'have', 'in', 'into',
+    'is', 'it', 'its', 'of', 'on', 'or', 'so', 'such', 'that', 'the', 'their', 'then', 'there', 'these', 'they',
+    'this', 'to', 'was', 'were', 'which', 'will', 'with',
+))
+
+_MARKS = re.compile('[\u0300-\u036f]')
+_WORD = re.compile(r'[^\W_]+')
+
+# What build_search_index.py collects per article or PDF; body is indexed, not stored
+Document = namedtuple('Document', ['id', 'kind', 'title', 'url', 'date', 'excerpt', 'tags', 'body'])
+
+Hit = namedtuple('Hit', ['score', 'document'])
+
+metrics.REGISTRY.describe('search_queries_total', 'Search queries by result (hits, empty, rejected)')
+metrics.REGISTRY.describe('search_query_seconds', 'Time to score a search query')
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Index terms of ``text`` in order, the same for documents and queries"""
+    text = _MARKS.sub('', unicodedata.normalize('NFKD', text.casefold()))
+    return [_stem(word) for word in _WORD.findall(text)
+            if word not in STOP_WORDS and len(word) <= MAX_TERM_LENGTH]
+
+
+def _pad(blob):
+    return blob + b'\0' * (-len(blob) % 8)
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_index(documents, path):
+    """Build the index for ``documents`` (Document tuples) and write it to ``path``; returns the section sizes"""
+    postings = {}  # term -> {doc id: weighted frequency}
+    lengths = array('I')
+    stored = []
+    for doc_id, document in enumerate(documents):
+        frequencies = Counter(tokenize(document.body))
+        for term in tokenize(document.title):
+            frequencies[term] += TITLE_WEIGHT
+        for term in tokenize(' '.join(document.tags)):
+            frequencies[term] += TAG_WEIGHT
+        for term, frequency in frequencies.items():
+            postings.setdefault(term, {})[doc_id] = min(frequency, 0xFFFF)
+        lengths.append(sum(frequencies.values()))
+        stored.append({field: getattr(document, field) for field in Document._fields if field != 'body'})
+
+    doc_code = 'H' if len(stored) <= 0xFFFF else 'I'
+    terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+    term_offsets, posting_offsets = array('I', [0]), array('I', [0])
+    posting_docs, posting_tfs = array(doc_code), array('H')
+    term_text = bytearray()
+    for term in terms:
+        term_text += term.encode('utf-8')
+        term_offsets.append(len(term_text))
+        for doc_id, frequency in sorted(postings[term].items()):
+            posting_docs.append(doc_id)
+            posting_tfs.append(frequency)
+        posting_offsets.append(len(posting_docs))
+
+    blobs = [
+        _little_endian(term_offsets), bytes(term_text), _little_endian(posting_offsets),
+        _little_endian(posting_docs), _little_endian(posting_tfs), _little_endian(lengths),
+        json.dumps(stored, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+    ]
+    average = sum(lengths) / len(lengths) if lengths else 0.0
+    header_size = _HEADER.size + _SECTION_TABLE.size
+    table, offset = [], header_size + (-header_size % 8)
+    for blob in blobs:
+        table += [offset, len(blob)]
+        offset += len(_pad(blob))
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(_pad(_HEADER.pack(MAGIC, VERSION, doc_code.encode('ascii'), len(stored), len(terms),
+                                  len(posting_docs), average) + _SECTION_TABLE.pack(*table)))
+        for blob in blobs:
+            f.write(_pad(blob))
+    os.replace(temporary, path)
+    return {name: length for name, length in zip(SECTIONS, table[1::2])}
+
+
+class SearchIndex:
+    """A memory-mapped index file; thread-safe, as nothing is written after open"""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        self._views = [view]
+        magic, version, doc_code, self.doc_count, self.term_count, self.posting_count, self.average_length = \
+            _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} search index')
+        table = _SECTION_TABLE.unpack_from(view, _HEADER.size)
+        self.sections = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+
+        def section(name, code=None):
+            offset, length = self.sections[name]
+            data = view[offset:offset + length]
+            self._views.append(data)
+            if code is None:
+                return data
+            if sys.byteorder == 'big':
+                values = array(code, data.tobytes())
+                values.byteswap()
+                return values
+            self._views.append(data.cast(code))
+            return self._views[-1]
+
+        self._term_offsets = section('term_offsets', 'I')
+        self._term_text = section('term_text')
+        self._posting_offsets = section('posting_offsets', 'I')
+        self._posting_docs = section('posting_docs', doc_code.decode('ascii'))
+        self._posting_tfs = section('posting_tfs', 'H')
+        self.documents = json.loads(bytes(section('documents')))
+
+        # BM25 length normalisation, once per document instead of per posting
+        average = self.average_length or 1.0
+        self._norms = [k1 * (1 - b + b * length / average) for length in section('doc_lengths', 'I')]
+
+    def _term(self, index):
+        return bytes(self._term_text[self._term_offsets[index]:self._term_offsets[index + 1]])
+
+    def _bisect(self, key):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, term):
+        """Term index of ``term``, or None"""
+        key = term.encode('utf-8')
+        index = self._bisect(key)
+        return index if index < self.term_count and self._term(index) == key else None
+
+    def expand(self, prefix, limit):
+        """Term indexes starting with ``prefix``, at most ``limit`` of them, most frequent first"""
+        key = prefix.encode('utf-8')
+        # No UTF-8 sequence contains 0xff, so this sorts after every term starting with the prefix
+        start, end = self._bisect(key), self._bisect(key + b'\xff')
+        matches = range(start, end)
+        if len(matches) > limit:
+            matches = heapq.nlargest(limit, matches, key=self.document_frequency)
+        return list(matches)
+
+    def terms(self):
+        """Every term, in index order"""
+        return [self._term(index).decode('utf-8') for index in range(self.term_count)]
+
+    def document_frequency(self, index):
+        """Number of documents containing term ``index``"""
+        return self._posting_offsets[index + 1] - self._posting_offsets[index]
+
+    def _postings(self, index):
+        start, end = self._posting_offsets[index], self._posting_offsets[index + 1]
+        return zip(self._posting_docs[start:end].tolist(), self._posting_tfs[start:end].tolist())
+
+    def _add(self, matched, scores):
+        """
+        Add the BM25 scores of one query word to ``scores`` (doc id -> score).
+        The terms a prefix expands to count as one term, as synonyms do:
+        their frequencies are summed per document and the idf is that of
+        the documents containing any of them.
+        """
+        if len(matched) == 1:
+            frequencies = self._postings(matched[0])
+            count = self.document_frequency(matched[0])
+        else:
+            merged = {}
+            for index in matched:
+                for doc_id, tf in self._postings(index):
+                    merged[doc_id] = merged.get(doc_id, 0) + tf
+            frequencies, count = merged.items(), len(merged)
+        k1, norms, get = self.k1, self._norms, scores.get
+        idf = math.log(1 + (self.doc_count - count + 0.5) / (count + 0.5))
+        for doc_id, tf in frequencies:
+            scores[doc_id] = get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norms[doc_id])
+
+    def search(self, query, limit=10, prefix=True, min_prefix=2, max_prefix_terms=20):
+        """The best ``limit`` Hits for ``query``, highest score first"""
+        words = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        scores = {}
+        for position, word in enumerate(words):
+            if prefix and position == len(words) - 1 and len(word) >= min_prefix:
+                matched = self.expand(word, max_prefix_terms)
+            else:
+                index = self.lookup(word)
+                matched = [] if index is None else [index]
+            if matched:
+                self._add(matched, scores)
+
+        best = heapq.nlargest(limit, scores.items(), key=operator.itemgetter(1))
+        return [Hit(score, self.documents[doc_id]) for doc_id, score in best]
+
+    def section_sizes(self):
+        return {name: length for name, (_, length) in self.sections.items()}
+
+    def size(self):
+        return len(self._map)
+
+    def close(self):
+        # Views over the map must be released, newest first, before it can close
+        for view in reversed(self._views):
+            view.release()
+        self._map.close()
+
+
+class Searcher:
+    """Queries against the configured index, with the settings' limits and metrics"""
+
+    def __init__(self, index, max_results=10, min_prefix=2, max_prefix_terms=20):
+        self.index = index
+        self.max_results = max_results
+        self.min_prefix = min_prefix
+        self.max_prefix_terms = max_prefix_terms
+
+    def search(self, query, limit=None, prefix=True):
+        limit = min(limit or self.max_results, self.max_results)
+        started = time.perf_counter()
+        hits = self.index.search(query, limit, prefix, self.min_prefix, self.max_prefix_terms)
+        metrics.observe('search_query_seconds', time.perf_counter() - started)
+        metrics.increment('search_queries_total', result='hits' if hits else 'empty')
+        return hits
+
+
+_searcher = (None, None)
+_searcher_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (settings.search_index_path or DEFAULT_INDEX_PATH, settings.search_bm25_k1, settings.search_bm25_b,
+            settings.search_max_results, settings.search_min_prefix, settings.search_max_prefix_terms)
+
+
+def get_searcher():
+    """Return the process-wide Searcher, or None when the index can't be opened"""
+    global _searcher
+    key = _config()
+    current_key, searcher = _searcher
+    if current_key == key:
+        return searcher
+
+    with _searcher_lock:
+        current_key, searcher = _searcher
+        if current_key != key:
+            previous = searcher
+            path, k1, b, max_results, min_prefix, max_prefix_terms = key
+            try:
+                searcher = Searcher(SearchIndex(path, k1, b), max_results, min_prefix, max_prefix_terms)
+                logger.info(f'✅ Search index loaded: {path} ({searcher.index.doc_count} documents, '
+                            f'{searcher.index.term_count} terms)')
+            except (OSError, ValueError, struct.error) as e:
+                logger.error(f'❌ Search index unavailable ({path}): {str(e)}')
+                searcher = None
+            _searcher = (key, searcher)
+            if previous is not None:
+                # Unmap the replaced index instead of leaving it to the garbage collector
+                previous.index.close()
+        return searcher
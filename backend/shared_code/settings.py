@@ -0,0 +1,248 @@
+"""
+Immutable configuration snapshot for the Function app.
+
+App settings only change when the host restarts the worker, so the
+environment (and ``.env`` for local runs) is read once, on the first request
+that needs configuration, and parsed into a frozen Settings object.
+python-dotenv is only imported when a ``.env`` file is actually present.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECIPIENTS = 'shishir@lawgate.in,ddhuvgupta@gmail.com'
+
+# load_dotenv() looks in the working directory, which is the app root both
+# under `func start` and when running scripts from backend/.
+DOTENV_PATH = os.path.join(os.getcwd(), '.env')
+
+
+def _flag(value):
+    return str(value).lower() in ['1', 'true', 'yes']
+
+
+def _optional_float(value):
+    return float(value) if value else None
+
+
+def _recipients(value):
+    return tuple(email.strip() for email in value.split(',') if email.strip())
+
+
+def _names(value):
+    return tuple(name.strip().lower() for name in value.split(',') if name.strip())
+
+
+def _float_map(value):
+    values = {}
+    for item in value.split(','):
+        name, _, number = item.partition('=')
+        if name.strip() and number.strip():
+            values[name.strip()] = float(number)
+    return MappingProxyType(values)
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Secrets are excluded from repr so a logged Settings can't leak them
+    # Email delivery
+    azure_connection_string: str = field(default=None, repr=False)
+    sender_email: str = 'DoNotReply@lawgate.in'
+    recipients: tuple = _recipients(DEFAULT_RECIPIENTS)
+    sendgrid_api_key: str = field(default=None, repr=False)
+    sendgrid_sender_email: str = 'noreply@lawgate.in'
+    email_providers: tuple = ('acs', 'sendgrid')
+    email_send_timeout_ms: int = 5000
+    email_poll_timeout_seconds: int = 30
+    email_hedge_delay_ms: int = 0
+
+    # reCAPTCHA
+    recaptcha_secret: str = field(default=None, repr=False)
+    skip_recaptcha: bool = False
+    recaptcha_cache_ttl_seconds: int = 120
+    recaptcha_cache_max_entries: int = 1024
+    recaptcha_budget_ms: int = 1500
+    recaptcha_min_score: float = None
+    recaptcha_expected_action: str = None
+    recaptcha_expected_hostname: str = None
+
+    # Outbound HTTP connection pool
+    http_pool_connections: int = 4
+    http_pool_maxsize: int = 16
+
+    # Outbox
+    delivery_mode: str = 'sync'
+    outbox_db_path: str = None
+    outbox_batch_size: int = 20
+    outbox_max_workers: int = 4
+    outbox_max_attempts: int = 5
+    sqlite_journal_mode: str = 'wal'
+
+    # Digest mode (delivery_mode == 'digest')
+    digest_interval_seconds: int = 300
+    digest_max_submissions: int = 20
+    digest_priority_rules: str = ''
+
+    # Rate limiting
+    rate_limit_max: int = 3
+    rate_limit_window_seconds: int = 3600
+    rate_limit_max_keys: int = 10000
+    rate_limit_backend: str = 'memory'
+    rate_limit_redis_url: str = field(default='redis://localhost:6379/0', repr=False)
+
+    # Duplicate submissions
+    dedup_ttl_seconds: int = 300
+    dedup_max_entries: int = 10000
+    dedup_backend: str = 'memory'
+    dedup_redis_url: str = field(default=None, repr=False)
+    dedup_wait_seconds: float = 0.0
+
+    # Request decoding
+    max_body_bytes: int = 32768
+
+    # Email address validation
+    email_domain_check: bool = False
+    email_resolver: str = 'auto'
+    email_dns_timeout_ms: int = 1000
+    email_dns_servers: tuple = ()
+    email_domain_cache_ttl_seconds: int = 3600
+    email_domain_negative_ttl_seconds: int = 300
+    email_domain_cache_max_entries: int = 4096
+
+    # Spam pre-filter
+    spam_filter: bool = True
+    spam_rules_path: str = None
+    spam_reload_seconds: float = 5.0
+
+    # Submission log
+    submission_log: bool = False
+    submission_log_path: str = None
+    submission_log_retention_days: float = 30.0
+    submission_log_flush_ms: int = 50
+    submission_log_batch_size: int = 200
+
+    # Circuit breakers (siteverify, ACS, SendGrid)
+    circuit_breakers: bool = True
+    breaker_error_rate: float = 0.5
+    breaker_slow_rate: float = 0.8
+    breaker_slow_call_ms: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    breaker_min_calls: int = 10
+    breaker_window_seconds: float = 30.0
+    breaker_open_seconds: float = 30.0
+    breaker_half_open_calls: int = 1
+    recaptcha_breaker_policy: str = 'fail_closed'
+    email_breaker_policy: str = 'queue'
+
+    # Admission control (concurrent sends per worker)
+    admission_control: bool = True
+    admission_max_concurrent: int = 8
+    admission_max_concurrent_async: int = 128
+    admission_max_queue: int = 16
+    admission_queue_timeout_ms: int = 2000
+
+    # Profiling (sampled or on request)
+    profile_sample_rate: float = 0.0
+    profile_token: str = field(default=None, repr=False)
+    profile_mode: tuple = ('cpu', 'memory')
+    profile_dir: str = None
+    profile_blob_url: str = field(default=None, repr=False)
+    profile_top_allocations: int = 25
+
+    # Article search
+    search_index_path: str = None
+    search_bm25_k1: float = 1.2
+    search_bm25_b: float = 0.75
+    search_max_results: int = 10
+    search_min_prefix: int = 2
+    search_max_prefix_terms: int = 20
+    search_max_query_length: int = 200
+
+    # Logging
+    log_format: str = 'json'
+    log_sample_rates: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    log_headers: bool = False
+
+    @property
+    def outbox_enabled(self):
+        return self.delivery_mode == 'outbox'
+
+    @property
+    def digest_enabled(self):
+        return self.delivery_mode == 'digest'
+
+    @classmethod
+    def from_environ(cls, environ):
+        """Parse settings from a mapping of environment variables"""
+        values = {}
+        for setting in fields(cls):
+            env_name, convert = _ENVIRONMENT.get(setting.name, (setting.name.upper(), None))
+            raw = environ.get(env_name)
+            if raw is None or raw == '':
+                continue
+            try:
+                values[setting.name] = convert(raw) if convert else setting.type(raw)
+            except (TypeError, ValueError) as e:
+                # One bad value must not fail every request; keep the default
+                logger.error(f'❌ Invalid {env_name}={raw!r}, using the default: {str(e)}')
+        return cls(**values)
+
+
+# Fields whose environment variable name or parsing differs from the default
+# (upper-cased field name, converted with the annotated type).
+_ENVIRONMENT = {
+    'azure_connection_string': ('AZURE_COMMUNICATION_CONNECTION_STRING', None),
+    'sender_email': ('AZURE_SENDER_EMAIL', None),
+    'recipients': ('LAWGATE_EMAIL', _recipients),
+    'email_providers': ('EMAIL_PROVIDERS', _names),
+    'recaptcha_secret': ('RECAPTCHA_SECRET_KEY', None),
+    'skip_recaptcha': ('SKIP_RECAPTCHA', _flag),
+    'recaptcha_min_score': ('RECAPTCHA_MIN_SCORE', _optional_float),
+    'delivery_mode': ('EMAIL_DELIVERY_MODE', str.lower),
+    'outbox_db_path': ('OUTBOX_DB_PATH', None),
+    'sqlite_journal_mode': ('SQLITE_JOURNAL_MODE', str.lower),
+    'rate_limit_backend': ('RATE_LIMIT_BACKEND', str.lower),
+    'dedup_backend': ('DEDUP_BACKEND', str.lower),
+    'email_domain_check': ('EMAIL_DOMAIN_CHECK', _flag),
+    'email_resolver': ('EMAIL_RESOLVER', str.lower),
+    'email_dns_servers': ('EMAIL_DNS_SERVERS', _names),
+    'spam_filter': ('SPAM_FILTER', _flag),
+    'submission_log': ('SUBMISSION_LOG', _flag),
+    'circuit_breakers': ('CIRCUIT_BREAKERS', _flag),
+    'breaker_slow_call_ms': ('BREAKER_SLOW_CALL_MS', _float_map),
+    'recaptcha_breaker_policy': ('RECAPTCHA_BREAKER_POLICY', str.lower),
+    'email_breaker_policy': ('EMAIL_BREAKER_POLICY', str.lower),
+    'admission_control': ('ADMISSION_CONTROL', _flag),
+    'profile_mode': ('PROFILE_MODE', _names),
+    'log_format': ('LOG_FORMAT', str.lower),
+    'log_sample_rates': ('LOG_SAMPLE_RATES', _float_map),
+    'log_headers': ('LOG_HEADERS', _flag),
+}
+
+_settings = None
+_lock = threading.Lock()
+
+
+def get_settings():
+    """Return the settings snapshot, loading ``.env`` and the environment on first use"""
+    global _settings
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                if os.path.exists(DOTENV_PATH):
+                    from dotenv import load_dotenv
+
+                    load_dotenv(DOTENV_PATH)
+                _settings = Settings.from_environ(os.environ)
+    return _settings
+
+
+def reload_settings():
+    """Discard the snapshot so the next get_settings() re-reads the environment"""
+    global _settings
+    with _lock:
+        _settings = None
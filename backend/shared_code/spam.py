@@ -0,0 +1,214 @@
+"""
+Local spam pre-filter, run before any network call.
+
+Each submission is scored against rules loaded from a JSON file (the bundled
+spam_rules.json unless SPAM_RULES_PATH points elsewhere):
+
+- honeypot: the hidden ``website`` field is filled in
+- too_fast: ``submissionTime`` is below ``min_submit_ms``
+- link: each link beyond ``max_links`` in the subject and message;
+  link_in_name for any link in the name
+- phrase: each distinct known spam phrase (whole words, any case)
+- patterns: named regular expressions with their own weights (BBCode and
+  HTML links, long character runs, crypto addresses); use ``(?i)`` for
+  case-insensitive ones
+- disposable_domain: the email domain, or a parent domain, is on the
+  disposable-address blocklist
+
+A submission is spam once its score reaches ``threshold``. Bot signals
+(honeypot, too_fast) are answered with a normal success response so the bot
+learns nothing; content rejections get a 400 a person can act on.
+
+All patterns are compiled once per load. The file is re-checked at most every
+SPAM_RELOAD_SECONDS and swapped in when its modification time changes; a file
+that fails to parse is logged and the previous rules stay in force.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from shared_code import metrics
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'spam_rules.json')
+DEFAULT_RELOAD_SECONDS = 5.0
+
+# Reasons answered with a fake success instead of an error
+SILENT_REASONS = frozenset(('honeypot', 'too_fast'))
+
+# Matched against lower-cased text
+_LINK = re.compile(r'https?://|\bwww\.')
+
+Verdict = namedtuple('Verdict', ['spam', 'silent', 'score', 'reasons'])
+
+metrics.REGISTRY.describe('spam_checks_total', 'Pre-filter verdicts by result')
+metrics.REGISTRY.describe('spam_reasons_total', 'Pre-filter rules that matched a rejected submission')
+
+
+def _trie_regex(node):
+    # Alternation factored by common prefix, so the regex engine rejects a
+    # position after one character instead of trying every phrase
+    if '' in node and len(node) == 1:
+        return ''
+    branches = [re.escape(char) + _trie_regex(child) for char, child in sorted(node.items()) if char]
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return f'(?:{pattern})?' if '' in node else pattern
+
+
+def _phrase_pattern(phrases):
+    """Compile phrases into one prefix-trie regex over lower-cased text"""
+    trie = {}
+    for phrase in {phrase.strip().lower() for phrase in phrases if phrase.strip()}:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    if not trie:
+        return None
+    # Word boundaries keep "casino" from matching inside "occasional"-like words
+    return re.compile(r'(?<!\w)' + _trie_regex(trie) + r'(?!\w)')
+
+
+class SpamRules:
+    """One compiled, immutable rule set"""
+
+    def __init__(self, spec):
+        self.threshold = float(spec.get('threshold', 1.0))
+        self.min_submit_ms = float(spec.get('min_submit_ms', 3000))
+        self.max_links = int(spec.get('max_links', 2))
+        self.weights = {name: float(weight) for name, weight in spec.get('weights', {}).items()}
+        self.patterns = tuple(
+            (pattern['name'], re.compile(pattern['regex']), float(pattern.get('weight', 1.0)))
+            for pattern in spec.get('patterns', ())
+        )
+        self.phrases = _phrase_pattern(spec.get('phrases', ()))
+        self.disposable_domains = frozenset(domain.strip().lower() for domain in spec.get('disposable_domains', ()))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def is_disposable(self, email):
+        """True if the domain of ``email`` or any parent domain is blocklisted"""
+        domain = email.rpartition('@')[2].strip().lower().rstrip('.')
+        while domain:
+            if domain in self.disposable_domains:
+                return True
+            _, _, domain = domain.partition('.')
+        return False
+
+    def score(self, submission):
+        """Return the Verdict for a payload.Submission"""
+        weights = self.weights
+        reasons = []
+        score = 0.0
+
+        def hit(reason, weight):
+            nonlocal score
+            reasons.append(reason)
+            score += weight
+
+        if submission.honeypot:
+            hit('honeypot', weights.get('honeypot', 1.0))
+        if submission.elapsed_ms and 0 < submission.elapsed_ms < self.min_submit_ms:
+            hit('too_fast', weights.get('too_fast', 1.0))
+
+        text = f'{submission.subject or ""}\n{submission.message or ""}'
+        lowered = text.lower()
+        if _LINK.search((submission.name or '').lower()):
+            hit('link_in_name', weights.get('link_in_name', 1.0))
+        links = len(_LINK.findall(lowered))
+        if links > self.max_links:
+            hit('link', weights.get('link', 0.25) * (links - self.max_links))
+
+        if self.phrases is not None:
+            phrases = set(self.phrases.findall(lowered))
+            if phrases:
+                hit('phrase', weights.get('phrase', 0.4) * len(phrases))
+
+        for pattern_name, pattern, weight in self.patterns:
+            if pattern.search(text):
+                hit(pattern_name, weight)
+
+        if submission.email and self.is_disposable(submission.email):
+            hit('disposable_domain', weights.get('disposable_domain', 0.5))
+
+        spam = score >= self.threshold
+        return Verdict(spam, spam and any(reason in SILENT_REASONS for reason in reasons),
+                       round(score, 3), tuple(reasons))
+
+
+class SpamFilter:
+    """Scores submissions with rules reloaded from ``path`` when the file changes"""
+
+    def __init__(self, path=DEFAULT_RULES_PATH, reload_seconds=DEFAULT_RELOAD_SECONDS, clock=time.monotonic):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns
+        self.rules = SpamRules.load(path)
+        self._checked_at = clock()
+        self.reloads = 0
+
+    def _maybe_reload(self):
+        now = self.clock()
+        if now - self._checked_at < self.reload_seconds or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            self.rules = SpamRules.load(self.path)
+            self.reloads += 1
+            logger.info(f'Reloaded spam rules from {self.path}')
+        except Exception as e:
+            logger.error(f'Keeping previous spam rules, could not load {self.path}: {str(e)}')
+        finally:
+            self._lock.release()
+
+    def check(self, submission):
+        """Return the Verdict for a payload.Submission"""
+        self._maybe_reload()
+        verdict = self.rules.score(submission)
+        metrics.increment('spam_checks_total', result='spam' if verdict.spam else 'ok')
+        if verdict.spam:
+            for reason in verdict.reasons:
+                metrics.increment('spam_reasons_total', reason=reason)
+        return verdict
+
+
+_filter = (None, None)
+_filter_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (settings.spam_filter, settings.spam_rules_path or DEFAULT_RULES_PATH, settings.spam_reload_seconds)
+
+
+def get_filter():
+    """Return the process-wide SpamFilter, or None when SPAM_FILTER is off"""
+    global _filter
+    key = _config()
+    current_key, spam_filter = _filter
+    if current_key == key:
+        return spam_filter
+
+    with _filter_lock:
+        current_key, spam_filter = _filter
+        if current_key != key:
+            enabled, path, reload_seconds = key
+            spam_filter = SpamFilter(path, reload_seconds) if enabled else None
+            _filter = (key, spam_filter)
+        return spam_filter
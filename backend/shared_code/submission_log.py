@@ -0,0 +1,323 @@
+"""
+Append-only log of contact submissions.
+
+A submission used to exist only inside the email: if the send failed the
+function answered 500 and the data was gone. Every submission that passes
+validation and reCAPTCHA is now appended to a SQLite database (WAL mode on
+local disk, see outbox.journal_mode) as a ``received`` entry (template values
+and subject), followed by one entry per outcome:
+
+- ``delivered``: sent inline (provider and message id)
+- ``handed_off``: queued on the outbox or buffered for a digest, which
+  deliver and retry it themselves
+- ``failed``: the inline send raised
+
+Rows are never updated, so the latest entry per submission is its state, and
+a ``received`` entry with no ``delivered``/``handed_off`` after it is
+undelivered. manage_submissions.py replays those through the email transport
+and exports ranges by time and email.
+
+Writes never block the request: append() queues the entry and a writer
+thread commits queued entries in one transaction per batch (group commit),
+at most SUBMISSION_LOG_FLUSH_MS after the first of them or as soon as
+SUBMISSION_LOG_BATCH_SIZE are waiting. With ``synchronous=NORMAL`` a WAL
+commit doesn't fsync either; the WAL is synced at checkpoints. A committed
+entry survives the worker process dying, a power loss can roll back commits
+since the last checkpoint, and entries still queued (at most one flush
+interval) are lost if the process is killed. flush() waits for everything
+queued so far and runs at interpreter exit.
+
+The log holds personal data, so it is off unless SUBMISSION_LOG is set, and
+submissions received more than SUBMISSION_LOG_RETENTION_DAYS ago are purged
+(all of their entries) by the writer thread at most once per PURGE_INTERVAL
+seconds; 0 keeps them forever. ``manage_submissions.py purge`` does the same
+on demand.
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+from shared_code import metrics
+from shared_code.outbox import connect, journal_mode
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+RECEIVED = 'received'
+DELIVERED = 'delivered'
+HANDED_OFF = 'handed_off'
+FAILED = 'failed'
+
+DEFAULT_FLUSH_MS = 50
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_PENDING = 10000
+PURGE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    submission_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    email TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_time ON entries (created_at);
+CREATE INDEX IF NOT EXISTS idx_entries_email ON entries (email, created_at);
+CREATE INDEX IF NOT EXISTS idx_entries_submission ON entries (submission_id, seq);
+"""
+
+# Each received entry with its latest later entry (NULL while none exists)
+_WITH_STATUS = """
+SELECT r.submission_id, r.created_at, r.email, r.data,
+       (SELECT s.kind FROM entries s
+        WHERE s.submission_id = r.submission_id AND s.seq > r.seq
+        ORDER BY s.seq DESC LIMIT 1) AS status
+FROM entries r
+WHERE r.kind = 'received' AND r.created_at >= ? AND r.created_at < ?
+"""
+
+
+def default_path():
+    """Location of the log database; the temp dir default is per-instance and not kept across restarts"""
+    return get_settings().submission_log_path or os.path.join(tempfile.gettempdir(), 'lawgate_submissions.sqlite3')
+
+
+class SubmissionLog:
+    """Append-only entries in SQLite, written in batches by a background thread"""
+
+    def __init__(self, path=None, flush_interval_ms=DEFAULT_FLUSH_MS, batch_size=DEFAULT_BATCH_SIZE,
+                 max_pending=DEFAULT_MAX_PENDING, retention_days=0):
+        self.path = path or default_path()
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retention = retention_days * 86400
+        self._purged_at = 0.0
+        self._pending = deque()
+        self._changed = threading.Condition()
+        self._queued = 0  # entries ever queued
+        self._done = 0  # entries committed or dropped
+        self._closed = False
+        self._flushing = False
+        self._writer = None
+        self.stats = {'appended': 0, 'committed': 0, 'batches': 0, 'dropped': 0, 'errors': 0, 'purged': 0}
+        with connect(self.path) as conn:
+            conn.execute(f'PRAGMA journal_mode={journal_mode()}')
+            conn.executescript(_SCHEMA)
+
+    def append(self, submission_id, kind, data, email=None, now=None):
+        """Queue one entry for the next batch; never blocks on the database"""
+        entry = (submission_id, kind, time.time() if now is None else now,
+                 email.lower() if email else None, json.dumps(data))
+        with self._changed:
+            if len(self._pending) >= self.max_pending:
+                # The database has been failing for a while; keep the newest entries
+                self._pending.popleft()
+                self._done += 1
+                self.stats['dropped'] += 1
+                logger.error('❌ Submission log backlog full, dropped the oldest entry')
+            self._pending.append(entry)
+            self._queued += 1
+            self.stats['appended'] += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='submission-log', daemon=True)
+                self._writer.start()
+            if len(self._pending) >= self.batch_size:
+                self._changed.notify_all()
+
+    def _next_batch(self):
+        with self._changed:
+            while not self._pending and not self._closed:
+                self._changed.wait()
+            # Group commit: give concurrent requests one interval to join the batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and not (self._closed or self._flushing):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            self._flushing = False
+            return [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+    def _run(self):
+        import sqlite3
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._closed:
+                    break
+                continue
+            try:
+                conn.execute('BEGIN')
+                conn.executemany(
+                    'INSERT INTO entries (submission_id, kind, created_at, email, data) VALUES (?, ?, ?, ?, ?)',
+                    batch,
+                )
+                conn.execute('COMMIT')
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                with self._changed:
+                    self._pending.extendleft(reversed(batch))
+                    self.stats['errors'] += 1
+                logger.error(f'❌ Submission log write failed, retrying: {str(e)}')
+                time.sleep(max(self.flush_interval, 0.5))
+                continue
+            with self._changed:
+                self._done += len(batch)
+                self.stats['committed'] += len(batch)
+                self.stats['batches'] += 1
+                self._changed.notify_all()
+            if self.retention and time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                self._purged_at = time.monotonic()
+                try:
+                    self._purge(conn, time.time() - self.retention)
+                except Exception as e:
+                    logger.error(f'❌ Submission log purge failed: {str(e)}')
+        conn.close()
+
+    def _purge(self, conn, before):
+        # Every entry of a submission received before the cutoff, then stray entries that old
+        conn.execute('BEGIN')
+        try:
+            submission_ids = [row[0] for row in conn.execute(
+                "SELECT submission_id FROM entries WHERE kind = 'received' AND created_at < ?", (before,))]
+            deleted = sum(
+                conn.execute('DELETE FROM entries WHERE submission_id = ?', (submission_id,)).rowcount
+                for submission_id in submission_ids
+            )
+            deleted += conn.execute('DELETE FROM entries WHERE created_at < ?', (before,)).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._changed:
+            self.stats['purged'] += deleted
+        return deleted
+
+    def purge(self, before):
+        """Delete every entry of submissions received before ``before`` (epoch seconds); returns the count"""
+        with connect(self.path) as conn:
+            return self._purge(conn, before)
+
+    def flush(self, timeout=5.0):
+        """Wait until every entry queued so far is committed; returns False on timeout"""
+        with self._changed:
+            target = self._queued
+            self._flushing = True
+            self._changed.notify_all()
+            return self._changed.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self, timeout=5.0):
+        flushed = self.flush(timeout)
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        if self._writer is not None:
+            # Let a purge that follows the last batch finish
+            self._writer.join(timeout)
+        return flushed
+
+    def get_stats(self):
+        with self._changed:
+            return {**self.stats, 'pending': len(self._pending)}
+
+    # Reads open their own connection; in WAL mode they run alongside the writer
+
+    def query(self, since=0.0, until=None, email=None, undelivered=False, limit=None):
+        """
+        Received submissions in ``[since, until)`` with their latest status,
+        oldest first; optionally only one email address or only undelivered ones.
+        """
+        sql = _WITH_STATUS
+        params = [since, time.time() + 1 if until is None else until]
+        if email:
+            sql += ' AND r.email = ?'
+            params.append(email.lower())
+        sql = f'SELECT * FROM ({sql}) WHERE 1'
+        if undelivered:
+            sql += " AND (status IS NULL OR status = 'failed')"
+        sql += ' ORDER BY created_at'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with connect(self.path) as conn:
+            for row in conn.execute(sql, params):
+                yield {
+                    'submission_id': row['submission_id'],
+                    'created_at': row['created_at'],
+                    'email': row['email'],
+                    'status': row['status'] or RECEIVED,
+                    **json.loads(row['data']),
+                }
+
+    def history(self, submission_id):
+        """Every entry for one submission, oldest first"""
+        with connect(self.path) as conn:
+            rows = conn.execute(
+                'SELECT kind, created_at, data FROM entries WHERE submission_id = ? ORDER BY seq',
+                (submission_id,),
+            ).fetchall()
+        return [{'kind': row['kind'], 'created_at': row['created_at'], **json.loads(row['data'])} for row in rows]
+
+
+_log = (None, None)
+_log_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.submission_log,
+        default_path(),
+        settings.submission_log_flush_ms,
+        settings.submission_log_batch_size,
+        settings.submission_log_retention_days,
+    )
+
+
+def get_log():
+    """Return the process-wide SubmissionLog, or None when SUBMISSION_LOG is off"""
+    global _log
+    key = _config()
+    current_key, submission_log = _log
+    if current_key == key:
+        return submission_log
+
+    with _log_lock:
+        current_key, submission_log = _log
+        if current_key != key:
+            if submission_log is not None:
+                submission_log.close()
+            enabled, path, flush_ms, batch_size, retention_days = key
+            submission_log = SubmissionLog(path, flush_ms, batch_size, retention_days=retention_days) \
+                if enabled else None
+            _log = (key, submission_log)
+        return submission_log
+
+
+@atexit.register
+def _flush_at_exit():
+    _, submission_log = _log
+    if submission_log is not None:
+        submission_log.close()
+
+
+def _collect_stats():
+    _, submission_log = _log
+    if submission_log is None:
+        return {}
+    return {(f'submission_log_{name}', ()): value for name, value in submission_log.get_stats().items()}
+
+
+metrics.add_collector(_collect_stats)
@@ -0,0 +1,139 @@
+"""
+Minimal precompiled email templates.
+
+A template is HTML with ``{{ slot }}`` placeholders. It is compiled once at
+import into alternating static chunks and slot names, for both the HTML body
+and a plain-text alternative derived from the same source, so rendering is a
+single join with no parsing. All slot values of a render are HTML-escaped
+together in one html.escape call (C-level replaces, measured faster than
+str.translate or a regex callback); the plain-text part uses them verbatim.
+
+A slot can also be filled with an already rendered RenderedEmail (a
+"fragment"), whose HTML and text go in unescaped; digests use this to nest
+one rendered entry per submission.
+"""
+
+import html
+import os
+import re
+from collections import namedtuple
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+_SLOT = re.compile(r'{{\s*(\w+)\s*}}')
+_MARKER = '\x00'  # slot placeholder in the text layout and separator when escaping
+
+
+_SECTION_END = re.compile(r'</(div|h[1-6]|table)>', re.IGNORECASE)
+_LINE_END = re.compile(r'</(p|li|tr)>|<br\s*/?>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+_INDENT = re.compile(r'\s*\n\s*')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+RenderedEmail = namedtuple('RenderedEmail', ['html', 'text'])
+
+
+def escape(value):
+    """HTML-escape a single value, quotes included"""
+    return html.escape(str(value))
+
+
+def _split(source):
+    """Split source on slots into (static chunks, slot names)"""
+    parts = _SLOT.split(source)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+def _to_text(source):
+    """Derive the plain-text layout from the HTML source, keeping slots in place"""
+    text = _SLOT.sub(lambda m: f'{_MARKER}{m.group(1)}{_MARKER}', source)
+    # The mailto href duplicates the visible address, so whole tags go
+    # (including any slot inside an attribute) before slots are restored.
+    # Source line breaks are only formatting; layout comes from the tags.
+    text = _WHITESPACE.sub(' ', text)
+    text = _SECTION_END.sub('\n\n', text)
+    text = _LINE_END.sub('\n', text)
+    text = html.unescape(_TAG.sub('', text))
+    lines = (line.strip() for line in text.split('\n'))
+    text = _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip() + '\n'
+    # Odd positions after splitting on the marker are slot names
+    pieces = text.split(_MARKER)
+    return ''.join(
+        f'{{{{ {piece} }}}}' if index % 2 else piece
+        for index, piece in enumerate(pieces)
+    )
+
+
+def _minify(source):
+    """Drop indentation between tags; it only inflates the message"""
+    return _INDENT.sub('\n', source).strip()
+
+
+class Template:
+    """An email template compiled into static chunks and slots"""
+
+    def __init__(self, source):
+        html_chunks, html_slots = _split(_minify(source))
+        text_chunks, text_slots = _split(_to_text(source))
+        # Each distinct slot is converted and escaped once per render, even
+        # when it appears several times (e.g. the mailto href and its label).
+        self.slots = tuple(dict.fromkeys(html_slots + text_slots))
+        position = self._position = {name: index for index, name in enumerate(self.slots)}
+        self._html_chunks = html_chunks
+        self._html_index = tuple(position[name] for name in html_slots)
+        self._text_chunks = text_chunks
+        self._text_index = tuple(position[name] for name in text_slots)
+
+    @staticmethod
+    def _fill(chunks, index, values):
+        parts = [None] * (len(chunks) + len(index))
+        parts[0::2] = chunks
+        parts[1::2] = [values[i] for i in index]
+        return ''.join(parts)
+
+    def _values(self, values):
+        get = values.get
+        return [str(get(name, '')) for name in self.slots]
+
+    @staticmethod
+    def _escape_all(raw):
+        """Escape every slot value with a single html.escape call"""
+        escaped = html.escape(_MARKER.join(raw)).split(_MARKER)
+        if len(escaped) != len(raw):
+            # A value contained the marker itself; escape one by one
+            escaped = [html.escape(value) for value in raw]
+        return escaped
+
+    def render_html(self, values):
+        return self._fill(self._html_chunks, self._html_index, self._escape_all(self._values(values)))
+
+    def render_text(self, values):
+        return self._fill(self._text_chunks, self._text_index, self._values(values))
+
+    def render(self, values, fragments=None):
+        """
+        Render both the HTML body and its plain-text alternative.
+
+        ``fragments`` maps slot names to RenderedEmail values inserted as is.
+        """
+        raw = self._values(values)
+        escaped = self._escape_all(raw)
+        if fragments:
+            for name, fragment in fragments.items():
+                index = self._position[name]
+                escaped[index] = fragment.html
+                raw[index] = fragment.text
+        return RenderedEmail(
+            self._fill(self._html_chunks, self._html_index, escaped),
+            self._fill(self._text_chunks, self._text_index, raw),
+        )
+
+
+def load_template(name):
+    """Read and compile a template from shared_code/templates"""
+    with open(os.path.join(TEMPLATE_DIR, name), encoding='utf-8') as f:
+        return Template(f.read())
+
+
+CONTACT_EMAIL = load_template('contact_email.html')
@@ -0,0 +1,553 @@
+"""
+Provider-neutral email sending with failover, hedging and health scoring.
+
+Messages use the ACS message shape already built by the contact functions,
+the outbox and digests (``senderAddress``, ``recipients.to``, ``content``,
+``replyTo``); each transport translates it for its provider:
+
+- ``AcsTransport``: Azure Communication Services. The idempotency key is
+  sent as the ACS operation id, so repeating a send with the same key is
+  recognised by ACS instead of delivering a second copy, and ACS can be
+  asked afterwards whether it accepted an operation.
+- ``SendGridTransport``: SendGrid v3. It has no idempotency keys; the key is
+  attached as an ``X-Lawgate-Idempotency-Key`` header for tracing only.
+
+``EmailSender`` tries the transports in order of health. A provider is
+only failed over when it definitely did not accept the message: a
+connection or error response, a failed operation, or (ACS) an operation
+ACS has no record of after the send exceeded EMAIL_SEND_TIMEOUT_MS. When
+acceptance is unknown the error is raised instead, so a recipient never gets
+one copy from each provider.
+
+With EMAIL_HEDGE_DELAY_MS set, a send to an idempotent transport that has
+not been accepted after the delay is hedged by a second request with the
+same idempotency key on another pooled connection; whichever answers first
+wins and ACS collapses the two into one operation. Hedges are never sent to
+a different provider, because that could deliver two copies.
+
+Health is an exponentially weighted moving average of each provider's send
+latency and failure rate. The configured order (EMAIL_PROVIDERS) is kept
+unless the first provider's score is markedly worse than another's.
+
+Each provider also has a circuit breaker (shared_code.breaker). A provider
+whose breaker is open is skipped without a request, which is always safe to
+fail over from; when every provider is skipped, send() raises CircuitOpen
+and the caller applies EMAIL_BREAKER_POLICY.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from shared_code import breaker, metrics
+from shared_code.clients import ACS_API_VERSION, get_async_email_client, get_email_client
+from shared_code.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEND_TIMEOUT_MS = 5000
+DEFAULT_POLL_TIMEOUT_SECONDS = 30
+IDEMPOTENCY_HEADER = 'X-Lawgate-Idempotency-Key'
+
+SendResult = namedtuple('SendResult', ['provider', 'message_id', 'status'])
+
+metrics.REGISTRY.describe('email_sends_total', 'Email send attempts by provider and result')
+metrics.REGISTRY.describe('email_failovers_total', 'Sends moved to the next provider')
+metrics.REGISTRY.describe('email_hedges_total', 'Hedged send requests by which request answered first')
+
+
+class TransportError(Exception):
+    """
+    A provider failed to send a message.
+
+    ``accepted`` is False when the provider definitely did not take the
+    message, True when it did (and may still deliver it) and None when
+    that is unknown. Only False makes failing over safe.
+    """
+
+    def __init__(self, provider, message, accepted=False):
+        super().__init__(f'{provider}: {message}')
+        self.provider = provider
+        self.accepted = accepted
+
+
+# TransportError.accepted from least to most certain that the provider has the message
+_ACCEPTANCE_RANK = {False: 0, None: 1, True: 2}
+
+
+class NotConfigured(Exception):
+    """No email provider has credentials (ACS connection string or SendGrid API key)"""
+
+
+def email_message(settings, email_content, subject, reply_to):
+    """Build the ACS-shaped message for a rendered email to the configured recipients"""
+    return {
+        "senderAddress": settings.sender_email,
+        "recipients": {
+            "to": [{"address": email_addr} for email_addr in settings.recipients]
+        },
+        "content": {
+            "subject": subject,
+            "html": email_content.html,
+            "plainText": email_content.text
+        },
+        "replyTo": [{"address": reply_to}]
+    }
+
+
+def _addresses(message):
+    return [recipient['address'] for recipient in message['recipients']['to']]
+
+
+class AcsTransport:
+    """Azure Communication Services over the shared pooled EmailClient"""
+
+    name = 'acs'
+    idempotent = True
+
+    def __init__(self, connection_string, poll_timeout=DEFAULT_POLL_TIMEOUT_SECONDS):
+        self.connection_string = connection_string
+        self.poll_timeout = poll_timeout
+
+    def _client(self):
+        return get_email_client(self.connection_string)
+
+    def send(self, message, idempotency_key, timeout):
+        from azure.core.exceptions import HttpResponseError
+
+        client = self._client()
+        try:
+            with metrics.timer('begin_send'):
+                poller = client.begin_send(
+                    message, operation_id=idempotency_key,
+                    connection_timeout=timeout, read_timeout=timeout,
+                )
+        except Exception as e:
+            raise self.classify(e, idempotency_key) from e
+
+        with metrics.timer('poll'):
+            try:
+                result = poller.result(timeout=self.poll_timeout)
+            except HttpResponseError as e:
+                # ACS reported the operation as failed; nothing was delivered
+                raise TransportError(self.name, e, accepted=False) from e
+        if not poller.done():
+            # Accepted and still in progress; ACS will finish it
+            return SendResult(self.name, idempotency_key, poller.status())
+        return SendResult(self.name, result.get('id', idempotency_key), result.get('status'))
+
+    async def send_async(self, message, idempotency_key, timeout):
+        """send() over the event loop's aio EmailClient, bounded by ``timeout`` and the poll timeout"""
+        from azure.core.exceptions import HttpResponseError
+
+        client = get_async_email_client(self.connection_string)
+        try:
+            with metrics.timer('begin_send'):
+                poller = await asyncio.wait_for(client.begin_send(
+                    message, operation_id=idempotency_key,
+                    connection_timeout=timeout, read_timeout=timeout,
+                ), timeout)
+        except Exception as e:
+            # classify() may ask ACS about the operation, which blocks
+            raise await asyncio.to_thread(self.classify, e, idempotency_key) from e
+
+        with metrics.timer('poll'):
+            try:
+                result = await asyncio.wait_for(poller.result(), self.poll_timeout)
+            except asyncio.TimeoutError:
+                # Accepted and still in progress; ACS will finish it
+                return SendResult(self.name, idempotency_key, poller.status())
+            except HttpResponseError as e:
+                raise TransportError(self.name, e, accepted=False) from e
+        return SendResult(self.name, result.get('id', idempotency_key), result.get('status'))
+
+    def classify(self, error, idempotency_key):
+        """The TransportError for an exception raised while starting a send"""
+        from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+        if isinstance(error, (ServiceRequestError, HttpResponseError)):
+            # Never reached ACS (DNS, connect, TLS), or an error response
+            accepted = False
+        elif isinstance(error, (ServiceResponseError, TimeoutError, asyncio.TimeoutError)):
+            # Sent, but no answer in time: ask ACS whether it has the operation
+            accepted = self.accepted(idempotency_key)
+        else:
+            accepted = None
+        return TransportError(self.name, str(error) or type(error).__name__, accepted=accepted)
+
+    def accepted(self, idempotency_key):
+        """True/False if ACS does/doesn't know the operation, None if it can't be checked"""
+        from azure.core.rest import HttpRequest
+
+        try:
+            client = self._client()
+            response = client.send_request(HttpRequest(
+                'GET', f'/emails/operations/{idempotency_key}',
+                params={'api-version': ACS_API_VERSION},
+            ))
+        except Exception as e:
+            logger.warning(f'Could not check ACS operation {idempotency_key}: {str(e)}')
+            return None
+        if response.status_code == 404:
+            return False
+        return True if response.status_code < 400 else None
+
+
+class SendGridTransport:
+    """SendGrid v3 mail send"""
+
+    name = 'sendgrid'
+    idempotent = False
+
+    def __init__(self, api_key, sender):
+        self.api_key = api_key
+        self.sender = sender
+
+    def _mail(self, message, idempotency_key):
+        from sendgrid.helpers.mail import Header, Mail
+
+        content = message['content']
+        mail = Mail(
+            # ACS sender addresses belong to the ACS domain; use our own
+            from_email=self.sender,
+            to_emails=_addresses(message),
+            subject=content['subject'],
+            html_content=content.get('html'),
+            plain_text_content=content.get('plainText'),
+        )
+        if message.get('replyTo'):
+            mail.reply_to = message['replyTo'][0]['address']
+        mail.header = Header(IDEMPOTENCY_HEADER, idempotency_key)
+        return mail
+
+    def send(self, message, idempotency_key, timeout):
+        from urllib.error import URLError
+
+        from python_http_client.exceptions import HTTPError
+        from sendgrid import SendGridAPIClient
+
+        client = SendGridAPIClient(self.api_key)
+        client.client.timeout = timeout
+        try:
+            with metrics.timer('sendgrid_send'):
+                response = client.send(self._mail(message, idempotency_key))
+        except HTTPError as e:
+            # An error status: SendGrid did not queue the message
+            raise TransportError(self.name, e, accepted=False) from e
+        except URLError as e:
+            # Connection failures never reached SendGrid; timeouts may have
+            sent = isinstance(e.reason, TimeoutError)
+            raise TransportError(self.name, e, accepted=None if sent else False) from e
+        except TimeoutError as e:
+            raise TransportError(self.name, e, accepted=None) from e
+        message_id = response.headers.get('X-Message-Id') if getattr(response, 'headers', None) else None
+        return SendResult(self.name, message_id, response.status_code)
+
+
+class ProviderHealth:
+    """EWMA latency and failure rate per provider; lower scores are healthier"""
+
+    def __init__(self, alpha=0.2, failure_penalty=4.0):
+        self.alpha = alpha
+        self.failure_penalty = failure_penalty
+        self._lock = threading.Lock()
+        self._state = {}  # provider -> [latency_ewma, failure_ewma, samples]
+
+    def record(self, provider, seconds, ok):
+        with self._lock:
+            state = self._state.get(provider)
+            if state is None:
+                self._state[provider] = [seconds, 0.0 if ok else 1.0, 1]
+                return
+            state[0] += self.alpha * (seconds - state[0])
+            state[1] += self.alpha * ((0.0 if ok else 1.0) - state[1])
+            state[2] += 1
+
+    def score(self, provider):
+        """Expected cost of a send: latency inflated by the failure rate (0 when unknown)"""
+        with self._lock:
+            state = self._state.get(provider)
+        if state is None:
+            return 0.0
+        return state[0] * (1 + self.failure_penalty * state[1])
+
+    def order(self, names, min_samples=5, hysteresis=2.0):
+        """Configured order, unless the first provider scores ``hysteresis`` times worse than another"""
+        with self._lock:
+            samples = {name: self._state.get(name, (0, 0, 0))[2] for name in names}
+        if len(names) < 2 or samples[names[0]] < min_samples:
+            return list(names)
+        primary = self.score(names[0])
+        best = min(names[1:], key=self.score)
+        if samples[best] >= min_samples and primary > hysteresis * self.score(best):
+            return [best] + [name for name in names if name != best]
+        return list(names)
+
+    def snapshot(self):
+        with self._lock:
+            state = {name: tuple(values) for name, values in self._state.items()}
+        return {
+            name: {'latency_seconds': latency, 'failure_rate': failures, 'samples': samples,
+                   'score': self.score(name)}
+            for name, (latency, failures, samples) in state.items()
+        }
+
+
+class EmailSender:
+    """Sends through the healthiest transport, failing over only when that can't duplicate"""
+
+    def __init__(self, transports, send_timeout_ms=DEFAULT_SEND_TIMEOUT_MS, hedge_delay_ms=0,
+                 health=None, max_hedges=8):
+        self.transports = {transport.name: transport for transport in transports}
+        self.order = tuple(transport.name for transport in transports)
+        self.send_timeout = send_timeout_ms / 1000
+        self.hedge_delay = hedge_delay_ms / 1000
+        self.health = health if health is not None else ProviderHealth()
+        self._executor = ThreadPoolExecutor(max_workers=max_hedges * 2, thread_name_prefix='email-hedge') \
+            if self.hedge_delay else None
+
+    def close(self):
+        """Stop the hedging threads once their sends finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _finished(self, transport, circuit, started, ok):
+        seconds = time.perf_counter() - started
+        self.health.record(transport.name, seconds, ok=ok)
+        if circuit is not None:
+            circuit.record(seconds, ok=ok)
+        metrics.increment('email_sends_total', provider=transport.name, result='sent' if ok else 'error')
+
+    def _attempt(self, transport, message, idempotency_key, circuit=None):
+        started = time.perf_counter()
+        try:
+            result = transport.send(message, idempotency_key, self.send_timeout)
+        except TransportError as e:
+            # Accepted but slow to confirm still counts as the provider working
+            self._finished(transport, circuit, started, ok=bool(e.accepted))
+            raise
+        except Exception as e:
+            # Anything unexpected: we can't tell whether it was accepted
+            self._finished(transport, circuit, started, ok=False)
+            raise TransportError(transport.name, e, accepted=None) from e
+        self._finished(transport, circuit, started, ok=True)
+        return result
+
+    async def _attempt_async(self, transport, message, idempotency_key, circuit=None):
+        started = time.perf_counter()
+        try:
+            result = await transport.send_async(message, idempotency_key, self.send_timeout)
+        except TransportError as e:
+            self._finished(transport, circuit, started, ok=bool(e.accepted))
+            raise
+        except Exception as e:
+            self._finished(transport, circuit, started, ok=False)
+            raise TransportError(transport.name, e, accepted=None) from e
+        self._finished(transport, circuit, started, ok=True)
+        return result
+
+    def _hedged(self, transport, message, idempotency_key, circuit=None):
+        """Race a second identical request against a slow first one (idempotent transports only)"""
+        first = self._executor.submit(self._attempt, transport, message, idempotency_key, circuit)
+        done, _ = wait([first], timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        second = self._executor.submit(self._attempt, transport, message, idempotency_key, circuit)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except TransportError as e:
+                    # Keep the error that says most about acceptance: one
+                    # attempt that may have been accepted rules out failover
+                    # even when the other was definitely refused
+                    if error is None or _ACCEPTANCE_RANK[e.accepted] > _ACCEPTANCE_RANK[error.accepted]:
+                        error = e
+                    continue
+                metrics.increment('email_hedges_total', result='hedge' if future is second else 'original')
+                return result
+        raise error
+
+    async def _hedged_async(self, transport, message, idempotency_key, circuit=None):
+        """_hedged() on the event loop; the slower attempt is cancelled once one answers"""
+        first = asyncio.ensure_future(self._attempt_async(transport, message, idempotency_key, circuit))
+        done, _ = await asyncio.wait([first], timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(self._attempt_async(transport, message, idempotency_key, circuit))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except TransportError as e:
+                        if error is None or _ACCEPTANCE_RANK[e.accepted] > _ACCEPTANCE_RANK[error.accepted]:
+                            error = e
+                        continue
+                    metrics.increment('email_hedges_total', result='hedge' if task is second else 'original')
+                    return result
+        finally:
+            # Same idempotency key, so abandoning the other request can't lose the message
+            for task in pending:
+                task.cancel()
+        raise error
+
+    def send(self, message, idempotency_key=None, failed=None):
+        """
+        Send ``message``; returns a SendResult or raises the last TransportError,
+        CircuitOpen when every provider's breaker refused the send, or
+        NotConfigured when there are no providers.
+
+        ``failed`` is a TransportError (accepted=False) from an attempt the
+        caller already made; its provider is skipped and failed over from.
+        """
+        if not self.transports:
+            raise NotConfigured('No email provider configured (ACS connection string or SendGrid API key)')
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        error = failed
+        refused = []
+        for name in self.health.order(self.order):
+            if failed is not None and name == failed.provider:
+                continue
+            transport = self.transports[name]
+            circuit = breaker.get_breaker(name)
+            if circuit is not None and not circuit.allow():
+                # Nothing was sent, so moving on can't duplicate
+                refused.append(circuit)
+                continue
+            if error is not None:
+                metrics.increment('email_failovers_total', source=error.provider, target=name)
+                logger.warning(f'Failing over to {name}: {error}')
+            try:
+                if self._executor is not None and transport.idempotent:
+                    return self._hedged(transport, message, idempotency_key, circuit)
+                return self._attempt(transport, message, idempotency_key, circuit)
+            except TransportError as e:
+                if e.accepted:
+                    # Accepted but slow to confirm: the provider will deliver it
+                    return SendResult(name, idempotency_key, 'Accepted')
+                if e.accepted is None:
+                    raise
+                error = e
+        if error is None and refused:
+            raise breaker.CircuitOpen(
+                ','.join(circuit.name for circuit in refused),
+                min(circuit.retry_after() for circuit in refused),
+            )
+        raise error
+
+    async def send_async(self, message, idempotency_key=None):
+        """
+        send() for the event loop. The healthiest provider is awaited directly
+        when its transport has ``send_async``, with the same classification,
+        hedging and bookkeeping as send(); failing over from it, or any other
+        provider, runs send() in a worker thread.
+        """
+        if not self.transports:
+            raise NotConfigured('No email provider configured (ACS connection string or SendGrid API key)')
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        name = self.health.order(self.order)[0]
+        transport = self.transports[name]
+        if not hasattr(transport, 'send_async'):
+            return await asyncio.to_thread(self.send, message, idempotency_key)
+        circuit = breaker.get_breaker(name)
+        if circuit is not None and not circuit.allow():
+            # send() checks the breaker again and skips the provider
+            return await asyncio.to_thread(self.send, message, idempotency_key)
+        try:
+            if self.hedge_delay and transport.idempotent:
+                return await self._hedged_async(transport, message, idempotency_key, circuit)
+            return await self._attempt_async(transport, message, idempotency_key, circuit)
+        except TransportError as e:
+            if e.accepted:
+                return SendResult(name, idempotency_key, 'Accepted')
+            if e.accepted is None:
+                raise
+            return await asyncio.to_thread(self.send, message, idempotency_key, e)
+
+
+def configured_transports(settings):
+    """Transports with credentials, in EMAIL_PROVIDERS order"""
+    available = {}
+    if settings.azure_connection_string:
+        available['acs'] = lambda: AcsTransport(settings.azure_connection_string, settings.email_poll_timeout_seconds)
+    if settings.sendgrid_api_key:
+        available['sendgrid'] = lambda: SendGridTransport(settings.sendgrid_api_key, settings.sendgrid_sender_email)
+    return [available[name]() for name in settings.email_providers if name in available]
+
+
+def is_configured(settings=None):
+    """True if at least one email provider has credentials"""
+    return bool(configured_transports(settings or get_settings()))
+
+
+_sender = (None, None)
+_sender_lock = threading.Lock()
+
+
+def _config():
+    settings = get_settings()
+    return (
+        settings.email_providers,
+        settings.azure_connection_string,
+        settings.sendgrid_api_key,
+        settings.sendgrid_sender_email,
+        settings.email_send_timeout_ms,
+        settings.email_poll_timeout_seconds,
+        settings.email_hedge_delay_ms,
+    )
+
+
+def get_sender():
+    """Return the process-wide EmailSender, rebuilt when provider configuration changes"""
+    global _sender
+    key = _config()
+    current_key, sender = _sender
+    if sender is not None and current_key == key:
+        return sender
+
+    with _sender_lock:
+        current_key, sender = _sender
+        if sender is None or current_key != key:
+            settings = get_settings()
+            # Keep health history across rebuilds; it describes the providers, not the config
+            previous = sender
+            health = previous.health if previous is not None else None
+            sender = EmailSender(
+                configured_transports(settings),
+                send_timeout_ms=settings.email_send_timeout_ms,
+                hedge_delay_ms=settings.email_hedge_delay_ms,
+                health=health,
+            )
+            _sender = (key, sender)
+            if previous is not None:
+                previous.close()
+        return sender
+
+
+def _collect_health():
+    _, sender = _sender
+    if sender is None:
+        return {}
+    gauges = {}
+    for name, state in sender.health.snapshot().items():
+        labels = (('provider', name),)
+        gauges[('email_provider_latency_seconds', labels)] = round(state['latency_seconds'], 6)
+        gauges[('email_provider_failure_rate', labels)] = round(state['failure_rate'], 4)
+        gauges[('email_provider_score', labels)] = round(state['score'], 6)
+    return gauges
+
+
+metrics.add_collector(_collect_health)
@@ -4,8 +4,10 @@ Run this inside the backend directory to test email functionality
 """
 
 import os
+from datetime import datetime
 from dotenv import load_dotenv
 from azure.communication.email import EmailClient
+from shared_code.templating import CONTACT_EMAIL
 
 # Load environment variables
 load_dotenv()
@@ -38,8 +40,21 @@ def test_email():
         email_client = EmailClient.from_connection_string(connection_string)
         print("✅ Email client created successfully\n")
         
-        # Prepare test email
+        # Prepare test email from the same template the contact form uses
         print("Preparing test email...")
+        test_content = CONTACT_EMAIL.render({
+            'name': 'Lawgate Email Test',
+            'email': 'test@example.com',
+            'phone': 'Not provided',
+            'company': 'Not provided',
+            'subject': 'Test Email',
+            'message': ('This is a test email from the Lawgate contact form backend. '
+                        'If you received this, the email configuration is working correctly! '
+                        f'Sent via Azure Communication Services from {sender_email} '
+                        f'to {", ".join(recipient_emails)}.'),
+            'submitted_on': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+            'ip_address': 'localhost',
+        })
         email_message = {
             "senderAddress": sender_email,
             "recipients": {
@@ -47,21 +62,8 @@ def test_email():
             },
             "content": {
                 "subject": "Test Email from Lawgate Contact Form",
-                "html": """
-                <html>
-                <body>
-                    <h2>Test Email</h2>
-                    <p>This is a test email from the Lawgate contact form backend.</p>
-                    <p><strong>If you received this, the email configuration is working correctly!</strong></p>
-                    <hr>
-                    <p style="color: #666; font-size: 12px;">
-                        Sent via Azure Communication Services<br>
-                        From: {sender}<br>
-                        To: {recipients}
-                    </p>
-                </body>
-                </html>
-                """.format(sender=sender_email, recipients=", ".join(recipient_emails))
+                "html": test_content.html,
+                "plainText": test_content.text
             },
             "replyTo": [{"address": "test@example.com"}]
         }
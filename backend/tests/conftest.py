@@ -0,0 +1,16 @@
+import pytest
+
+from shared_code.settings import get_settings, reload_settings
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """Set app settings through the environment; returns the re-read Settings"""
+    def apply(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(name, str(value))
+        reload_settings()
+        return get_settings()
+
+    yield apply
+    reload_settings()
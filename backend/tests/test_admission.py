@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shared_code import admission
+
+
+def controller(**options):
+    options = {'max_concurrent': 1, 'max_queue': 1, 'queue_timeout_ms': 2000, **options}
+    return admission.AdmissionController('test', **options)
+
+
+def test_sheds_when_the_queue_is_full():
+    c = controller(max_queue=0)
+    c.acquire()
+    with pytest.raises(admission.Overloaded) as shed:
+        c.acquire()
+    assert shed.value.reason == 'queue_full'
+    assert shed.value.retry_after >= 1
+    assert c.get_stats()['shed_queue_full'] == 1
+
+
+def test_sheds_a_waiter_after_the_queue_timeout():
+    c = controller(queue_timeout_ms=20)
+    c.acquire()
+    with pytest.raises(admission.Overloaded) as shed:
+        c.acquire()
+    assert shed.value.reason == 'timeout'
+    stats = c.get_stats()
+    assert (stats['shed_timeout'], stats['queue_depth'], stats['in_flight']) == (1, 0, 1)
+
+
+def wait_for_queue(c, depth):
+    deadline = time.monotonic() + 1
+    while c.get_stats()['queue_depth'] < depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_release_hands_the_slot_to_the_longest_waiter():
+    c = controller(max_queue=2)
+    c.acquire()
+    admitted = []
+    waiters = [threading.Thread(target=lambda n=n: (c.acquire(), admitted.append(n))) for n in range(2)]
+    for depth, waiter in enumerate(waiters, 1):
+        waiter.start()
+        wait_for_queue(c, depth)
+
+    c.release(0.1)
+    waiters[0].join(1)
+    assert admitted == [0]
+    c.release(0.1)
+    waiters[1].join(1)
+    assert admitted == [0, 1]
+    assert c.get_stats()['in_flight'] == 1
+
+
+def test_async_waiter_is_shed_after_the_queue_timeout():
+    c = controller(queue_timeout_ms=20)
+
+    async def run():
+        await c.acquire_async()
+        await c.acquire_async()
+
+    with pytest.raises(admission.Overloaded) as shed:
+        asyncio.run(run())
+    assert shed.value.reason == 'timeout'
+
+
+def test_async_waiter_gets_a_released_slot():
+    c = controller()
+
+    async def run():
+        await c.acquire_async()
+        waiter = asyncio.ensure_future(c.acquire_async())
+        await asyncio.sleep(0)
+        c.release(0.1)
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(run())
+    assert c.get_stats() == {**c.stats, 'in_flight': 1, 'queue_depth': 0}
+    assert c.stats['admitted'] == 2
+
+
+def test_admit_sheds_through_the_configured_controller(configure):
+    configure(ADMISSION_CONTROL='true', ADMISSION_MAX_CONCURRENT=1, ADMISSION_MAX_QUEUE=0)
+    with admission.admit('test_admit'):
+        with pytest.raises(admission.Overloaded):
+            with admission.admit('test_admit'):
+                pass
+    # The slot is free again once the block exits
+    with admission.admit('test_admit'):
+        pass
+
+
+def test_admit_is_a_no_op_when_disabled(configure):
+    configure(ADMISSION_CONTROL='false')
+    assert admission.get_controller('test_disabled') is None
+    with admission.admit('test_disabled'):
+        with admission.admit('test_disabled'):
+            pass
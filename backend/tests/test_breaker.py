@@ -0,0 +1,196 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stand_ins import FakeClock, FakeEmailClient
+from shared_code import breaker, contact, outbox, transport
+from shared_code.request_log import RequestLog
+
+MESSAGE = {
+    'senderAddress': 'DoNotReply@lawgate.in',
+    'recipients': {'to': [{'address': 'shishir@lawgate.in'}]},
+    'content': {'subject': 'Contact', 'plainText': 'Hello', 'html': '<p>Hello</p>'},
+    'replyTo': [{'address': 'jane@example.com'}],
+}
+
+
+def circuit(name='acs', **options):
+    options = {'min_calls': 4, 'window_seconds': 30, 'open_seconds': 10, 'clock': FakeClock(), **options}
+    return breaker.CircuitBreaker(name, **options)
+
+
+def trip(circuit):
+    for _ in range(circuit.min_calls):
+        assert circuit.allow()
+        circuit.record(0.01, ok=False)
+
+
+def test_opens_once_the_error_rate_is_reached():
+    c = circuit()
+    for ok in (True, False, True):
+        c.allow()
+        c.record(0.01, ok=ok)
+    # Too few calls to judge yet
+    assert c.state == breaker.CLOSED
+    c.allow()
+    c.record(0.01, ok=False)
+    assert c.state == breaker.OPEN
+
+
+def test_opens_on_slow_calls():
+    c = circuit(slow_call_ms=100, slow_rate=0.5)
+    for seconds in (0.2, 0.01, 0.2, 0.01):
+        c.allow()
+        c.record(seconds, ok=True)
+    assert c.state == breaker.OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    c = circuit()
+    for _ in range(3):
+        c.allow()
+        c.record(0.01, ok=False)
+    c.clock.advance(30)
+    c.allow()
+    c.record(0.01, ok=False)
+    assert c.state == breaker.CLOSED
+
+
+def test_open_refuses_until_the_open_period_ends():
+    c = circuit()
+    trip(c)
+    assert not c.allow()
+    assert c.retry_after() == 10
+    with pytest.raises(breaker.CircuitOpen) as refused:
+        c.call(lambda: None)
+    assert refused.value.retry_after == 10
+
+    c.clock.advance(10)
+    assert c.state == breaker.HALF_OPEN
+
+
+def test_half_open_lets_only_the_probes_through():
+    c = circuit(half_open_calls=2)
+    trip(c)
+    c.clock.advance(10)
+    assert [c.allow() for _ in range(3)] == [True, True, False]
+
+
+def test_successful_probes_close_the_breaker():
+    c = circuit(half_open_calls=2)
+    trip(c)
+    c.clock.advance(10)
+    c.allow()
+    c.record(0.01, ok=True)
+    assert c.state == breaker.HALF_OPEN
+    c.allow()
+    c.record(0.01, ok=True)
+    assert c.state == breaker.CLOSED
+    assert c.snapshot()['calls'] == 0
+
+
+@pytest.mark.parametrize('seconds, ok', [(0.01, False), (1.0, True)])
+def test_failed_or_slow_probe_reopens(seconds, ok):
+    c = circuit(slow_call_ms=500)
+    trip(c)
+    c.clock.advance(10)
+    assert c.allow()
+    c.record(seconds, ok=ok)
+    assert c.state == breaker.OPEN
+    assert c.retry_after() == 10
+
+
+def test_lost_probe_is_replaced_after_the_open_period():
+    c = circuit()
+    trip(c)
+    c.clock.advance(10)
+    assert c.allow()
+    assert not c.allow()
+    c.clock.advance(10)
+    assert c.allow()
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    """Breakers for both providers, returned by breaker.get_breaker"""
+    clock = FakeClock()
+    circuits = {name: circuit(name, clock=clock) for name in (breaker.ACS, breaker.SENDGRID)}
+    monkeypatch.setattr(breaker, 'get_breaker', circuits.get)
+    return SimpleNamespace(clock=clock, **circuits)
+
+
+@pytest.fixture
+def email_client(monkeypatch):
+    client = FakeEmailClient()
+    monkeypatch.setattr(transport, 'get_email_client', lambda _: client)
+    return client
+
+
+def test_sender_raises_circuit_open_when_every_provider_is_refused(breakers, email_client):
+    trip(breakers.acs)
+    trip(breakers.sendgrid)
+    sender = transport.EmailSender([transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')])
+    with pytest.raises(breaker.CircuitOpen) as refused:
+        sender.send(MESSAGE, 'sub-1')
+    assert refused.value.retry_after == 10
+    assert email_client.sent.value == 0
+
+
+def request_log():
+    return RequestLog(logging.getLogger(__name__), SimpleNamespace(method='POST', headers={}))
+
+
+def test_queue_policy_puts_the_message_on_the_outbox(configure, tmp_path):
+    settings = configure(EMAIL_BREAKER_POLICY='queue', OUTBOX_DB_PATH=tmp_path / 'outbox.sqlite3', SUBMISSION_LOG='false')
+    response = contact.email_unavailable(breaker.CircuitOpen('acs,sendgrid', 10), MESSAGE, settings,
+                                         request_log(), 'sub-1')
+    assert response.status_code == 202
+    assert json.loads(response.get_body())['submissionId'] == 'sub-1'
+    assert outbox.get_outbox().get('sub-1')['status'] == outbox.PENDING
+
+
+def test_fail_policy_answers_503(configure):
+    settings = configure(EMAIL_BREAKER_POLICY='fail', SUBMISSION_LOG='false')
+    response = contact.email_unavailable(breaker.CircuitOpen('acs,sendgrid', 10), MESSAGE, settings,
+                                         request_log(), 'sub-1')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '10'
+
+
+def queued(tmp_path, count):
+    box = outbox.Outbox(str(tmp_path / 'outbox.sqlite3'))
+    for index in range(count):
+        box.enqueue(MESSAGE, f'sub-{index}')
+    return box
+
+
+def test_dispatch_holds_back_while_every_breaker_is_open(breakers, email_client, tmp_path):
+    trip(breakers.acs)
+    box = queued(tmp_path, 5)
+    sender = transport.EmailSender([transport.AcsTransport('stand-in')])
+    assert outbox.dispatch(box, sender, circuits=[breakers.acs]) == {'sent': 0, 'retried': 0, 'failed': 0}
+    assert box.counts() == {outbox.PENDING: 5}
+
+
+def test_dispatch_sends_only_the_probes_while_half_open(breakers, email_client, tmp_path):
+    trip(breakers.acs)
+    box = queued(tmp_path, 5)
+    sender = transport.EmailSender([transport.AcsTransport('stand-in')])
+    breakers.clock.advance(10)
+
+    assert outbox.dispatch(box, sender, circuits=[breakers.acs]) == {'sent': 1, 'retried': 0, 'failed': 0}
+    assert box.counts() == {outbox.SENT: 1, outbox.PENDING: 4}
+    # The probe succeeded, so the breaker closed and the next run drains the rest
+    assert breakers.acs.state == breaker.CLOSED
+    assert outbox.dispatch(box, sender, circuits=[breakers.acs])['sent'] == 4
+
+
+def test_refused_rows_keep_their_attempts(breakers, email_client, tmp_path):
+    trip(breakers.acs)
+    box = queued(tmp_path, 1)
+    sender = transport.EmailSender([transport.AcsTransport('stand-in')])
+    # No circuits passed, so the row is claimed and then refused by the sender
+    assert outbox.dispatch(box, sender) == {'sent': 0, 'retried': 1, 'failed': 0}
+    assert box.get('sub-0')['attempts'] == 0
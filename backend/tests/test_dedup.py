@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stand_ins import FakeClock, Fault
+from shared_code import contact, dedup
+from shared_code.request_log import RequestLog
+
+TTL = 300
+RESULT = dedup.DedupResult(200, {'message': 'Email sent successfully'}, 'sent')
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def index(request):
+    if request.param == 'memory':
+        return dedup.DedupIndex(TTL, dedup.MemoryBackend(), clock=FakeClock())
+    fakeredis = pytest.importorskip('fakeredis')
+    return dedup.DedupIndex(TTL, dedup.RedisBackend(client=fakeredis.FakeRedis(), poll_interval=0.01))
+
+
+def test_first_claim_processes_and_repeat_is_pending(index):
+    assert index.claim('key') is None
+    assert index.claim('key') == dedup.DedupEntry(True, None)
+    assert index.get_stats()['misses'] == 1
+    assert index.get_stats()['pending_hits'] == 1
+
+
+def test_completed_result_is_replayed(index):
+    index.claim('key')
+    index.complete('key', RESULT)
+    entry = index.claim('key')
+    assert entry == dedup.DedupEntry(False, RESULT)
+    assert tuple(entry.result) == tuple(RESULT)
+
+
+def test_release_frees_the_claim(index):
+    index.claim('key')
+    index.release('key')
+    assert index.claim('key') is None
+
+
+def test_release_keeps_a_stored_result(index):
+    index.claim('key')
+    index.complete('key', RESULT)
+    index.release('key')
+    assert index.claim('key').result == RESULT
+
+
+def test_waits_for_the_original_to_finish(index):
+    index.claim('key')
+    finish = threading.Timer(0.05, index.complete, ('key', RESULT))
+    finish.start()
+    try:
+        assert index.claim('key', wait_seconds=5) == dedup.DedupEntry(False, RESULT)
+    finally:
+        finish.cancel()
+
+
+def test_takes_over_when_the_original_releases(index):
+    index.claim('key')
+    release = threading.Timer(0.05, index.release, ('key',))
+    release.start()
+    try:
+        assert index.claim('key', wait_seconds=5) is None
+    finally:
+        release.cancel()
+    # The takeover holds the claim now
+    assert index.claim('key').pending
+
+
+def test_memory_result_expires_after_ttl():
+    clock = FakeClock()
+    index = dedup.DedupIndex(TTL, dedup.MemoryBackend(), clock=clock)
+    index.claim('key')
+    index.complete('key', RESULT)
+    clock.advance(TTL - 1)
+    assert index.claim('key').result == RESULT
+    clock.advance(1)
+    assert index.claim('key') is None
+
+
+def test_memory_abandoned_claim_expires():
+    clock = FakeClock()
+    index = dedup.DedupIndex(TTL, dedup.MemoryBackend(), clock=clock)
+    index.claim('key')
+    clock.advance(dedup.PENDING_TTL_SECONDS)
+    assert index.claim('key') is None
+
+
+def test_memory_backend_caps_entries():
+    backend = dedup.MemoryBackend(max_entries=2)
+    index = dedup.DedupIndex(TTL, backend, clock=FakeClock())
+    for key in ('a', 'b', 'c'):
+        index.claim(key)
+    assert len(backend) == 2
+    assert index.claim('a') is None
+
+
+def test_redis_entries_expire():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeRedis()
+    index = dedup.DedupIndex(TTL, dedup.RedisBackend(client=client, prefix='test:'))
+    index.claim('key')
+    assert 0 < client.ttl('test:key') <= dedup.PENDING_TTL_SECONDS
+    index.complete('key', RESULT)
+    assert dedup.PENDING_TTL_SECONDS < client.ttl('test:key') <= TTL
+
+
+class FailingBackend:
+    def __init__(self):
+        self.fault = Fault(error_rate=1.0)
+
+    def claim(self, key, now):
+        self.fault.apply('Redis')
+
+    def store(self, key, result, ttl, now):
+        self.fault.apply('Redis')
+
+    def release(self, key):
+        self.fault.apply('Redis')
+
+
+def test_backend_errors_fail_open():
+    index = dedup.DedupIndex(TTL, FailingBackend())
+    assert index.claim('key') is None
+    index.complete('key', RESULT)
+    index.release('key')
+    assert index.get_stats()['errors'] == 3
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    a = SimpleNamespace(email='A@Example.com', name='Jane  Doe', subject='Hi', message='Hello\n')
+    b = SimpleNamespace(email='a@example.com', name='jane doe', subject=' hi', message='hello')
+    assert dedup.fingerprint(a) == dedup.fingerprint(b)
+
+
+def submission():
+    return SimpleNamespace(email='jane@example.com', name='Jane', subject='Question', message=str(uuid.uuid4()))
+
+
+def request_log():
+    return RequestLog(logging.getLogger(__name__), SimpleNamespace(method='POST', headers={}))
+
+
+def test_repeat_in_flight_is_answered_at_once_by_default(configure):
+    settings = configure()
+    repeat = submission()
+    key, response = contact.check_duplicate(repeat, settings, request_log())
+    assert key is not None and response is None
+
+    started = time.monotonic()
+    _, response = contact.check_duplicate(repeat, settings, request_log())
+    assert response.status_code == 409
+    assert time.monotonic() - started < 0.5
+    contact.record_result(key, None, request_log())
+
+
+def test_wait_is_capped_at_the_send_timeout(configure):
+    settings = configure(DEDUP_WAIT_SECONDS=30, EMAIL_SEND_TIMEOUT_MS=100)
+    repeat = submission()
+    key, _ = contact.check_duplicate(repeat, settings, request_log())
+
+    started = time.monotonic()
+    _, response = contact.check_duplicate(repeat, settings, request_log())
+    assert response.status_code == 409
+    assert 0.1 <= time.monotonic() - started < 1.0
+    contact.record_result(key, None, request_log())
@@ -0,0 +1,108 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from shared_code import contact, digest, metrics, outbox
+from shared_code.payload import Submission
+from shared_code.request_log import RequestLog
+
+SENDER = 'DoNotReply@lawgate.in'
+RECIPIENTS = ('shishir@lawgate.in', 'office@lawgate.in')
+NOW = 1_000_000.0
+
+
+def values(index):
+    return {
+        'name': f'Client {index}', 'email': f'client{index}@example.com', 'phone': 'Not provided',
+        'company': 'Not provided', 'subject': f'Question {index}', 'message': 'Hello',
+        'submitted_on': 'January 01, 2026 at 10:00 AM', 'ip_address': '203.0.113.7',
+    }
+
+
+@pytest.fixture
+def buffer(tmp_path):
+    return digest.Digest(outbox.Outbox(str(tmp_path / 'outbox.sqlite3')))
+
+
+def fill(buffer, count, now=NOW):
+    return [buffer.add(values(index), f'sub-{index}', now=now + index) for index in range(count)]
+
+
+def flush(buffer, now, interval_seconds=300, max_submissions=20, recipients=RECIPIENTS):
+    return buffer.flush_due(SENDER, recipients, interval_seconds, max_submissions, now=now)
+
+
+def test_submissions_wait_in_the_buffer(buffer):
+    fill(buffer, 3)
+    assert flush(buffer, NOW + 60) == {'digests': 0, 'submissions': 0, 'messages': 0}
+    assert buffer.get('sub-0')['status'] == 'buffered'
+    assert buffer.stats()['buffered'] == 3
+    assert buffer.outbox.counts() == {}
+
+
+def test_partial_batch_is_flushed_after_the_interval(buffer):
+    fill(buffer, 3)
+    assert flush(buffer, NOW + 300) == {'digests': 1, 'submissions': 3, 'messages': 2}
+    assert buffer.get('sub-2')['status'] == 'batched'
+    # One message per recipient, queued for the dispatcher
+    assert buffer.outbox.counts() == {outbox.PENDING: 2}
+    message = buffer.outbox.claim(1)[0]['message']
+    assert message['content']['subject'] == 'Contact digest: 3 new submissions'
+    assert 'Client 0' in message['content']['plainText']
+
+
+def test_full_batches_are_flushed_at_once(buffer):
+    fill(buffer, 5)
+    assert flush(buffer, NOW + 5, max_submissions=2) == {'digests': 2, 'submissions': 4, 'messages': 4}
+    # The fifth waits for the interval or for a second submission
+    assert buffer.get('sub-4')['status'] == 'buffered'
+    assert flush(buffer, NOW + 5, max_submissions=2)['digests'] == 0
+
+
+def test_flush_is_a_noop_without_recipients(buffer):
+    fill(buffer, 3)
+    assert flush(buffer, NOW + 600, recipients=())['digests'] == 0
+    assert buffer.stats()['buffered'] == 3
+
+
+def test_api_calls_saved(buffer):
+    fill(buffer, 10)
+    flush(buffer, NOW + 300, max_submissions=5, recipients=RECIPIENTS[:1])
+    stats = buffer.stats()
+    assert stats == {'buffered': 0, 'digests': 2, 'submissions': 10, 'messages': 2, 'api_calls_saved': 8}
+
+
+def test_api_calls_saved_is_exported_as_a_gauge(monkeypatch, buffer):
+    monkeypatch.setattr(digest, '_digest', buffer)
+    fill(buffer, 4)
+    flush(buffer, NOW + 300, recipients=RECIPIENTS[:1])
+    assert digest._collect_stats()[('digest_api_calls_saved', ())] == 3
+    assert 'digest_api_calls_saved 3' in metrics.REGISTRY.prometheus()
+
+
+@pytest.mark.parametrize('spec, fields, expected', [
+    ('subject=urgent|injunction', {'subject': 'URGENT: hearing tomorrow'}, True),
+    ('subject=urgent|injunction', {'subject': 'Question'}, False),
+    ('company=acme;email=@bigclient\\.com$', {'email': 'gc@bigclient.com'}, True),
+    ('unknown=x;subject=[', {'subject': 'x'}, False),
+    ('', {'subject': 'urgent'}, False),
+])
+def test_priority_rules(spec, fields, expected):
+    submission = Submission(**{'name': 'Jane', 'email': 'jane@example.com', 'message': 'Hello', **fields})
+    assert digest.is_priority(submission, spec) is expected
+
+
+def request_log():
+    return RequestLog(logging.getLogger(__name__), SimpleNamespace(method='POST', headers={}))
+
+
+def test_priority_submissions_bypass_the_digest(configure):
+    settings = configure(EMAIL_DELIVERY_MODE='digest', DIGEST_PRIORITY_RULES='subject=urgent')
+    urgent = Submission(name='Jane', email='jane@example.com', subject='Urgent injunction', message='Hello')
+    routine = Submission(name='Jane', email='jane@example.com', subject='Question', message='Hello')
+    assert not contact.should_buffer(urgent, settings, request_log())
+    assert contact.should_buffer(routine, settings, request_log())
+
+    settings = configure(EMAIL_DELIVERY_MODE='sync')
+    assert not contact.should_buffer(routine, settings, request_log())
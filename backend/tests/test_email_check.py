@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import azure.functions as func
+import pytest
+
+from benchmarks.stand_ins import FakeClock, FakeResolver, Fault
+from shared_code import email_check
+
+DOMAINS = {
+    'example.com': email_check.MAIL,
+    'xn--bcher-kva.example': email_check.MAIL,
+    'null-mx.example': email_check.NO_MAIL,
+}
+
+
+def validator(resolver=None, **options):
+    options = {'cache_ttl': 3600, 'negative_ttl': 300, 'clock': FakeClock(), **options}
+    return email_check.EmailValidator(True, resolver or FakeResolver(DOMAINS), **options)
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('Jane.Doe@Example.COM', 'Jane.Doe@example.com'),
+    ('ana@Bücher.example', 'ana@xn--bcher-kva.example'),
+])
+def test_normalises_the_domain(address, expected):
+    assert email_check.normalize(address)[0] == expected
+
+
+@pytest.mark.parametrize('address, reason', [
+    ('no-at-sign', 'syntax'),
+    ('jane@localhost', 'syntax'),
+    ('jane..doe@example.com', 'syntax'),
+    ('x' * 65 + '@example.com', 'syntax'),
+    ('jane@' + '.'.join(letter * 63 for letter in 'abcd') + '.com', 'too_long'),
+])
+def test_rejects_malformed_addresses(address, reason):
+    result = email_check.EmailValidator().validate(address)
+    assert (result.valid, result.reason) == (False, reason)
+
+
+def test_no_lookup_without_the_domain_check():
+    resolver = FakeResolver(DOMAINS)
+    assert email_check.EmailValidator(False, resolver).validate('jane@unknown.example').valid
+    assert resolver.calls.value == 0
+
+
+def test_cache_hit_skips_the_resolver():
+    v = validator()
+    assert v.validate('jane@example.com').valid
+    assert v.validate('john@EXAMPLE.com').valid
+    assert v.resolver.calls.value == 1
+    assert v.get_stats() == {'hits': 1, 'misses': 1, 'errors': 0, 'size': 1}
+
+
+def test_cached_domain_is_looked_up_again_after_its_ttl():
+    v = validator()
+    v.validate('jane@example.com')
+    v.clock.advance(3599)
+    v.validate('jane@example.com')
+    assert v.resolver.calls.value == 1
+    v.clock.advance(1)
+    v.validate('jane@example.com')
+    assert v.resolver.calls.value == 2
+
+
+@pytest.mark.parametrize('address, status', [
+    ('jane@missing.example', email_check.NO_DOMAIN),
+    ('jane@null-mx.example', email_check.NO_MAIL),
+])
+def test_rejections_are_cached_for_the_negative_ttl(address, status):
+    v = validator()
+    assert v.validate(address) == email_check.ValidationResult(False, address, status, status)
+    v.clock.advance(299)
+    assert not v.validate(address).valid
+    assert v.resolver.calls.value == 1
+    # A domain that has since been set up is accepted once the entry expires
+    v.resolver.domains[address.split('@')[1]] = email_check.MAIL
+    v.clock.advance(1)
+    assert v.validate(address).valid
+
+
+def test_resolver_timeout_lets_the_address_through():
+    resolver = FakeResolver(DOMAINS, Fault(latency_ms=20, error_rate=1.0))
+    v = validator(resolver)
+    result = v.validate('jane@example.com')
+    assert result.valid
+    assert result.domain_status == email_check.UNKNOWN
+    assert v.get_stats()['errors'] == 1
+
+
+def test_failed_lookup_is_retried_after_the_error_ttl():
+    resolver = FakeResolver(DOMAINS, Fault(error_rate=1.0))
+    v = validator(resolver)
+    v.validate('jane@example.com')
+    resolver.fault.error_rate = 0.0
+    v.clock.advance(email_check.ERROR_TTL_SECONDS - 1)
+    assert v.validate('jane@example.com').domain_status == email_check.UNKNOWN
+    v.clock.advance(1)
+    assert v.validate('jane@example.com').domain_status == email_check.MAIL
+
+
+def test_cache_evicts_the_least_recently_used_domain():
+    v = validator(cache_max_entries=2)
+    for domain in ('example.com', 'null-mx.example', 'example.com', 'missing.example'):
+        v.validate(f'jane@{domain}')
+    assert v.get_stats()['size'] == 2
+    v.validate('jane@null-mx.example')
+    assert v.resolver.calls.value == 4
+
+
+def test_validate_async_shares_the_cache():
+    v = validator()
+
+    async def run():
+        first = await v.validate_async('jane@missing.example')
+        second = await v.validate_async('jane@missing.example')
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not first.valid and not second.valid
+    assert v.resolver.calls.value == 1
+
+
+def post(body):
+    return func.HttpRequest(method='POST', url='http://localhost:7071/api/contact_form_azure_native',
+                            headers={'X-Forwarded-For': '203.0.113.7'}, body=json.dumps(body).encode('utf-8'))
+
+
+@pytest.fixture
+def native(configure, monkeypatch):
+    import contact_form_azure_native
+
+    configure(EMAIL_DOMAIN_CHECK='true', RATE_LIMIT_MAX=100, SUBMISSION_LOG='false', PROFILE_SAMPLE_RATE=0)
+    v = validator()
+    monkeypatch.setattr(email_check, 'get_validator', lambda: v)
+    return contact_form_azure_native.main, v.resolver
+
+
+def test_native_honeypot_is_checked_before_the_required_fields(native):
+    main, resolver = native
+    response = main(post({'email': 'jane@missing.example', 'website': 'https://spam.example'}))
+    assert response.status_code == 200
+    assert resolver.calls.value == 0
+
+
+def test_native_spam_is_rejected_before_the_domain_lookup(native):
+    main, resolver = native
+    links = ' '.join(f'https://spam{n}.example' for n in range(10))
+    response = main(post({'name': 'Jane', 'email': 'jane@example.com', 'message': f'Buy now {links}'}))
+    assert response.status_code == 400
+    assert 'spam' in json.loads(response.get_body())['error']
+    assert resolver.calls.value == 0
+
+
+def test_native_checks_the_domain_after_the_required_fields(native):
+    main, resolver = native
+    assert main(post({'email': 'jane@example.com', 'message': 'Hello'})).status_code == 400
+    assert resolver.calls.value == 0
+    response = main(post({'name': 'Jane', 'email': 'jane@missing.example', 'message': 'Hello'}))
+    assert json.loads(response.get_body()) == {'error': 'Invalid email address'}
+    assert resolver.calls.value == 1
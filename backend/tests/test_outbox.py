@@ -0,0 +1,145 @@
+import pytest
+
+from benchmarks.stand_ins import FakeClock, FakeEmailClient, Fault
+from shared_code import breaker, outbox, transport
+
+MESSAGE = {
+    'senderAddress': 'DoNotReply@lawgate.in',
+    'recipients': {'to': [{'address': 'shishir@lawgate.in'}]},
+    'content': {'subject': 'Contact', 'plainText': 'Hello', 'html': '<p>Hello</p>'},
+    'replyTo': [{'address': 'jane@example.com'}],
+}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def box(tmp_path, clock):
+    return outbox.Outbox(str(tmp_path / 'outbox.sqlite3'), clock=clock)
+
+
+@pytest.fixture(autouse=True)
+def no_breakers(monkeypatch):
+    monkeypatch.setattr(breaker, 'get_breaker', lambda name: None)
+
+
+def sender(monkeypatch, client):
+    monkeypatch.setattr(transport, 'get_email_client', lambda _: client)
+    return transport.EmailSender([transport.AcsTransport('stand-in')])
+
+
+def test_claim_leases_due_rows_once(box):
+    for index in range(3):
+        box.enqueue(MESSAGE, f'sub-{index}')
+
+    claimed = box.claim(2)
+    assert [item['id'] for item in claimed] == ['sub-0', 'sub-1']
+    assert claimed[0]['message'] == MESSAGE
+    assert claimed[0]['attempts'] == 1
+    # Leased rows aren't handed to a second dispatcher
+    assert [item['id'] for item in box.claim(10)] == ['sub-2']
+    assert box.claim(10) == []
+    assert box.counts() == {outbox.SENDING: 3}
+
+
+def test_expired_lease_is_claimed_again(box, clock):
+    box.enqueue(MESSAGE, 'sub-1')
+    box.claim(1, lease_seconds=60)
+
+    clock.advance(59)
+    assert box.claim(1) == []
+    clock.advance(2)
+    reclaimed = box.claim(1)
+    assert [item['id'] for item in reclaimed] == ['sub-1']
+    assert reclaimed[0]['attempts'] == 2
+
+
+def test_failed_send_backs_off_exponentially(monkeypatch, box, clock):
+    email_sender = sender(monkeypatch, FakeEmailClient(send_fault=Fault(error_rate=1.0)))
+    box.enqueue(MESSAGE, 'sub-1')
+
+    for attempt, backoff in enumerate((30, 60, 120), start=1):
+        assert outbox.dispatch(box, email_sender, backoff_seconds=30) == {'sent': 0, 'retried': 1, 'failed': 0}
+        assert box.get('sub-1')['attempts'] == attempt
+        clock.advance(backoff - 1)
+        # Not due yet
+        assert outbox.dispatch(box, email_sender, backoff_seconds=30)['retried'] == 0
+        clock.advance(1)
+
+
+def test_row_fails_after_max_attempts(monkeypatch, box, clock):
+    email_sender = sender(monkeypatch, FakeEmailClient(send_fault=Fault(error_rate=1.0)))
+    box.enqueue(MESSAGE, 'sub-1')
+
+    outbox.dispatch(box, email_sender, max_attempts=2, backoff_seconds=0)
+    assert outbox.dispatch(box, email_sender, max_attempts=2, backoff_seconds=0) == \
+        {'sent': 0, 'retried': 0, 'failed': 1}
+    state = box.get('sub-1')
+    assert state['status'] == outbox.FAILED
+    assert state['last_error'] == 'TransportError: acs: Injected ACS send failure'
+
+
+def test_release_returns_the_attempt(box, clock):
+    box.enqueue(MESSAGE, 'sub-1')
+    box.claim(1)
+    box.release('sub-1', clock() + 10, 'CircuitOpen: acs')
+
+    state = box.get('sub-1')
+    assert state['status'] == outbox.PENDING
+    assert state['attempts'] == 0
+    assert box.claim(1) == []
+    clock.advance(10)
+    assert box.claim(1)[0]['attempts'] == 1
+
+
+def test_dispatch_marks_sent(monkeypatch, box):
+    client = FakeEmailClient()
+    box.enqueue(MESSAGE, 'sub-1')
+    assert outbox.dispatch(box, sender(monkeypatch, client)) == {'sent': 1, 'retried': 0, 'failed': 0}
+    state = box.get('sub-1')
+    assert state['status'] == outbox.SENT
+    assert state['operation_status'] == 'Succeeded'
+    # The submission id is the ACS operation id
+    assert client.operations == {'sub-1'}
+
+
+@pytest.mark.parametrize('mode', ['wal', 'delete'])
+def test_journal_mode_follows_the_setting(configure, tmp_path, mode):
+    configure(SQLITE_JOURNAL_MODE=mode)
+    box = outbox.Outbox(str(tmp_path / 'outbox.sqlite3'))
+    with outbox.connect(box.path) as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == mode
+
+
+def test_backlog_check_never_creates_the_database(tmp_path):
+    path = tmp_path / 'outbox.sqlite3'
+    assert not outbox.has_backlog(str(path))
+    assert not path.exists()
+
+
+def test_backlog_is_undelivered_rows(monkeypatch, box):
+    assert not outbox.has_backlog(box.path)
+    box.enqueue(MESSAGE, 'sub-1')
+    assert outbox.has_backlog(box.path)
+    outbox.dispatch(box, sender(monkeypatch, FakeEmailClient()))
+    assert not outbox.has_backlog(box.path)
+
+
+def test_dispatcher_leaves_the_outbox_alone_in_sync_mode(configure, monkeypatch, tmp_path):
+    import outbox_dispatcher
+
+    path = tmp_path / 'outbox.sqlite3'
+    configure(OUTBOX_DB_PATH=path, AZURE_COMMUNICATION_CONNECTION_STRING='endpoint=https://x/;accesskey=eA==')
+    dispatched = []
+    monkeypatch.setattr(outbox, 'dispatch', lambda *args, **kwargs: dispatched.append(args) or {})
+    outbox_dispatcher.main(None)
+    assert not path.exists()
+    assert dispatched == []
+
+    # A message queued while the breakers were open is delivered
+    outbox.Outbox(str(path)).enqueue(MESSAGE, 'sub-1')
+    outbox_dispatcher.main(None)
+    assert len(dispatched) == 1
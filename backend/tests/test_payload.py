@@ -0,0 +1,96 @@
+import json
+
+import azure.functions as func
+import pytest
+
+from shared_code import payload
+
+BODY = {
+    'name': ' Jane Doe ', 'email': 'jane@example.com', 'subject': 'Question',
+    'message': 'Hello', 'recaptchaToken': 'token', 'website': '', 'submissionTime': 12000,
+}
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def parser(request, monkeypatch):
+    """Run each test with orjson (when installed) and with the stdlib fallback"""
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+        monkeypatch.setattr(payload, '_orjson_loaded', False)
+    else:
+        monkeypatch.setattr(payload, 'orjson', None)
+        monkeypatch.setattr(payload, '_orjson_loaded', True)
+    return request.param
+
+
+def encode(values):
+    return json.dumps(values).encode('utf-8')
+
+
+def test_decodes_and_strips_fields(parser):
+    submission = payload.decode(encode(BODY), max_bytes=4096)
+    assert submission.name == 'Jane Doe'
+    assert submission.recaptcha_token == 'token'
+    assert submission.elapsed_ms == 12000.0
+    assert submission.phone == ''
+
+
+def test_body_over_the_limit_is_rejected_before_parsing(parser):
+    body = b'{' + b' ' * 100
+    with pytest.raises(payload.BodyTooLarge) as error:
+        payload.decode(body, max_bytes=100)
+    assert error.value.status_code == 413
+    assert error.value.size == 101
+
+
+def test_limit_comes_from_max_body_bytes(configure, parser):
+    configure(MAX_BODY_BYTES=64)
+    with pytest.raises(payload.BodyTooLarge):
+        payload.decode(encode({**BODY, 'message': 'x' * 100}))
+
+
+def test_long_field_is_rejected(parser):
+    with pytest.raises(payload.FieldTooLong) as error:
+        payload.decode(encode({**BODY, 'name': 'x' * 201}), max_bytes=4096)
+    assert error.value.field == 'name'
+
+
+@pytest.mark.parametrize('body', [
+    b'{"name": "\xff\xfe", "email": "jane@example.com", "message": "Hello"}',
+    b'name=Jane&email=jane%40example.com&message=Hello',
+    b'{"name": "Jane",',
+])
+def test_undecodable_body_raises_value_error(parser, body):
+    with pytest.raises(ValueError):
+        payload.decode(body, max_bytes=4096)
+
+
+@pytest.mark.parametrize('body', [b'[]', b'"text"', b'42', b'null'])
+def test_non_object_json_is_rejected(parser, body):
+    with pytest.raises(payload.PayloadError):
+        payload.decode(body, max_bytes=4096)
+
+
+def test_non_string_field_is_rejected(parser):
+    with pytest.raises(payload.PayloadError):
+        payload.decode(encode({**BODY, 'name': ['Jane']}), max_bytes=4096)
+
+
+def test_empty_body_is_an_empty_submission(parser):
+    assert payload.decode(b'  ', max_bytes=4096) == payload.Submission()
+
+
+@pytest.mark.parametrize('body, content_type, status', [
+    (b'\xff' * 10, 'application/json', 400),
+    (b'name=Jane&email=jane%40example.com&message=Hello', 'application/x-www-form-urlencoded', 400),
+    (b'[1, 2]', 'application/json', 400),
+    (b'{"message": "' + b'x' * 40000 + b'"}', 'application/json', 413),
+])
+def test_contact_form_answers_bad_bodies_with_4xx(configure, body, content_type, status):
+    import contact_form
+
+    configure(RATE_LIMIT_MAX=1000, SUBMISSION_LOG='false')
+    req = func.HttpRequest('POST', '/api/contact', headers={'Content-Type': content_type}, body=body)
+    response = contact_form.main(req)
+    assert response.status_code == status
+    assert json.loads(response.get_body())['success'] is False
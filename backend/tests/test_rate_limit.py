@@ -0,0 +1,122 @@
+import pytest
+
+from benchmarks.stand_ins import FakeClock, Fault
+from shared_code import rate_limit
+
+WINDOW = 60
+# Start of a fixed window, so the clock's offset into it is exact
+START = 600_000.0
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    if request.param == 'memory':
+        return rate_limit.MemoryBackend()
+    fakeredis = pytest.importorskip('fakeredis', reason='fakeredis[lua] runs the Redis script')
+    pytest.importorskip('lupa', reason='fakeredis needs lupa for Lua scripts')
+    return rate_limit.RedisBackend(client=fakeredis.FakeRedis())
+
+
+def limiter(backend, limit=3):
+    return rate_limit.RateLimiter(limit, WINDOW, backend, clock=FakeClock(START))
+
+
+def test_allows_up_to_the_limit(backend):
+    rate = limiter(backend)
+    assert [rate.hit('1.2.3.4').remaining for _ in range(3)] == [2, 1, 0]
+
+    result = rate.hit('1.2.3.4')
+    assert not result.allowed
+    assert result.retry_after == WINDOW
+
+
+def test_keys_are_independent(backend):
+    rate = limiter(backend, limit=1)
+    assert rate.hit('1.2.3.4').allowed
+    assert rate.hit('5.6.7.8').allowed
+    assert not rate.hit('1.2.3.4').allowed
+
+
+def test_previous_window_is_weighted_by_its_overlap(backend):
+    rate = limiter(backend)
+    for _ in range(3):
+        rate.hit('1.2.3.4')
+
+    # Start of the next window: the previous three still count in full
+    rate.clock.advance(WINDOW)
+    result = rate.hit('1.2.3.4')
+    assert not result.allowed
+    assert result.retry_after == 1
+
+    # Half way through they count as 1.5, leaving room for two more
+    rate.clock.advance(WINDOW / 2)
+    assert [rate.hit('1.2.3.4').allowed for _ in range(3)] == [True, True, False]
+
+
+def test_counts_expire_after_two_windows(backend):
+    rate = limiter(backend)
+    for _ in range(4):
+        rate.hit('1.2.3.4')
+    rate.clock.advance(2 * WINDOW)
+    assert rate.hit('1.2.3.4').remaining == 2
+
+
+def test_rejected_hits_are_not_counted(backend):
+    rate = limiter(backend, limit=1)
+    for _ in range(5):
+        rate.hit('1.2.3.4')
+    rate.clock.advance(WINDOW + WINDOW / 2)
+    # Only the one allowed hit carries over, weighted by half
+    assert rate.hit('1.2.3.4').allowed
+
+
+def test_redis_script_sets_an_expiry():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeRedis()
+    limiter(rate_limit.RedisBackend(client=client, prefix='test:')).hit('1.2.3.4')
+    key = f'test:1.2.3.4:{int(START // WINDOW)}'
+    assert int(client.get(key)) == 1
+    assert 0 < client.ttl(key) <= 2 * WINDOW
+
+
+def test_memory_backend_evicts_least_recently_used_keys():
+    backend = rate_limit.MemoryBackend(max_keys=2)
+    rate = limiter(backend, limit=1)
+    for key in ('a', 'b', 'a', 'c'):
+        rate.hit(key)
+    assert len(backend) == 2
+    # 'b' was the least recently used, so it starts over
+    assert rate.hit('b').allowed
+    assert not rate.hit('c').allowed
+
+
+def test_memory_backend_drops_expired_keys():
+    backend = rate_limit.MemoryBackend()
+    rate = limiter(backend)
+    rate.hit('a')
+    rate.clock.advance(2 * WINDOW)
+    rate.hit('b')
+    assert len(backend) == 1
+
+
+class FailingBackend:
+    def __init__(self):
+        self.fault = Fault(error_rate=1.0)
+
+    def hit(self, key, limit, window, now):
+        self.fault.apply('Redis')
+
+
+def test_backend_errors_allow_the_request():
+    result = limiter(FailingBackend()).hit('1.2.3.4')
+    assert result.allowed
+    assert result.remaining == 3
+
+
+def test_bad_redis_url_fails_open(configure):
+    pytest.importorskip('redis')
+    configure(RATE_LIMIT_BACKEND='redis', RATE_LIMIT_REDIS_URL='not-a-redis-url', RATE_LIMIT_MAX=1)
+    rate = rate_limit.get_rate_limiter()
+    assert isinstance(rate.backend, rate_limit.UnavailableBackend)
+    assert all(rate.hit('1.2.3.4').allowed for _ in range(3))
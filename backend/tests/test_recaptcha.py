@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stand_ins import FakeAsyncSiteverifySession, FakeSiteverifySession, Fault
+from shared_code import breaker, contact, recaptcha
+from shared_code.request_log import RequestLog
+
+
+@pytest.fixture(autouse=True)
+def no_breaker(monkeypatch):
+    monkeypatch.setattr(breaker, 'get_breaker', lambda name: None)
+
+
+def verifier(fault=None, budget_ms=100):
+    session = FakeSiteverifySession(fault)
+    async_session = FakeAsyncSiteverifySession(fault)
+    return recaptcha.RecaptchaVerifier(budget_ms=budget_ms, session_factory=lambda: session,
+                                       async_session_factory=lambda: async_session), session
+
+
+def test_verdicts_are_cached():
+    v, session = verifier()
+    assert v.verify('token', 'secret').passed
+    assert v.verify('token', 'secret').cached
+    assert not v.verify('fail-token', 'secret').passed
+    assert v.verify('fail-token', 'secret').cached
+    assert session.calls.value == 2
+
+
+def test_slow_siteverify_is_cut_off_at_the_budget():
+    v, session = verifier(Fault(latency_ms=500), budget_ms=100)
+    started = time.perf_counter()
+    result = v.verify('token', 'secret')
+    assert time.perf_counter() - started < 0.3
+    assert result.error_codes == (recaptcha.BUDGET_EXCEEDED,)
+    assert v.get_stats()['timeouts'] == 1
+    # Not a verdict on the token, so not cached
+    assert not v.verify('token', 'secret').cached
+
+
+def test_async_slow_siteverify_is_cut_off_at_the_budget():
+    v, _ = verifier(Fault(latency_ms=500), budget_ms=100)
+    result = asyncio.run(v.verify_async('token', 'secret'))
+    assert result.error_codes == (recaptcha.BUDGET_EXCEEDED,)
+
+
+def test_failed_request_has_no_verdict():
+    v, _ = verifier(Fault(error_rate=1.0))
+    result = v.verify('token', 'secret')
+    assert (result.passed, result.error_codes) == (False, (recaptcha.REQUEST_FAILED,))
+    assert v.get_stats()['errors'] == 1
+
+
+def check(verification, policy):
+    log = RequestLog(logging.getLogger(__name__), SimpleNamespace(method='POST', headers={}))
+    return contact.check_verification(verification, SimpleNamespace(recaptcha_breaker_policy=policy), log)
+
+
+@pytest.mark.parametrize('code', recaptcha.NO_VERDICT)
+def test_no_verdict_follows_the_breaker_policy(code):
+    verification = recaptcha.VerificationResult(False, False, None, None, None, (code,), False)
+    assert check(verification, 'local') is None
+    response = check(verification, 'fail_closed')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_rejected_token_is_a_400_whatever_the_policy():
+    v, _ = verifier()
+    verification = v.verify('fail-token', 'secret')
+    assert check(verification, 'local').status_code == 400
+    assert check(verification, 'fail_closed').status_code == 400
+
+
+def test_rebuilt_verifier_shuts_down_the_previous_executor(configure):
+    configure(RECAPTCHA_BUDGET_MS=1500)
+    previous = recaptcha.get_verifier()
+    configure(RECAPTCHA_BUDGET_MS=1000)
+    assert recaptcha.get_verifier() is not previous
+    with pytest.raises(RuntimeError):
+        previous._executor.submit(int)
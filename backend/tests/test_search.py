@@ -0,0 +1,12 @@
+from shared_code import search
+
+
+def test_rebuilt_searcher_unmaps_the_previous_index(configure):
+    configure(SEARCH_BM25_K1=1.2)
+    previous = search.get_searcher()
+    assert previous is not None
+    configure(SEARCH_BM25_K1=1.5)
+    current = search.get_searcher()
+    assert current is not previous
+    assert previous.index._map.closed
+    assert not current.index._map.closed
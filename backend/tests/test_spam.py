@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stand_ins import FakeClock
+from shared_code import contact, spam
+from shared_code.payload import Submission
+from shared_code.request_log import RequestLog
+
+
+def submission(**fields):
+    values = {
+        'name': 'Jane Doe', 'email': 'jane@example.com', 'subject': 'Property dispute',
+        'message': 'I would like advice on a boundary dispute with my neighbour.', 'elapsed_ms': 25000.0,
+    }
+    return Submission(**{**values, **fields})
+
+
+@pytest.fixture(scope='module')
+def rules():
+    return spam.SpamRules.load(spam.DEFAULT_RULES_PATH)
+
+
+def test_genuine_submission_passes(rules):
+    verdict = rules.score(submission())
+    assert not verdict.spam
+    assert verdict.reasons == ()
+
+
+@pytest.mark.parametrize('fields, reason', [
+    ({'honeypot': 'http://spam.example'}, 'honeypot'),
+    ({'elapsed_ms': 800.0}, 'too_fast'),
+    ({'name': 'Visit www.spam.example'}, 'link_in_name'),
+    ({'message': '[url=http://x.example]x[/url]'}, 'bbcode_link'),
+    ({'message': '<a href="http://x.example">x</a>'}, 'html_link'),
+])
+def test_single_rule_is_enough(rules, fields, reason):
+    verdict = rules.score(submission(**fields))
+    assert verdict.spam
+    assert reason in verdict.reasons
+
+
+def test_links_count_beyond_the_allowance(rules):
+    links = ' '.join(f'https://example.com/{index}' for index in range(6))
+    assert 'link' not in rules.score(submission(message='https://a.example https://b.example')).reasons
+    verdict = rules.score(submission(message=links))
+    assert verdict.reasons == ('link',)
+    assert verdict.score == 1.0
+    assert verdict.spam
+
+
+def test_phrases_match_whole_words_in_any_case(rules):
+    assert rules.score(submission(message='We offer SEO Services and Link Building.')).score == 0.8
+    # "casino" inside a longer word isn't the phrase
+    assert 'phrase' not in rules.score(submission(message='The casinos district lease')).reasons
+    assert not rules.score(submission(message='Click here for Guest Post offers')).spam
+    assert rules.score(submission(message='Click here for guest post backlinks')).spam
+
+
+def test_disposable_domain_includes_subdomains(rules):
+    assert rules.is_disposable('x@mailinator.com')
+    assert rules.is_disposable('x@eu.mailinator.com')
+    assert not rules.is_disposable('x@notmailinator.com')
+    verdict = rules.score(submission(email='x@yopmail.com'))
+    assert verdict.reasons == ('disposable_domain',)
+    assert not verdict.spam
+
+
+def test_bot_signals_are_silent_and_content_is_not(rules):
+    assert rules.score(submission(honeypot='x')).silent
+    assert rules.score(submission(elapsed_ms=100.0, message='casino backlinks')).silent
+    assert not rules.score(submission(message='casino backlinks viagra')).silent
+
+
+def request_log():
+    return RequestLog(logging.getLogger(__name__), SimpleNamespace(method='POST', headers={}))
+
+
+def test_bot_gets_a_fake_success_and_content_a_400(configure):
+    configure(SPAM_FILTER='true')
+    silent = contact.check_spam(submission(honeypot='x'), request_log())
+    assert silent.status_code == 200
+    assert json.loads(silent.get_body())['success'] is True
+
+    rejected = contact.check_spam(submission(message='casino backlinks viagra'), request_log())
+    assert rejected.status_code == 400
+    assert json.loads(rejected.get_body())['success'] is False
+
+    assert contact.check_spam(submission(), request_log()) is None
+
+
+def test_filter_can_be_turned_off(configure):
+    configure(SPAM_FILTER='false')
+    assert contact.check_spam(submission(honeypot='x'), request_log()) is None
+
+
+def write_rules(path, mtime_ns, **spec):
+    path.write_text(json.dumps({'threshold': 1.0, **spec}), encoding='utf-8')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_rules_are_reloaded_when_the_file_changes(tmp_path):
+    path = tmp_path / 'rules.json'
+    write_rules(path, 1_000_000_000, phrases=[])
+    clock = FakeClock()
+    spam_filter = spam.SpamFilter(str(path), reload_seconds=5, clock=clock)
+    assert not spam_filter.check(submission(message='cheap widgets')).spam
+
+    write_rules(path, 2_000_000_000, phrases=['cheap widgets'], weights={'phrase': 1.0})
+    # Not re-checked until the reload interval has passed
+    clock.advance(4)
+    assert not spam_filter.check(submission(message='cheap widgets')).spam
+    clock.advance(1)
+    assert spam_filter.check(submission(message='cheap widgets')).spam
+    assert spam_filter.reloads == 1
+
+
+def test_unparseable_rules_keep_the_previous_ones(tmp_path):
+    path = tmp_path / 'rules.json'
+    write_rules(path, 1_000_000_000, phrases=['cheap widgets'], weights={'phrase': 1.0})
+    clock = FakeClock()
+    spam_filter = spam.SpamFilter(str(path), reload_seconds=5, clock=clock)
+
+    path.write_text('{not json', encoding='utf-8')
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    clock.advance(5)
+    assert spam_filter.check(submission(message='cheap widgets')).spam
+    assert spam_filter.reloads == 0
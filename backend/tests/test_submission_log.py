@@ -0,0 +1,119 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import manage_submissions
+from benchmarks.stand_ins import FakeEmailClient, Fault
+from shared_code import breaker, submission_log, transport
+
+VALUES = {
+    'name': 'Jane Doe', 'email': 'jane@example.com', 'phone': '', 'company': '',
+    'subject': 'Question', 'message': 'Hello there', 'client_ip': '203.0.113.7',
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'submissions.sqlite3')
+
+
+def received(entries, submission_id, now=None):
+    entries.append(submission_id, submission_log.RECEIVED, {'values': VALUES, 'subject': 'New Contact: Question'},
+                   email=VALUES['email'], now=now)
+
+
+def test_log_is_off_by_default(configure):
+    configure()
+    assert submission_log.get_log() is None
+
+
+def test_entries_are_written_and_read_back(path):
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=5)
+    received(entries, 'a')
+    received(entries, 'b')
+    entries.append('a', submission_log.DELIVERED, {'provider': 'acs', 'message_id': 'a'})
+    assert entries.close()
+
+    rows = {row['submission_id']: row for row in submission_log.SubmissionLog(path).query()}
+    assert rows['a']['status'] == submission_log.DELIVERED
+    assert rows['b']['status'] == submission_log.RECEIVED
+    assert rows['b']['values'] == VALUES
+    assert [entry['kind'] for entry in entries.history('a')] == ['received', 'delivered']
+    assert [row['submission_id'] for row in entries.query(email='JANE@example.com', undelivered=True)] == ['b']
+
+
+def test_entries_are_committed_in_batches(path):
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=1000, batch_size=10)
+    started = time.monotonic()
+    for index in range(30):
+        received(entries, str(index))
+    # Full batches don't wait for the flush interval
+    assert entries.flush(timeout=5.0)
+    assert time.monotonic() - started < 1.0
+    stats = entries.get_stats()
+    assert stats['committed'] == 30
+    assert stats['batches'] <= 4
+    entries.close()
+
+
+def test_purge_deletes_every_entry_of_old_submissions(path):
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=5)
+    received(entries, 'old', now=1000.0)
+    entries.append('old', submission_log.DELIVERED, {'provider': 'acs'}, now=time.time())
+    received(entries, 'new')
+    entries.close()
+
+    assert entries.purge(before=time.time() - 60) == 2
+    assert [row['submission_id'] for row in entries.query()] == ['new']
+    assert entries.history('old') == []
+
+
+def test_writer_purges_past_the_retention(path):
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=5, retention_days=1)
+    received(entries, 'old', now=time.time() - 2 * 86400)
+    received(entries, 'new')
+    entries.close()
+    assert [row['submission_id'] for row in entries.query()] == ['new']
+
+
+def test_replay_sends_undelivered_submissions_once(configure, monkeypatch, path):
+    configure(LAWGATE_EMAIL='office@lawgate.in', AZURE_SENDER_EMAIL='DoNotReply@lawgate.in')
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=5)
+    received(entries, 'delivered')
+    entries.append('delivered', submission_log.DELIVERED, {'provider': 'acs'})
+    received(entries, 'failed')
+    entries.append('failed', submission_log.FAILED, {'error': 'timeout'})
+    received(entries, 'lost')
+    entries.close()
+
+    client = FakeEmailClient()
+    monkeypatch.setattr(transport, 'get_email_client', lambda _: client)
+    monkeypatch.setattr(breaker, 'get_breaker', lambda name: None)
+    monkeypatch.setattr(transport, 'is_configured', lambda settings: True)
+    monkeypatch.setattr(transport, 'get_sender', lambda: transport.EmailSender([transport.AcsTransport('stand-in')]))
+    args = SimpleNamespace(path=path, older_than=0, limit=None, concurrency=2, dry_run=False)
+
+    assert manage_submissions.replay(args) == 0
+    assert client.operations == {'failed', 'lost'}
+    assert list(submission_log.SubmissionLog(path).query(undelivered=True)) == []
+    # Nothing is left to send the second time
+    assert manage_submissions.replay(args) == 0
+    assert client.sent.value == 2
+
+
+def test_replay_records_a_failed_send(configure, monkeypatch, path):
+    configure(LAWGATE_EMAIL='office@lawgate.in', AZURE_SENDER_EMAIL='DoNotReply@lawgate.in')
+    entries = submission_log.SubmissionLog(path, flush_interval_ms=5)
+    received(entries, 'lost')
+    entries.close()
+
+    client = FakeEmailClient(send_fault=Fault(error_rate=1.0))
+    monkeypatch.setattr(transport, 'get_email_client', lambda _: client)
+    monkeypatch.setattr(breaker, 'get_breaker', lambda name: None)
+    monkeypatch.setattr(transport, 'is_configured', lambda settings: True)
+    monkeypatch.setattr(transport, 'get_sender', lambda: transport.EmailSender([transport.AcsTransport('stand-in')]))
+    args = SimpleNamespace(path=path, older_than=0, limit=None, concurrency=1, dry_run=False)
+
+    assert manage_submissions.replay(args) == 1
+    assert [row['status'] for row in submission_log.SubmissionLog(path).query()] == [submission_log.FAILED]
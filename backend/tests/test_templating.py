@@ -0,0 +1,52 @@
+import pytest
+
+from shared_code.digest import render_digest
+from shared_code.templating import CONTACT_EMAIL, Template
+
+SCRIPT = '<script>alert("x")</script>'
+ESCAPED = '&lt;script&gt;alert(&quot;x&quot;)&lt;/script&gt;'
+
+VALUES = {
+    'name': SCRIPT,
+    'email': 'jane@example.com',
+    'phone': 'Not provided',
+    'company': 'Not provided',
+    'subject': SCRIPT,
+    'message': SCRIPT,
+    'submitted_on': 'January 01, 2026 at 10:00 AM',
+    'ip_address': '203.0.113.7',
+}
+
+
+@pytest.mark.parametrize('field', ['name', 'subject', 'message'])
+def test_contact_email_escapes_each_field(field):
+    values = {**VALUES, 'name': 'Jane', 'subject': 'Question', 'message': 'Hello', field: SCRIPT}
+    rendered = CONTACT_EMAIL.render(values)
+    assert '<script>' not in rendered.html
+    assert ESCAPED in rendered.html
+    # The plain-text part isn't HTML, so it keeps the value as typed
+    assert SCRIPT in rendered.text
+
+
+def test_digest_escapes_every_entry():
+    rendered = render_digest([VALUES, {**VALUES, 'name': 'Jane'}])
+    assert '<script>' not in rendered.html
+    assert rendered.html.count(ESCAPED) == 5
+
+
+def test_value_containing_the_separator_is_still_escaped():
+    rendered = CONTACT_EMAIL.render({**VALUES, 'message': f'\x00{SCRIPT}'})
+    assert '<script>' not in rendered.html
+    assert ESCAPED in rendered.html
+
+
+def test_quotes_in_an_attribute_are_escaped():
+    rendered = CONTACT_EMAIL.render({**VALUES, 'email': '"><script>@example.com'})
+    assert 'href="mailto:&quot;&gt;&lt;script&gt;@example.com"' in rendered.html
+
+
+def test_fragments_are_inserted_unescaped():
+    template = Template('<div>{{ title }}</div><div>{{ body }}</div>')
+    rendered = template.render({'title': SCRIPT}, fragments={'body': CONTACT_EMAIL.render(VALUES)})
+    assert rendered.html.startswith(f'<div>{ESCAPED}</div>')
+    assert '<strong>Name:</strong>' in rendered.html
@@ -0,0 +1,238 @@
+import asyncio
+import time
+
+import pytest
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+
+from benchmarks.stand_ins import FakeAsyncEmailClient, FakeEmailClient, Fault, fake_sendgrid_client
+from shared_code import breaker, transport
+from shared_code.clients import ACS_API_VERSION
+
+MESSAGE = {
+    'senderAddress': 'DoNotReply@lawgate.in',
+    'recipients': {'to': [{'address': 'shishir@lawgate.in'}]},
+    'content': {'subject': 'Contact', 'plainText': 'Hello', 'html': '<p>Hello</p>'},
+    'replyTo': [{'address': 'jane@example.com'}],
+}
+
+
+class LostResponseClient(FakeEmailClient):
+    """ACS that answers too late: the send raises after it was (or wasn't) accepted"""
+
+    def __init__(self, accept, **faults):
+        super().__init__(**faults)
+        self.accept = accept
+
+    def begin_send(self, message, operation_id=None, **kwargs):
+        if self.accept:
+            self.operations.add(operation_id)
+        raise ServiceResponseError('Read timed out')
+
+
+@pytest.fixture(autouse=True)
+def no_breakers(monkeypatch):
+    monkeypatch.setattr(breaker, 'get_breaker', lambda name: None)
+
+
+@pytest.fixture
+def sendgrid(monkeypatch):
+    client = fake_sendgrid_client()
+    monkeypatch.setattr('sendgrid.SendGridAPIClient', client)
+    return client
+
+
+def use(monkeypatch, client):
+    monkeypatch.setattr(transport, 'get_email_client', lambda _: client)
+    return client
+
+
+def sender():
+    return transport.EmailSender([transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')])
+
+
+class RecordingClient(FakeEmailClient):
+    def __init__(self, status_code=None):
+        super().__init__()
+        self.status_code = status_code
+        self.requests = []
+
+    def send_request(self, request, **kwargs):
+        self.requests.append(request)
+        response = super().send_request(request, **kwargs)
+        if self.status_code is not None:
+            response.status_code = self.status_code
+        return response
+
+
+def test_status_request_uses_the_plain_api_version(monkeypatch):
+    client = use(monkeypatch, RecordingClient())
+    transport.AcsTransport('stand-in').accepted('op-1')
+    assert client.requests[0].url == f'/emails/operations/op-1?api-version={ACS_API_VERSION}'
+
+
+@pytest.mark.parametrize('known, fault, expected', [
+    (True, None, True),
+    (False, None, False),
+    (True, Fault(error_rate=1.0), None),
+])
+def test_accepted_outcomes(monkeypatch, known, fault, expected):
+    client = use(monkeypatch, FakeEmailClient(status_fault=fault))
+    if known:
+        client.operations.add('op-1')
+    assert transport.AcsTransport('stand-in').accepted('op-1') is expected
+
+
+def test_accepted_is_unknown_on_a_server_error(monkeypatch):
+    use(monkeypatch, RecordingClient(status_code=503))
+    assert transport.AcsTransport('stand-in').accepted('op-1') is None
+
+
+def test_lost_response_for_an_accepted_send_reports_accepted(monkeypatch, sendgrid):
+    use(monkeypatch, LostResponseClient(accept=True))
+    result = sender().send(MESSAGE, 'op-1')
+    assert result == transport.SendResult('acs', 'op-1', 'Accepted')
+    assert sendgrid.sent.value == 0
+
+
+def test_lost_response_for_an_unknown_operation_fails_over(monkeypatch, sendgrid):
+    use(monkeypatch, LostResponseClient(accept=False))
+    result = sender().send(MESSAGE, 'op-1')
+    assert result.provider == 'sendgrid'
+    assert sendgrid.sent.value == 1
+
+
+def test_lost_response_that_cannot_be_checked_is_raised(monkeypatch, sendgrid):
+    use(monkeypatch, LostResponseClient(accept=True, status_fault=Fault(error_rate=1.0)))
+    with pytest.raises(transport.TransportError) as error:
+        sender().send(MESSAGE, 'op-1')
+    assert error.value.accepted is None
+    assert sendgrid.sent.value == 0
+
+
+def test_connection_failure_fails_over(monkeypatch, sendgrid):
+    use(monkeypatch, FakeEmailClient(send_fault=Fault(error_rate=1.0)))
+    assert sender().send(MESSAGE, 'op-1').provider == 'sendgrid'
+
+
+def test_no_providers_raises_not_configured():
+    with pytest.raises(transport.NotConfigured):
+        transport.EmailSender([]).send(MESSAGE)
+
+
+class HedgeClient(FakeEmailClient):
+    """The original request loses its response; the slower hedge is then refused outright"""
+
+    def __init__(self, original_accepted):
+        super().__init__(status_fault=Fault(error_rate=1.0) if original_accepted is None else None)
+        self.original_accepted = original_accepted
+        self.calls = 0
+
+    def begin_send(self, message, operation_id=None, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(0.05)
+            if self.original_accepted:
+                self.operations.add(operation_id)
+            raise ServiceResponseError('Read timed out')
+        time.sleep(0.15)
+        raise ServiceRequestError('Connection refused')
+
+
+@pytest.mark.parametrize('original_accepted', [True, None])
+def test_hedge_refusal_does_not_hide_a_possibly_accepted_original(monkeypatch, sendgrid, original_accepted):
+    client = use(monkeypatch, HedgeClient(original_accepted))
+    hedged = transport.EmailSender(
+        [transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')], hedge_delay_ms=20)
+    if original_accepted:
+        assert hedged.send(MESSAGE, 'op-1') == transport.SendResult('acs', 'op-1', 'Accepted')
+    else:
+        with pytest.raises(transport.TransportError):
+            hedged.send(MESSAGE, 'op-1')
+    assert client.calls == 2
+    assert sendgrid.sent.value == 0
+
+
+def test_hedge_failover_when_both_attempts_were_refused(monkeypatch, sendgrid):
+    use(monkeypatch, FakeEmailClient(send_fault=Fault(latency_ms=50, error_rate=1.0)))
+    hedged = transport.EmailSender(
+        [transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')], hedge_delay_ms=20)
+    assert hedged.send(MESSAGE, 'op-1').provider == 'sendgrid'
+
+
+class LostAsyncResponseClient(FakeAsyncEmailClient):
+    """LostResponseClient for the aio EmailClient; status checks go through the same instance"""
+
+    def __init__(self, accept, **faults):
+        super().__init__(**faults)
+        self.accept = accept
+
+    async def begin_send(self, message, operation_id=None, **kwargs):
+        if self.accept:
+            self.operations.add(operation_id)
+        raise ServiceResponseError('Read timed out')
+
+
+def use_async(monkeypatch, client):
+    monkeypatch.setattr(transport, 'get_async_email_client', lambda _: client)
+    return use(monkeypatch, client)
+
+
+def send_async(email_sender):
+    return asyncio.run(email_sender.send_async(MESSAGE, 'op-1'))
+
+
+def test_async_send_goes_through_the_aio_client(monkeypatch, sendgrid):
+    client = use_async(monkeypatch, FakeAsyncEmailClient())
+    assert send_async(sender()) == transport.SendResult('acs', 'op-1', 'Succeeded')
+    assert client.sent.value == 1
+    assert sendgrid.sent.value == 0
+
+
+def test_async_connection_failure_fails_over(monkeypatch, sendgrid):
+    use_async(monkeypatch, FakeAsyncEmailClient(send_fault=Fault(error_rate=1.0)))
+    email_sender = sender()
+    assert send_async(email_sender).provider == 'sendgrid'
+    assert email_sender.health.snapshot()['acs']['failure_rate'] > 0
+
+
+@pytest.mark.parametrize('accept, provider', [(True, 'acs'), (False, 'sendgrid')])
+def test_async_lost_response_is_classified_like_the_sync_path(monkeypatch, sendgrid, accept, provider):
+    use_async(monkeypatch, LostAsyncResponseClient(accept))
+    assert send_async(sender()).provider == provider
+    assert sendgrid.sent.value == (0 if accept else 1)
+
+
+def test_async_lost_response_that_cannot_be_checked_is_raised(monkeypatch, sendgrid):
+    use_async(monkeypatch, LostAsyncResponseClient(accept=True, status_fault=Fault(error_rate=1.0)))
+    with pytest.raises(transport.TransportError) as error:
+        send_async(sender())
+    assert error.value.accepted is None
+    assert sendgrid.sent.value == 0
+
+
+def test_async_send_timeout_is_classified_as_a_lost_response(monkeypatch, sendgrid):
+    use_async(monkeypatch, FakeAsyncEmailClient(send_fault=Fault(latency_ms=200)))
+    email_sender = transport.EmailSender(
+        [transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')], send_timeout_ms=20)
+    # The operation was never recorded, so ACS definitely doesn't have it
+    assert send_async(email_sender).provider == 'sendgrid'
+
+
+def test_async_hedge_loser_is_cancelled(monkeypatch, sendgrid):
+    client = use_async(monkeypatch, FakeAsyncEmailClient(send_fault=Fault(latency_ms=100, jitter_ms=0)))
+    hedged = transport.EmailSender(
+        [transport.AcsTransport('stand-in'), transport.SendGridTransport('key', 'x@y.z')], hedge_delay_ms=20)
+    assert send_async(hedged).provider == 'acs'
+    assert client.sent.value == 1
+    assert sendgrid.sent.value == 0
+
+
+def test_rebuilt_sender_shuts_down_the_previous_executor(configure):
+    configure(EMAIL_HEDGE_DELAY_MS=50)
+    previous = transport.get_sender()
+    configure(EMAIL_HEDGE_DELAY_MS=100)
+    current = transport.get_sender()
+    assert current is not previous
+    assert current.health is previous.health
+    with pytest.raises(RuntimeError):
+        previous._executor.submit(int)
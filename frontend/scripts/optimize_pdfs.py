@@ -0,0 +1,425 @@
+"""
+Optimise the article PDFs for the web
+Run this inside the frontend directory; it is an offline tool, and the site
+still serves the original PDFs until the frontend is switched to the outputs
+
+    pip install -r scripts/requirements.txt
+    python scripts/optimize_pdfs.py
+    python scripts/optimize_pdfs.py --jobs 4 --max-image-px 2000 --jpeg-quality 80
+    python scripts/optimize_pdfs.py --force --exclude "Rectangle *" --exclude "Line *"
+
+Every PDF in public/assets/articles is rewritten in a process pool:
+
+- images are recompressed: soft masks that are fully opaque (as Figma
+  exports add to every photo) are dropped, and JPEGs larger than
+  --max-image-px on their longest side are downscaled and re-encoded at
+  --jpeg-quality; an image is only replaced when that makes it smaller
+- unreferenced resources are removed, Flate streams recompressed at the
+  highest level, objects packed into object streams and the file
+  linearized ("fast web view"), so a browser can show the first page
+  before the rest has downloaded
+- the first page is rendered to a --thumb-width JPEG thumbnail
+
+Outputs go to public/assets/articles-optimized as ``<slug>.<hash>.pdf`` and
+``<slug>.<hash>.jpg``, where the hash is of the file's own content, so
+staticwebapp.config.json can serve them as immutable. If optimising makes a
+file larger the original bytes are used instead.
+
+src/data/articles/pdf-manifest.json maps each source file name to its
+outputs and records the source's SHA-256 and the
+options used. A later run only reprocesses sources whose content or whose
+options changed, or whose outputs are missing, and deletes outputs no entry
+refers to any more.
+
+pikepdf (qpdf) does the rewriting and PyMuPDF the thumbnails. Without
+pikepdf the qpdf command is used, without image recompression; without
+PyMuPDF thumbnails come from pdftoppm (poppler) when it is installed.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib.util import find_spec
+
+FRONTEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE = os.path.join(FRONTEND, 'public', 'assets', 'articles')
+DEFAULT_OUTPUT = os.path.join(FRONTEND, 'public', 'assets', 'articles-optimized')
+DEFAULT_MANIFEST = os.path.join(FRONTEND, 'src', 'data', 'articles', 'pdf-manifest.json')
+PUBLIC = os.path.join(FRONTEND, 'public')
+
+# Bump when the processing changes, so the next run redoes every file
+PIPELINE_VERSION = 1
+HASH_LENGTH = 12
+
+
+def slugify(name):
+    """``Group 21.pdf`` -> ``group-21``"""
+    stem = os.path.splitext(name)[0]
+    return re.sub(r'[^a-z0-9]+', '-', stem.lower()).strip('-') or 'document'
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def engines():
+    """Which tools are installed: ``{'optimize': ..., 'thumbnail': ...}``"""
+    if find_spec('pikepdf'):
+        optimize = 'pikepdf'
+    else:
+        optimize = 'qpdf' if shutil.which('qpdf') else None
+    if find_spec('pymupdf') or find_spec('fitz'):
+        thumbnail = 'pymupdf'
+    else:
+        thumbnail = 'pdftoppm' if shutil.which('pdftoppm') and shutil.which('pdfinfo') else None
+    return {'optimize': optimize, 'thumbnail': thumbnail}
+
+
+def _recompress_images(pdf, max_px, quality):
+    """Drop opaque soft masks and shrink oversized JPEGs; returns how many images changed"""
+    import pikepdf
+    from PIL import Image
+
+    changed = 0
+    seen = set()
+    for page in pdf.pages:
+        for raw in page.get_images().values():
+            if raw.objgen in seen:
+                continue
+            seen.add(raw.objgen)
+
+            smask = raw.get('/SMask')
+            if smask is not None and pikepdf.PdfImage(smask).as_pil_image().getextrema() == (255, 255):
+                del raw['/SMask']
+                smask = None
+                changed += 1
+
+            filters = raw.get('/Filter')
+            if isinstance(filters, pikepdf.Array):
+                filters = filters[0] if len(filters) == 1 else None
+            if filters != pikepdf.Name.DCTDecode or int(raw.get('/BitsPerComponent', 8)) != 8:
+                continue
+            image = pikepdf.PdfImage(raw).as_pil_image()
+            if image.mode not in ('RGB', 'L'):
+                continue  # CMYK JPEGs carry inverted, profile-specific data
+            size = image.size
+            if max_px and max(size) > max_px:
+                image.thumbnail((max_px, max_px), Image.LANCZOS)
+            encoded = io.BytesIO()
+            image.save(encoded, 'JPEG', quality=quality, optimize=True, progressive=True)
+            if encoded.tell() >= len(raw.read_raw_bytes()):
+                continue
+            raw.write(encoded.getvalue(), filter=pikepdf.Name.DCTDecode)
+            if '/DecodeParms' in raw:
+                del raw['/DecodeParms']
+            if image.size != size:
+                raw.Width, raw.Height = image.size
+                if smask is not None:
+                    mask = pikepdf.PdfImage(smask).as_pil_image().resize(image.size, Image.LANCZOS)
+                    smask.write(zlib.compress(mask.tobytes(), 9), filter=pikepdf.Name.FlateDecode)
+                    smask.Width, smask.Height = image.size
+                    if '/DecodeParms' in smask:
+                        del smask['/DecodeParms']
+            changed += 1
+    return changed
+
+
+def _optimize_pikepdf(source, target, options):
+    import pikepdf
+
+    with pikepdf.open(source) as pdf:
+        pages = len(pdf.pages)
+        images = _recompress_images(pdf, options['max_image_px'], options['jpeg_quality']) \
+            if options['images'] else 0
+        pdf.remove_unreferenced_resources()
+        pdf.save(
+            target,
+            linearize=True,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            # The same input gives the same bytes, so the content hash is stable
+            deterministic_id=True,
+        )
+    return pages, images
+
+
+def _optimize_qpdf(source, target, options):
+    subprocess.run(
+        ['qpdf', '--linearize', '--object-streams=generate', '--compress-streams=y',
+         '--recompress-flate', '--compression-level=9', '--deterministic-id', source, target],
+        check=True, capture_output=True,
+    )
+    output = subprocess.run(['qpdf', '--show-npages', target], check=True, capture_output=True, text=True)
+    return int(output.stdout.strip()), 0
+
+
+def _thumbnail_scale(page_width, page_height, width):
+    """Scale for a ``width`` wide thumbnail, at most twice as tall (design fragments can be 5 x 2000 pt)"""
+    return min(width / page_width, 2 * width / page_height)
+
+
+def _thumbnail_pymupdf(path, width, quality):
+    try:
+        import pymupdf
+    except ImportError:  # PyMuPDF before 1.24.3
+        import fitz as pymupdf
+
+    with pymupdf.open(path) as document:
+        page = document[0]
+        zoom = _thumbnail_scale(page.rect.width, page.rect.height, width)
+        pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        return pixmap.tobytes('jpeg', jpg_quality=quality)
+
+
+def _thumbnail_pdftoppm(path, width, quality):
+    info = subprocess.run(['pdfinfo', '-f', '1', '-l', '1', path], check=True, capture_output=True, text=True)
+    size = re.search(r'Page +1 size: +([\d.]+) x ([\d.]+)', info.stdout)
+    page_width, page_height = float(size.group(1)), float(size.group(2))
+    zoom = _thumbnail_scale(page_width, page_height, width)
+    output = subprocess.run(
+        ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-r', f'{72 * zoom:.3f}',
+         '-jpeg', '-jpegopt', f'quality={quality}', path],
+        check=True, capture_output=True,
+    )
+    return output.stdout
+
+
+def _write_hashed(directory, slug, extension, data):
+    """Write ``data`` as ``<slug>.<hash>.<extension>`` (unless it exists) and return the path"""
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    path = os.path.join(directory, f'{slug}.{digest}.{extension}')
+    if not os.path.exists(path):
+        temporary = f'{path}.tmp{os.getpid()}'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+    return path
+
+
+def process(source, source_sha256, output_dir, base_url, options, tools):
+    """Optimise one PDF and render its thumbnail (runs in a worker process)"""
+    try:
+        return _process(source, source_sha256, output_dir, base_url, options, tools)
+    except Exception as e:
+        # Library exceptions (qpdf, MuPDF) don't always survive pickling back to the parent
+        raise RuntimeError(f'{type(e).__name__}: {e}') from None
+
+
+def _process(source, source_sha256, output_dir, base_url, options, tools):
+    started = time.perf_counter()
+    name = os.path.basename(source)
+    slug = slugify(name)
+    original_bytes = os.path.getsize(source)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        optimized = os.path.join(scratch, 'optimized.pdf')
+        if tools['optimize'] == 'pikepdf':
+            pages, images = _optimize_pikepdf(source, optimized, options)
+        else:
+            pages, images = _optimize_qpdf(source, optimized, options)
+        with open(optimized, 'rb') as f:
+            data = f.read()
+        kept_original = len(data) >= original_bytes
+        if kept_original:
+            with open(source, 'rb') as f:
+                data = f.read()
+        pdf_path = _write_hashed(output_dir, slug, 'pdf', data)
+        optimize_seconds = time.perf_counter() - started
+
+        thumbnail_path = None
+        if tools['thumbnail'] and options['thumb_width']:
+            render = _thumbnail_pymupdf if tools['thumbnail'] == 'pymupdf' else _thumbnail_pdftoppm
+            thumbnail = render(pdf_path, options['thumb_width'], options['thumb_quality'])
+            thumbnail_path = _write_hashed(output_dir, slug, 'jpg', thumbnail)
+
+    return name, {
+        'slug': slug,
+        'pdf': f'{base_url}/{os.path.basename(pdf_path)}',
+        'thumbnail': f'{base_url}/{os.path.basename(thumbnail_path)}' if thumbnail_path else None,
+        'pages': pages,
+        'bytes': len(data),
+        'originalBytes': original_bytes,
+        'thumbnailBytes': os.path.getsize(thumbnail_path) if thumbnail_path else 0,
+        'linearized': not kept_original,
+        'imagesRecompressed': images if not kept_original else 0,
+        'sourceSha256': source_sha256,
+    }, {
+        'optimize_seconds': optimize_seconds,
+        'total_seconds': time.perf_counter() - started,
+    }
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    os.replace(temporary, path)
+
+
+def _outputs_exist(entry, output_dir):
+    urls = [entry['pdf']] + ([entry['thumbnail']] if entry.get('thumbnail') else [])
+    return all(os.path.exists(os.path.join(output_dir, url.rsplit('/', 1)[1])) for url in urls)
+
+
+def plan(sources, manifest, output_dir, options, force):
+    """Split sources into (to process, unchanged entries)"""
+    previous = manifest.get('files', {}) if manifest.get('options') == options else {}
+    todo, unchanged = [], {}
+    for path, digest in sources:
+        entry = previous.get(os.path.basename(path))
+        if not force and entry and entry['sourceSha256'] == digest and _outputs_exist(entry, output_dir):
+            unchanged[os.path.basename(path)] = entry
+        else:
+            todo.append((path, digest))
+    return todo, unchanged
+
+
+def prune(output_dir, files):
+    """Delete outputs no manifest entry refers to; returns their names"""
+    referenced = {os.path.basename(url) for entry in files.values()
+                  for url in (entry['pdf'], entry.get('thumbnail')) if url}
+    removed = []
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith(('.pdf', '.jpg')) and name not in referenced:
+            os.remove(os.path.join(output_dir, name))
+            removed.append(name)
+    return removed
+
+
+def _kib(value):
+    return f'{value / 1024:,.0f}'
+
+
+def report(files, processed, timings, failed, removed, elapsed, jobs):
+    print(f"{'file':<48}{'status':<11}{'before KiB':>11}{'after KiB':>10}{'saved':>7}{'thumb KiB':>10}{'ms':>8}")
+    for name in sorted(files):
+        entry = files[name]
+        status = ('kept' if not entry['linearized'] else 'optimized') if name in processed else 'unchanged'
+        saved = 1 - entry['bytes'] / entry['originalBytes'] if entry['originalBytes'] else 0.0
+        ms = f"{timings[name]['total_seconds'] * 1000:.0f}" if name in timings else '-'
+        label = name if len(name) <= 46 else name[:43] + '...'
+        print(f"{label:<48}{status:<11}{_kib(entry['originalBytes']):>11}{_kib(entry['bytes']):>10}"
+              f"{saved:>7.0%}{_kib(entry['thumbnailBytes']):>10}{ms:>8}")
+    for name, error in sorted(failed.items()):
+        print(f'{name:<48}{"failed":<11}  {error}')
+
+    before = sum(entry['originalBytes'] for entry in files.values())
+    after = sum(entry['bytes'] for entry in files.values())
+    thumbnails = sum(entry['thumbnailBytes'] for entry in files.values())
+    work = sum(timing['total_seconds'] for timing in timings.values())
+    print(f'\n{len(files)} PDFs: {_kib(before)} KiB -> {_kib(after)} KiB '
+          f'({1 - after / before if before else 0:.0%} smaller), thumbnails {_kib(thumbnails)} KiB')
+    print(f'{len(processed)} processed, {len(files) - len(processed)} unchanged, {len(failed)} failed, '
+          f'{len(removed)} stale output(s) removed')
+    print(f'{elapsed:.2f} s wall, {work:.2f} s of work across {jobs} process(es)'
+          + (f' ({work / elapsed:.1f}x)' if processed and elapsed else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimise the article PDFs for the web')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='directory of source PDFs')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='directory for the hashed outputs (under public/)')
+    parser.add_argument('--base-url', help='URL the output directory is served at (default: its path under public/)')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help='manifest JSON to write')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--max-image-px', type=int, default=2400, help='longest side of embedded JPEGs (0: keep)')
+    parser.add_argument('--jpeg-quality', type=int, default=82, help='quality of re-encoded JPEGs')
+    parser.add_argument('--no-images', action='store_true', help="don't touch embedded images")
+    parser.add_argument('--thumb-width', type=int, default=480, help='thumbnail width in pixels (0: none)')
+    parser.add_argument('--thumb-quality', type=int, default=80, help='thumbnail JPEG quality')
+    parser.add_argument('--exclude', action='append', default=[], help='glob of source names to skip (repeatable)')
+    parser.add_argument('--force', action='store_true', help='reprocess every file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+    elif os.path.commonpath([output, PUBLIC]) == PUBLIC:
+        base_url = '/' + os.path.relpath(output, PUBLIC).replace(os.sep, '/')
+    else:
+        print('❌ ERROR: --output is outside public/; pass --base-url')
+        return 1
+
+    tools = engines()
+    if tools['optimize'] is None:
+        print('❌ ERROR: needs pikepdf or the qpdf command (pip install -r scripts/requirements.txt)')
+        return 1
+    if tools['thumbnail'] is None and args.thumb_width:
+        print('⚠️  PyMuPDF and pdftoppm are missing: no thumbnails')
+
+    options = {
+        'pipeline': PIPELINE_VERSION,
+        'engine': tools['optimize'],
+        'images': tools['optimize'] == 'pikepdf' and not args.no_images,
+        'max_image_px': args.max_image_px,
+        'jpeg_quality': args.jpeg_quality,
+        'thumb_width': args.thumb_width if tools['thumbnail'] else 0,
+        'thumb_quality': args.thumb_quality,
+        'base_url': base_url,
+    }
+    started = time.perf_counter()
+    sources = sorted(
+        os.path.join(args.source, name) for name in os.listdir(args.source)
+        if name.lower().endswith('.pdf') and not any(fnmatch.fnmatch(name, pattern) for pattern in args.exclude)
+    )
+    sources = [(path, sha256_file(path)) for path in sources]
+    manifest = load_manifest(args.manifest)
+    todo, files = plan(sources, manifest, args.output, options, args.force)
+    os.makedirs(args.output, exist_ok=True)
+
+    timings, failed = {}, {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(todo)))) as pool:
+            futures = {
+                pool.submit(process, path, digest, args.output, base_url, options, tools): path
+                for path, digest in todo
+            }
+            for future in as_completed(futures):
+                name = os.path.basename(futures[future])
+                try:
+                    name, entry, timing = future.result()
+                except Exception as e:
+                    failed[name] = str(e) or type(e).__name__
+                    # Keep serving the previous outputs of a file that fails now
+                    previous = manifest.get('files', {}).get(name)
+                    if previous and _outputs_exist(previous, args.output):
+                        files[name] = previous
+                    continue
+                files[name] = entry
+                timings[name] = timing
+
+    write_manifest(args.manifest, {'options': options, 'files': dict(sorted(files.items()))})
+    removed = prune(args.output, files)
+    processed = set(timings)
+    report(files, processed, timings, failed, removed, time.perf_counter() - started, args.jobs)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())